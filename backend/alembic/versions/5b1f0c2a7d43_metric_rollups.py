@@ -0,0 +1,68 @@
+"""Metric rollups and rollup cursors
+
+Revision ID: 5b1f0c2a7d43
+Revises: cf032c49b882
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5b1f0c2a7d43"
+down_revision = "cf032c49b882"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create metric_rollups table
+    op.create_table(
+        "metric_rollups",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("resolution", sa.String(), nullable=False),
+        sa.Column("source", sa.String(), nullable=False),
+        sa.Column("metric", sa.String(), nullable=False),
+        sa.Column("subject", sa.String(), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(), nullable=False),
+        sa.Column("min_value", sa.Float(), nullable=False),
+        sa.Column("max_value", sa.Float(), nullable=False),
+        sa.Column("sum_value", sa.Float(), nullable=False),
+        sa.Column("sample_count", sa.Integer(), nullable=False),
+        sa.Column("last_value", sa.Float(), nullable=False),
+        sa.Column("last_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "resolution",
+            "source",
+            "metric",
+            "subject",
+            "bucket_start",
+            name="uq_metric_rollups_series_bucket",
+        ),
+    )
+    op.create_index(
+        op.f("ix_metric_rollups_bucket_start"),
+        "metric_rollups",
+        ["bucket_start"],
+        unique=False,
+    )
+
+    # Create rollup_cursors table
+    op.create_table(
+        "rollup_cursors",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("source", sa.String(), nullable=False),
+        sa.Column("resolution", sa.String(), nullable=False),
+        sa.Column("processed_until", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("source", "resolution", name="uq_rollup_cursors"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("rollup_cursors")
+    op.drop_index(op.f("ix_metric_rollups_bucket_start"), table_name="metric_rollups")
+    op.drop_table("metric_rollups")
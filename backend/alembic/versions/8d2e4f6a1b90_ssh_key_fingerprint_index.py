@@ -0,0 +1,62 @@
+"""Unique (fingerprint, user_id) index on ssh_keys
+
+Revision ID: 8d2e4f6a1b90
+Revises: 5b1f0c2a7d43
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8d2e4f6a1b90"
+down_revision = "5b1f0c2a7d43"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("ssh_keys"):
+        # Older databases only got ssh_keys from create_all() at startup
+        op.create_table(
+            "ssh_keys",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(length=100), nullable=False),
+            sa.Column("public_key", sa.String(), nullable=False),
+            sa.Column("fingerprint", sa.String(), nullable=False),
+            sa.Column("is_active", sa.Boolean(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("last_used_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(
+            op.f("ix_ssh_keys_user_id"), "ssh_keys", ["user_id"], unique=False
+        )
+    else:
+        indexes = {ix["name"] for ix in inspector.get_indexes("ssh_keys")}
+        if "ix_ssh_keys_fingerprint" in indexes:
+            op.drop_index("ix_ssh_keys_fingerprint", table_name="ssh_keys")
+        # Keep the oldest row of any (fingerprint, user) pair added twice
+        op.execute(
+            "DELETE FROM ssh_keys WHERE id NOT IN ("
+            "SELECT MIN(id) FROM ssh_keys GROUP BY fingerprint, user_id)"
+        )
+
+    op.create_index(
+        "ix_ssh_keys_fingerprint_user_id",
+        "ssh_keys",
+        ["fingerprint", "user_id"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ssh_keys_fingerprint_user_id", table_name="ssh_keys")
+    op.create_index(
+        op.f("ix_ssh_keys_fingerprint"), "ssh_keys", ["fingerprint"], unique=False
+    )
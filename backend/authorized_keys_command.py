@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""sshd AuthorizedKeysCommand client for the ATL Pubnix key index.
+
+Prints the authorized_keys lines for the user given as the only argument,
+fetched from the backend's in-memory index. Uses only the standard library
+so sshd can run it with ``python3 -I -S`` and skip site-packages entirely.
+
+Configuration (environment):
+    PUBNIX_AUTHKEYS_SOCKET  UNIX socket of the backend (uvicorn --uds)
+    PUBNIX_AUTHKEYS_URL     base URL otherwise
+                            (default http://127.0.0.1:8000)
+
+On any error nothing is printed, so sshd falls back to AuthorizedKeysFile.
+"""
+
+import http.client
+import os
+import re
+import socket
+import sys
+from urllib.parse import urlsplit
+
+KEYS_PATH = "/api/v1/ssh-keys/authorized-keys/"
+TIMEOUT = 2.0
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost", timeout=TIMEOUT)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(TIMEOUT)
+        self.sock.connect(self.socket_path)
+
+
+def fetch(username):
+    socket_path = os.environ.get("PUBNIX_AUTHKEYS_SOCKET")
+    if socket_path:
+        conn = UnixHTTPConnection(socket_path)
+        prefix = ""
+    else:
+        url = urlsplit(os.environ.get("PUBNIX_AUTHKEYS_URL", "http://127.0.0.1:8000"))
+        conn = http.client.HTTPConnection(url.hostname, url.port, timeout=TIMEOUT)
+        prefix = url.path.rstrip("/")
+    try:
+        conn.request("GET", prefix + KEYS_PATH + username)
+        response = conn.getresponse()
+        body = response.read()
+    finally:
+        conn.close()
+    return body if response.status == 200 else b""
+
+
+def main():
+    """Write the user's keys to stdout; exit 0 even on failure."""
+    if len(sys.argv) != 2 or not re.fullmatch(
+        r"[A-Za-z_][A-Za-z0-9_]{0,31}", sys.argv[1]
+    ):
+        return
+    try:
+        sys.stdout.buffer.write(fetch(sys.argv[1]))
+    except (OSError, http.client.HTTPException):
+        pass
+
+
+if __name__ == "__main__":
+    main()
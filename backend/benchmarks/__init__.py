@@ -0,0 +1 @@
+"""Standalone performance benchmarks for ATL Pubnix backend services."""
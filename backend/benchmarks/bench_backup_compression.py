@@ -0,0 +1,112 @@
+"""Benchmark backup compression codecs over a synthetic home-directory tree.
+
+Builds ``--users`` home directories with a mix of dotfiles, source code,
+repetitive logs and incompressible binaries, then archives the tree with
+each available codec (see ``services.backup_compression``) into a counting
+sink. Reports throughput over the uncompressed tar size and the compression
+ratio. zstd/lz4 rows are skipped when their packages are not installed.
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.bench_backup_compression --users 50 --threads 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from services.backup_compression import Compression, lz4_frame, zstandard
+from services.backup_service import BackupService
+
+WORDS = (
+    "pubnix shell user home config alias export path public_html index "
+    "function return import class def self value error warning info debug"
+).split()
+
+
+class CountingSink(io.RawIOBase):
+    def __init__(self) -> None:
+        super().__init__()
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.size += len(data)
+        return len(data)
+
+
+def text(rng: random.Random, words: int) -> str:
+    lines = []
+    for _ in range(words // 8):
+        lines.append(" ".join(rng.choice(WORDS) for _ in range(8)))
+    return "\n".join(lines) + "\n"
+
+
+def build_tree(root: Path, users: int, binary_kb: int) -> None:
+    rng = random.Random(42)
+    for i in range(users):
+        home = root / f"user{i}"
+        (home / "src").mkdir(parents=True)
+        (home / "public_html").mkdir()
+        (home / ".bashrc").write_text(text(rng, 200))
+        (home / ".profile").write_text(text(rng, 80))
+        for n in range(20):
+            (home / "src" / f"module{n}.py").write_text(text(rng, 1_500))
+        (home / "public_html" / "index.html").write_text(text(rng, 3_000))
+        log = "".join(
+            f"2025-03-01T12:{m % 60:02d}:00 INFO request served in {m % 97} ms\n"
+            for m in range(20_000)
+        )
+        (home / "app.log").write_text(log)
+        (home / "photo.jpg").write_bytes(os.urandom(binary_kb * 1024))
+
+
+def candidates(level: int | None, threads: int) -> list[Compression]:
+    out = [Compression("none"), Compression("gzip", level=level)]
+    if zstandard is not None:
+        out.append(Compression("zstd", level=level))
+        out.append(Compression("zstd", level=level, threads=threads))
+    if lz4_frame is not None:
+        out.append(Compression("lz4"))
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--binary-kb", type=int, default=512)
+    parser.add_argument("--level", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "home"
+        build_tree(root, args.users, args.binary_kb)
+        raw_size = 0
+        print(f"{'codec':<6} {'level':>5} {'threads':>7} {'MB/s':>8} {'ratio':>6}")
+        for compression in candidates(args.level, args.threads):
+            svc = BackupService(backup_dir=Path(tmp) / "out", compression=compression)
+            sink = CountingSink()
+            start = time.perf_counter()
+            svc._write_archive(sink, [root])
+            elapsed = time.perf_counter() - start
+            if compression.codec == "none":
+                raw_size = sink.size
+            level = "-" if compression.codec == "none" else compression.level or "def"
+            print(
+                f"{compression.codec:<6} {level:>5} {compression.threads:>7} "
+                f"{raw_size / elapsed / 1e6:>8.1f} {raw_size / sink.size:>6.2f}"
+            )
+    print(f"tar size: {raw_size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark sustained UserMetrics ingest through MetricsWriter.
+
+Simulates ``--users`` samples every ``--interval`` seconds and reports how
+long each batched flush takes, i.e. how much of the interval ingest costs.
+For reference one tick is also written through the ORM unit of work.
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.bench_metrics_writer --users 10000 --ticks 6
+    uv run python -m benchmarks.bench_metrics_writer --url "$DATABASE_URL"
+
+Without ``--url`` a temporary SQLite file is used; against PostgreSQL the
+writer uses COPY.
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import Session, SQLModel, create_engine
+
+from models import UserMetrics
+from services.metrics_writer import MetricsWriter
+
+
+def samples(users: int, ts: datetime) -> list[UserMetrics]:
+    return [
+        UserMetrics(
+            username=f"user{i:05d}",
+            timestamp=ts,
+            cpu_time_seconds=i % 600,
+            memory_usage_mb=i % 512,
+            disk_usage_mb=i % 1024,
+            active_processes=i % 20,
+            login_sessions=i % 3,
+        )
+        for i in range(users)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--ticks", type=int, default=6)
+    parser.add_argument("--interval", type=float, default=10.0)
+    parser.add_argument("--url", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(args.url or f"sqlite:///{tmp}/bench.db")
+        SQLModel.metadata.create_all(engine)
+        writer = MetricsWriter(engine)
+        start_ts = datetime.now(timezone.utc)
+
+        flush_times = []
+        for tick in range(args.ticks):
+            batch = samples(args.users, start_ts + timedelta(seconds=tick * 10))
+            start = time.perf_counter()
+            writer.add(batch)
+            writer.flush()
+            flush_times.append(time.perf_counter() - start)
+
+        batch = samples(args.users, start_ts - timedelta(seconds=10))
+        start = time.perf_counter()
+        with Session(engine) as session:
+            session.add_all(batch)
+            session.commit()
+        orm_s = time.perf_counter() - start
+        engine.dispose()
+
+    worst = max(flush_times)
+    mean = sum(flush_times) / len(flush_times)
+    print(f"{engine.dialect.name}: {args.users} users x {args.ticks} ticks")
+    print(
+        f"  batched flush: mean {mean * 1000:.1f} ms, worst {worst * 1000:.1f} ms "
+        f"({worst / args.interval:.1%} of a {args.interval:.0f}s interval, "
+        f"{args.users / mean:,.0f} rows/s)"
+    )
+    print(f"  ORM add_all+commit: {orm_s * 1000:.1f} ms for one tick")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark per-user provisioning cost into a temporary root.
+
+Provisions N users with ``NativeRunner`` and compares against a runner that
+forks once per command. ``useradd`` cannot run unprivileged, so every fork is
+simulated with ``/bin/true``; this keeps the fork/exec cost in the numbers
+while leaving the host's account databases untouched.
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.bench_provisioning --users 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from models import User
+from services.provisioning_service import NativeRunner, ProvisioningService
+
+SKEL_DIR = Path(__file__).resolve().parents[2] / "config" / "skel"
+
+
+def _fork_true(argv: list[str]) -> int:
+    return subprocess.run(["/bin/true"], check=False).returncode
+
+
+def bench_native(users: list[User], root: str) -> tuple[float, int]:
+    runner = NativeRunner(
+        account_runner=_fork_true,
+        id_resolver=lambda user, group: (os.getuid(), os.getgid()),
+        root=root,
+    )
+    svc = ProvisioningService(shell_runner=runner, skeleton_dir=str(SKEL_DIR))
+    start = time.perf_counter()
+    for user in users:
+        result = svc.provision_user(user, dry_run=False)
+        assert result.success, result.message
+    return time.perf_counter() - start, runner.forks
+
+
+def bench_forking(users: list[User]) -> tuple[float, int]:
+    forks = 0
+
+    def runner(argv: list[str]) -> int:
+        nonlocal forks
+        forks += 1
+        return _fork_true(argv)
+
+    svc = ProvisioningService(shell_runner=runner, skeleton_dir=str(SKEL_DIR))
+    start = time.perf_counter()
+    for user in users:
+        svc.provision_user(user, dry_run=False)
+    return time.perf_counter() - start, forks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    users = [
+        User(username=f"bench{i:05d}", email=f"b{i}@example.com", full_name="Bench")
+        for i in range(args.users)
+    ]
+    with tempfile.TemporaryDirectory() as root:
+        native_s, native_forks = bench_native(users, root)
+    forking_s, forking_forks = bench_forking(users)
+
+    for label, seconds, forks in (
+        ("native", native_s, native_forks),
+        ("forking", forking_s, forking_forks),
+    ):
+        print(
+            f"{label:8s} {args.users} users in {seconds:.2f}s "
+            f"({seconds / args.users * 1000:.2f} ms/user, {forks} forks)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark scalar vs columnar resource-violation checks.
+
+Compares ``ResourceEnforcer.check_user_violations`` called once per user
+with a single ``check_batch_violations`` call over NumPy columns.
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.bench_resource_enforcer --users 10000 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+
+from models import ResourceLimits, UserMetrics
+from services.resource_enforcer import LIMIT_COLUMNS, ResourceEnforcer
+
+
+def make_columns(n: int, seed: int = 0) -> tuple[dict, dict]:
+    rng = np.random.default_rng(seed)
+    metrics = {
+        "active_processes": rng.integers(0, 80, n),
+        "memory_usage_mb": rng.integers(0, 1024, n),
+        "login_sessions": rng.integers(0, 8, n),
+        "disk_usage_mb": rng.integers(0, 2048, n),
+    }
+    limits = {
+        "max_processes": np.full(n, 50),
+        "memory_limit_mb": np.full(n, 512),
+        "max_login_sessions": np.full(n, 5),
+        "disk_quota_mb": np.full(n, 1024),
+    }
+    return metrics, limits
+
+
+def bench(n: int) -> None:
+    enforcer = ResourceEnforcer()
+    metrics, limits = make_columns(n)
+
+    rows = [
+        (
+            UserMetrics(
+                username=f"u{i}",
+                **{col: int(metrics[col][i]) for col, _ in LIMIT_COLUMNS.values()},
+            ),
+            ResourceLimits(
+                user_id=i,
+                **{col: int(limits[col][i]) for _, col in LIMIT_COLUMNS.values()},
+            ),
+        )
+        for i in range(n)
+    ]
+    start = time.perf_counter()
+    scalar = sum(len(enforcer.check_user_violations(m, lim)) for m, lim in rows)
+    scalar_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    masks = enforcer.check_batch_violations(metrics, limits)
+    batch = int(sum(mask.sum() for mask in masks.values()))
+    batch_s = time.perf_counter() - start
+
+    assert scalar == batch, (scalar, batch)
+    print(
+        f"{n:>7} users: scalar {scalar_s * 1000:8.2f} ms, "
+        f"batch {batch_s * 1000:6.2f} ms ({scalar_s / batch_s:,.0f}x), "
+        f"{batch} violations"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+    for n in args.users:
+        bench(n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark access-log throughput of the per-user web request counter.
+
+Appends ``--lines`` combined-format access-log lines (a mix of ``/~user/``
+and other requests) to a temporary log and measures how fast
+``WebRequestCounter.poll`` tails and counts them on one core.
+
+Usage (from ``backend/``)::
+
+    uv run python -m benchmarks.bench_web_requests --lines 500000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+
+from services.log_tailer import LogTailer
+from services.web_requests import WebRequestCounter
+
+
+def access_lines(count: int, users: int) -> bytes:
+    out = []
+    for i in range(count):
+        path = f"/~user{i % users}/page{i % 7}.html" if i % 4 else "/static/app.js"
+        out.append(
+            f'198.51.100.{i % 250} - - [01/Mar/2025:12:00:00 +0000] "GET {path} '
+            f'HTTP/1.1" 200 {i % 9000} "-" "Mozilla/5.0 (X11; Linux x86_64)"\n'
+        )
+    return "".join(out).encode()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=500_000)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--batches", type=int, default=10)
+    args = parser.parse_args()
+
+    per_batch = access_lines(args.lines // args.batches, args.users)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "access.log")
+        open(path, "wb").close()
+        counter = WebRequestCounter(tailer=LogTailer(path))
+        counter.poll()
+
+        elapsed = 0.0
+        for _ in range(args.batches):
+            with open(path, "ab") as f:
+                f.write(per_batch)
+            start = time.perf_counter()
+            counter.poll()
+            elapsed += time.perf_counter() - start
+        counted = sum(counter.drain().values())
+
+    print(f"{counter.lines_seen:,} lines, {counted:,} user requests")
+    print(
+        f"  {elapsed:.2f} s total, {counter.lines_seen / elapsed:,.0f} lines/s "
+        f"({elapsed / counter.lines_seen * 1e6:.2f} us/line)"
+    )
+
+
+if __name__ == "__main__":
+    main()
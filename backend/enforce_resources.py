@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Run the resource enforcement loop for approved ATL Pubnix users.
+
+Long-running; see infrastructure/systemd/pubnix-enforcer.service.
+"""
+
+import os
+import signal
+import threading
+
+from prometheus_client import start_http_server
+from sqlmodel import select
+
+from database import engine, get_db_session
+from models import ResourceLimits, User, UserStatus
+from services.alert_engine import AlertEngine, load_rules
+from services.cgroup_applier import CgroupApplier
+from services.enforcement_daemon import EnforcementLoop
+from services.metrics_writer import MetricsWriter
+from services.ssh_key_usage import KeyUsageTracker
+from services.utmp import LoginTracker
+
+
+def load_limits():
+    """Map each approved username to its ResourceLimits (defaults if unset)."""
+    session = get_db_session()
+    try:
+        rows = session.exec(
+            select(User.username, ResourceLimits)
+            .join(ResourceLimits, ResourceLimits.user_id == User.id, isouter=True)
+            .where(User.status == UserStatus.APPROVED)
+        ).all()
+    finally:
+        session.close()
+    return {username: limits or ResourceLimits(user_id=0) for username, limits in rows}
+
+
+def main():
+    """Start the loop and stop cleanly on SIGTERM/SIGINT."""
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    loop = EnforcementLoop(
+        limits_provider=load_limits,
+        interval=float(os.getenv("PUBNIX_ENFORCE_INTERVAL", "10")),
+        metrics_writer=MetricsWriter(engine),
+        alert_engine=AlertEngine(load_rules()),
+        alert_state_path=os.getenv("PUBNIX_ALERT_STATE"),
+        login_tracker=LoginTracker(engine),
+        key_usage_tracker=KeyUsageTracker(engine),
+        cgroup_applier=CgroupApplier(),
+    )
+    metrics_port = os.getenv("PUBNIX_ENFORCER_METRICS_PORT")
+    if metrics_port:
+        start_http_server(
+            int(metrics_port),
+            addr=os.getenv("PUBNIX_ENFORCER_METRICS_ADDR", "127.0.0.1"),
+            registry=loop.registry,
+        )
+    print("Resource enforcement loop started")
+    loop.run(stop)
+    s = loop.stats
+    print(
+        f"Stopped after {s.ticks} ticks: {s.actions} actions, "
+        f"{s.commands} commands, {s.cgroup_writes} cgroup writes for "
+        f"{s.samples} samples ({s.errors} errors)"
+    )
+
+
+if __name__ == "__main__":
+    main()
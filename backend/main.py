@@ -1,5 +1,6 @@
 """Main FastAPI application for ATL Pubnix backend services."""
 
+import os
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 
@@ -13,6 +14,9 @@ from routers import comm as comm_routes
 from routers import integrations as integrations_routes
 from routers import monitoring as monitoring_routes
 from routers import web as web_routes
+from services.alert_engine import AlertSampler, get_alert_engine
+from services.authorized_keys_index import claim_single_process
+from services.metrics_collector import get_metrics_collector
 
 
 @asynccontextmanager
@@ -20,9 +24,20 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """Application lifespan manager."""
     # Startup
     create_db_and_tables()
+    index_lock = os.getenv("PUBNIX_AUTHKEYS_INDEX_LOCK")
+    if index_lock:
+        # The authorized_keys index is per process; refuse a second worker
+        claim_single_process(index_lock)
+    sampler = None
+    if os.getenv("PUBNIX_ALERT_SAMPLER", "false").lower() == "true":
+        sampler = AlertSampler(get_alert_engine(), get_metrics_collector())
+        sampler.start()
     yield
     # Shutdown
-    pass
+    if sampler is not None:
+        sampler.stop()
+    if get_metrics_collector.cache_info().currsize:
+        get_metrics_collector().close()
 
 
 # Create FastAPI application
@@ -1,7 +1,7 @@
 """ATL Pubnix Data Models exports."""
 
 from .comm import Message
-from .metrics import SystemMetrics, UserMetrics
+from .metrics import MetricRollup, RollupCursor, SystemMetrics, UserMetrics
 from .ssh_key import SshKey
 from .user import (
     Application,
@@ -19,6 +19,8 @@ __all__ = [
     "ApplicationStatus",
     "SystemMetrics",
     "UserMetrics",
+    "MetricRollup",
+    "RollupCursor",
     "SshKey",
     "Message",
 ]
@@ -3,6 +3,7 @@
 from datetime import datetime, timezone
 from typing import Optional
 
+from sqlalchemy import UniqueConstraint
 from sqlmodel import Field, SQLModel
 
 
@@ -58,3 +59,52 @@ class UserMetrics(SQLModel, table=True):
 
     def __str__(self) -> str:
         return f"UserMetrics(username={self.username}, timestamp={self.timestamp})"
+
+
+class MetricRollup(SQLModel, table=True):
+    """Downsampled metric values for one series and time bucket.
+
+    One row holds min/max/sum/count/last for a single metric of a single
+    subject (a username, or "" for system-wide metrics) at one resolution.
+    """
+
+    __tablename__ = "metric_rollups"
+    __table_args__ = (
+        UniqueConstraint(
+            "resolution",
+            "source",
+            "metric",
+            "subject",
+            "bucket_start",
+            name="uq_metric_rollups_series_bucket",
+        ),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    resolution: str = Field(description="Bucket width: 1m, 1h or 1d")
+    source: str = Field(description="Raw table: system or user")
+    metric: str = Field(description="Column name in the raw table")
+    subject: str = Field(default="", description="Username, empty for system")
+    bucket_start: datetime = Field(index=True, description="Bucket start (UTC)")
+    min_value: float = Field(description="Minimum sample in the bucket")
+    max_value: float = Field(description="Maximum sample in the bucket")
+    sum_value: float = Field(description="Sum of samples, for averages")
+    sample_count: int = Field(description="Number of raw samples covered")
+    last_value: float = Field(description="Most recent sample in the bucket")
+    last_at: datetime = Field(description="Timestamp of the most recent sample")
+
+
+class RollupCursor(SQLModel, table=True):
+    """High-water mark of data already folded into a rollup resolution."""
+
+    __tablename__ = "rollup_cursors"
+    __table_args__ = (
+        UniqueConstraint("source", "resolution", name="uq_rollup_cursors"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    source: str = Field(description="Raw table: system or user")
+    resolution: str = Field(description="Bucket width: 1m, 1h or 1d")
+    processed_until: datetime = Field(
+        description="Every bucket starting before this instant is complete"
+    )
@@ -4,17 +4,23 @@ from __future__ import annotations
 
 from datetime import datetime, timezone
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
 class SshKey(SQLModel, table=True):
     __tablename__ = "ssh_keys"
+    # Fingerprint first: groups a key's owners together for duplicate and
+    # reverse lookups, and makes (fingerprint, user) unique per user.
+    __table_args__ = (
+        Index("ix_ssh_keys_fingerprint_user_id", "fingerprint", "user_id", unique=True),
+    )
 
     id: int | None = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="users.id", index=True)
     name: str = Field(min_length=1, max_length=100, description="Key label")
     public_key: str = Field(description="OpenSSH public key")
-    fingerprint: str = Field(index=True, description="SHA256 fingerprint")
+    fingerprint: str = Field(description="SHA256 fingerprint")
     is_active: bool = Field(default=True)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     last_used_at: datetime | None = Field(default=None)
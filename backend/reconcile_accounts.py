@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""Reconcile system accounts of approved users with their expected state.
+
+Intended to run nightly (see infrastructure/systemd/pubnix-reconcile.timer).
+Only accounts whose passwd entry, home directory or public_html drifted are
+touched; everything else is left alone.
+"""
+
+from sqlmodel import select
+
+from database import get_db_session
+from models import User, UserStatus
+from services.provisioning_service import ProvisioningService
+
+
+def main():
+    """Plan and apply provisioning fixes for drifted approved accounts."""
+    session = get_db_session()
+    try:
+        users = session.exec(select(User).where(User.status == UserStatus.APPROVED))
+        results = ProvisioningService().reconcile(users)
+    finally:
+        session.close()
+
+    for username, result in sorted(results.items()):
+        mark = "✓" if result.success else "✗"
+        print(f"{mark} {username}: {result.message}")
+        for cmd in result.commands:
+            print(f"    {cmd}")
+    print(f"Reconciliation complete: {len(results)} account(s) drifted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Roll up raw metrics into 1m/1h/1d buckets and apply retention.
+
+When PUBNIX_METRICS_ARCHIVE_DIR is set, complete days of raw metrics are
+written to columnar files there (and copied to PUBNIX_METRICS_ARCHIVE_REMOTE
+if set) before anything is pruned.
+
+A bucket is rolled up once it ended PUBNIX_ROLLUP_LAG seconds ago
+(default 60), so samples written a little late are still included.
+
+Run periodically; see infrastructure/systemd/pubnix-rollup.timer.
+"""
+
+import os
+from datetime import timedelta
+
+from database import get_db_session
+from services.metrics_rollup import MetricsRollupService
+
+
+def main():
+    """Fold new samples into rollups, then prune expired data."""
+    session = get_db_session()
+    try:
+        service = MetricsRollupService(
+            session,
+            lag=timedelta(seconds=float(os.getenv("PUBNIX_ROLLUP_LAG", "60"))),
+        )
+        written = service.rollup()
+        archived = []
+        archive_dir = os.getenv("PUBNIX_METRICS_ARCHIVE_DIR")
+        if archive_dir:
+            from services.metrics_archive import MetricsArchiver
+
+            archived = MetricsArchiver(
+                session,
+                archive_dir,
+                remote_dir=os.getenv("PUBNIX_METRICS_ARCHIVE_REMOTE"),
+            ).archive()
+        deleted = service.prune()
+    finally:
+        session.close()
+
+    for key, count in sorted(written.items()):
+        print(f"✓ {key}: {count} rollup rows written")
+    for partition in archived:
+        print(f"✓ archived {partition.rows} rows to {partition.path}")
+    for key, count in sorted(deleted.items()):
+        if count:
+            print(f"✓ {key}: {count} expired rows pruned")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Any, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
@@ -18,7 +18,18 @@ from models import (
     User,
     UserStatus,
 )
-from services.metrics_collector import MetricsCollector
+from services.authorized_keys_index import (
+    AuthorizedKeysIndex,
+    get_authorized_keys_index,
+)
+from services.metrics_collector import MetricsCollector, get_metrics_collector
+from services.metrics_series import MetricsSeriesService
+from services.ssh_key_lookup import (
+    KeyOwner,
+    duplicate_fingerprints,
+    normalize_fingerprint,
+    owners_by_fingerprint,
+)
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -68,6 +79,7 @@ async def suspend_user(
     req: SuspendRequest,
     session: Session = Depends(get_session),
     admin: str = Depends(get_current_admin_username),
+    index: AuthorizedKeysIndex = Depends(get_authorized_keys_index),
 ) -> UserResponse:
     user = session.get(User, user_id)
     if not user:
@@ -77,6 +89,7 @@ async def suspend_user(
     session.add(user)
     session.commit()
     session.refresh(user)
+    index.invalidate(user.username)  # SSH keys are only served while approved
     return UserResponse(**user.model_dump())
 
 
@@ -85,6 +98,7 @@ async def unsuspend_user(
     user_id: int,
     session: Session = Depends(get_session),
     admin: str = Depends(get_current_admin_username),
+    index: AuthorizedKeysIndex = Depends(get_authorized_keys_index),
 ) -> UserResponse:
     user = session.get(User, user_id)
     if not user:
@@ -96,6 +110,7 @@ async def unsuspend_user(
     session.add(user)
     session.commit()
     session.refresh(user)
+    index.invalidate(user.username)  # SSH keys are only served while approved
     return UserResponse(**user.model_dump())
 
 
@@ -135,14 +150,61 @@ async def update_user_limits(
     return {"user_id": user_id, "limits": limits.model_dump()}
 
 
+class KeyOwnerResponse(BaseModel):
+    key_id: int
+    user_id: int
+    username: str
+    is_active: bool
+
+
+class SharedKeyResponse(BaseModel):
+    fingerprint: str
+    owners: list[KeyOwnerResponse]
+
+
+def _shared_key(fingerprint: str, owners: list[KeyOwner]) -> SharedKeyResponse:
+    return SharedKeyResponse(
+        fingerprint=f"SHA256:{fingerprint}",
+        owners=[KeyOwnerResponse(**vars(o)) for o in owners],
+    )
+
+
+@router.get("/ssh-keys/duplicates", response_model=list[SharedKeyResponse])
+async def duplicate_ssh_keys(
+    min_owners: int = Query(2, ge=2),
+    limit: int = Query(100, ge=1, le=1000),
+    session: Session = Depends(get_session),
+    admin: str = Depends(get_current_admin_username),
+) -> list[SharedKeyResponse]:
+    """Keys registered by several accounts: shared or leaked credentials."""
+    shared = duplicate_fingerprints(session, min_owners=min_owners, limit=limit)
+    return [_shared_key(fp, owners) for fp, owners in shared.items()]
+
+
+@router.get("/ssh-keys/lookup", response_model=SharedKeyResponse)
+async def lookup_ssh_key(
+    fingerprint: str = Query(..., description="SHA256 fingerprint"),
+    session: Session = Depends(get_session),
+    admin: str = Depends(get_current_admin_username),
+) -> SharedKeyResponse:
+    """Which accounts hold the key with this fingerprint."""
+    fingerprint = normalize_fingerprint(fingerprint)
+    owners = owners_by_fingerprint(session, [fingerprint]).get(fingerprint)
+    if not owners:
+        raise HTTPException(status_code=404, detail="Fingerprint not found")
+    return _shared_key(fingerprint, owners)
+
+
 class HealthResponse(BaseModel):
     system: dict[str, Any]
     summary: dict[str, int]
+    trends: dict[str, Any] = Field(default_factory=dict)
 
 
 @router.get("/health", response_model=HealthResponse)
 async def system_health(
     session: Session = Depends(get_session),
+    collector: MetricsCollector = Depends(get_metrics_collector),
     admin: str = Depends(get_current_admin_username),
 ) -> HealthResponse:
     # Summary counts
@@ -155,9 +217,22 @@ async def system_health(
     total_ssh_keys = len(session.exec(select(SshKey)).all())
 
     # System metrics snapshot
-    collector = MetricsCollector()
     sys = collector.collect_system_metrics().model_dump()
 
+    # Hourly averages over the last day, aggregated in the database
+    now = datetime.now(timezone.utc)
+    series = MetricsSeriesService(session)
+    trends = {
+        metric: series.series(
+            "system", metric, now - timedelta(hours=24), now, 3600, now=now
+        )
+        for metric in (
+            "cpu_usage_percent",
+            "memory_usage_percent",
+            "disk_usage_percent",
+        )
+    }
+
     return HealthResponse(
         system=sys,
         summary={
@@ -166,4 +241,5 @@ async def system_health(
             "pending_applications": len(pending_apps),
             "ssh_keys": total_ssh_keys,
         },
+        trends={m: {"t": s["t"], "avg": s["avg"]} for m, s in trends.items()},
     )
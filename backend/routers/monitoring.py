@@ -1,16 +1,23 @@
-"""Monitoring endpoints: Prometheus metrics and simple alerts stub."""
+"""Monitoring endpoints: Prometheus metrics, metric history and alerts."""
 
 from __future__ import annotations
 
-from typing import Any
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
 
-from fastapi import APIRouter, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from prometheus_client import (
     CONTENT_TYPE_LATEST,
     CollectorRegistry,
     Gauge,
     generate_latest,
 )
+from sqlmodel import Session
+
+from database import get_session
+from routers.admin import get_current_admin_username
+from services.alert_engine import AlertEngine, get_alert_engine
+from services.metrics_series import MetricsSeriesService
 
 router = APIRouter(prefix="/monitoring", tags=["monitoring"])
 
@@ -30,6 +37,42 @@ async def prometheus_metrics() -> Response:
 
 
 @router.get("/alerts/health")
-async def simple_health_alert() -> dict[str, Any]:
-    # Stub: would evaluate recent metrics and raise alerts
-    return {"status": "ok"}
+async def simple_health_alert(
+    engine: AlertEngine = Depends(get_alert_engine),
+) -> dict[str, Any]:
+    return engine.report()
+
+
+@router.get("/series")
+async def metric_series(
+    metric: str = Query(..., description="Column of the source table"),
+    source: str = Query("system", pattern="^(system|user)$"),
+    subject: str = Query("", description="Username for user metrics"),
+    start: Optional[datetime] = Query(None, description="Default: end - 24h"),
+    end: Optional[datetime] = Query(None, description="Default: now"),
+    step: int = Query(300, ge=10, le=86400, description="Bucket width (s)"),
+    session: Session = Depends(get_session),
+    admin: str = Depends(get_current_admin_username),
+) -> dict[str, Any]:
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(hours=24)
+    try:
+        return MetricsSeriesService(session).series(
+            source, metric, start, end, step, subject=subject
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.get("/top-users")
+async def top_users(
+    by: str = Query("cpu", pattern="^(cpu|memory|disk)$"),
+    window: int = Query(3600, ge=60, le=400 * 86400, description="Seconds"),
+    limit: int = Query(10, ge=1, le=100),
+    session: Session = Depends(get_session),
+    admin: str = Depends(get_current_admin_username),
+) -> dict[str, Any]:
+    now = datetime.now(timezone.utc)
+    return MetricsSeriesService(session).top_users(
+        by, now - timedelta(seconds=window), now, limit=limit
+    )
@@ -3,12 +3,23 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
 
 from database import get_session
 from models import SshKey, User
 from services.audit_logger import AuditLogger
+from services.authorized_keys_index import (
+    AuthorizedKeysIndex,
+    get_authorized_keys_index,
+)
+from services.ssh_key_import import (
+    ImportEntry,
+    entries_from_authorized_keys,
+    import_keys,
+)
 from services.ssh_key_service import SshKeyService
 
 router = APIRouter(prefix="/ssh-keys", tags=["ssh-keys"])
@@ -20,6 +31,32 @@ class SshKeyCreate(BaseModel):
     public_key: str = Field(..., description="OpenSSH public key line")
 
 
+class SshKeyImportItem(BaseModel):
+    username: str = Field(..., description="Owner username")
+    public_key: str = Field(..., description="OpenSSH public key line")
+    name: str | None = Field(None, max_length=100, description="Key label")
+
+
+class SshKeyImportRequest(BaseModel):
+    keys: list[SshKeyImportItem] = Field(default_factory=list)
+    authorized_keys: dict[str, str] = Field(
+        default_factory=dict,
+        description="Whole authorized_keys file contents by username",
+    )
+
+
+class SshKeyImportError(BaseModel):
+    username: str
+    line: int | None
+    detail: str
+
+
+class SshKeyImportResponse(BaseModel):
+    imported: dict[str, int]
+    duplicates: int
+    errors: list[SshKeyImportError]
+
+
 class SshKeyResponse(BaseModel):
     id: int
     user_id: int
@@ -29,9 +66,23 @@ class SshKeyResponse(BaseModel):
     is_active: bool
 
 
+def _invalidate_owner(
+    session: Session,
+    index: AuthorizedKeysIndex,
+    user_id: int,
+) -> None:
+    user = session.get(User, user_id)
+    if user is not None:
+        index.invalidate(user.username)
+    else:
+        index.invalidate_all()
+
+
 @router.post("/", response_model=SshKeyResponse, status_code=status.HTTP_201_CREATED)
 async def add_ssh_key(
-    key_data: SshKeyCreate, session: Session = Depends(get_session)
+    key_data: SshKeyCreate,
+    session: Session = Depends(get_session),
+    index: AuthorizedKeysIndex = Depends(get_authorized_keys_index),
 ) -> SshKeyResponse:
     auditor = AuditLogger()
     # Ensure user exists
@@ -63,13 +114,21 @@ async def add_ssh_key(
     key = SshKey(
         user_id=user.id,
         name=key_data.name,
-        public_key=key_data.public_key.strip(),
+        public_key=parsed.line,
         fingerprint=parsed.fingerprint,
         is_active=True,
     )
     session.add(key)
-    session.commit()
+    try:
+        session.commit()
+    except IntegrityError as exc:
+        # Lost a race with a concurrent add of the same key
+        session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Key already exists for user"
+        ) from exc
     session.refresh(key)
+    index.invalidate(user.username)
 
     auditor.log(
         "ssh_key_added",
@@ -82,6 +141,40 @@ async def add_ssh_key(
     return SshKeyResponse(**key.model_dump())
 
 
+@router.post("/import", response_model=SshKeyImportResponse)
+def import_ssh_keys(
+    import_data: SshKeyImportRequest,
+    session: Session = Depends(get_session),
+    index: AuthorizedKeysIndex = Depends(get_authorized_keys_index),
+) -> SshKeyImportResponse:
+    # Plain def: large imports parse in a process pool, off the event loop
+    entries = [
+        ImportEntry(username=k.username, public_key=k.public_key.strip(), name=k.name)
+        for k in import_data.keys
+    ]
+    for username, content in import_data.authorized_keys.items():
+        entries.extend(entries_from_authorized_keys(username, content))
+    report = import_keys(session, entries)
+
+    for username in report.imported:
+        index.invalidate(username)
+    AuditLogger().log(
+        "ssh_keys_imported",
+        users=len(report.imported),
+        imported=sum(report.imported.values()),
+        duplicates=report.duplicates,
+        errors=len(report.errors),
+    )
+    return SshKeyImportResponse(
+        imported=report.imported,
+        duplicates=report.duplicates,
+        errors=[
+            SshKeyImportError(username=e.username, line=e.line, detail=e.detail)
+            for e in report.errors
+        ],
+    )
+
+
 @router.get("/", response_model=list[SshKeyResponse])
 async def list_ssh_keys(
     username: str | None = Query(None, description="Filter by username"),
@@ -99,7 +192,9 @@ async def list_ssh_keys(
 
 @router.post("/{key_id}/deactivate", response_model=SshKeyResponse)
 async def deactivate_ssh_key(
-    key_id: int, session: Session = Depends(get_session)
+    key_id: int,
+    session: Session = Depends(get_session),
+    index: AuthorizedKeysIndex = Depends(get_authorized_keys_index),
 ) -> SshKeyResponse:
     auditor = AuditLogger()
     key = session.get(SshKey, key_id)
@@ -111,13 +206,16 @@ async def deactivate_ssh_key(
     session.add(key)
     session.commit()
     session.refresh(key)
+    _invalidate_owner(session, index, key.user_id)
     auditor.log("ssh_key_deactivated", key_id=key.id, fingerprint=key.fingerprint)
     return SshKeyResponse(**key.model_dump())
 
 
 @router.delete("/{key_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_ssh_key(
-    key_id: int, session: Session = Depends(get_session)
+    key_id: int,
+    session: Session = Depends(get_session),
+    index: AuthorizedKeysIndex = Depends(get_authorized_keys_index),
 ) -> Response:
     auditor = AuditLogger()
     key = session.get(SshKey, key_id)
@@ -125,7 +223,22 @@ async def delete_ssh_key(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Key not found"
         )
+    user_id = key.user_id
     session.delete(key)
     session.commit()
+    _invalidate_owner(session, index, user_id)
     auditor.log("ssh_key_deleted", key_id=key_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get("/authorized-keys/{username}", response_class=PlainTextResponse)
+async def authorized_keys(
+    username: str,
+    index: AuthorizedKeysIndex = Depends(get_authorized_keys_index),
+) -> PlainTextResponse:
+    """authorized_keys content for sshd's AuthorizedKeysCommand.
+
+    Not exposed through nginx; sshd reaches it on the loopback interface via
+    ``authorized_keys_command.py``.
+    """
+    return PlainTextResponse(index.get(username))
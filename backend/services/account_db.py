@@ -0,0 +1,166 @@
+"""Direct, lock-guarded writer for the passwd, group and shadow databases.
+
+Used for bulk account creation: instead of running ``useradd`` (and taking
+the ``/etc/.pwd.lock`` lock) once per user, all new entries are appended in a
+single critical section. The lock is the same one ``lckpwdf(3)`` and the
+shadow-utils tools take, so concurrent ``useradd``/``passwd`` runs are
+serialised against us. Each file is replaced atomically via a temporary file
+and ``rename``; group files are written before passwd so a passwd entry never
+references a group that does not exist yet.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import os
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+LOCK_FILE = ".pwd.lock"
+
+
+@dataclass
+class AccountSpec:
+    username: str
+    home: str
+    shell: str
+    gecos: str = ""
+
+
+@dataclass
+class NewAccount:
+    username: str
+    uid: int
+    gid: int
+    home: str
+    shell: str
+
+
+def _numeric_ids(lines: list[str]) -> set[int]:
+    """Ids in the third field, skipping comments, NIS ``+``/``-`` and short lines."""
+    ids = set()
+    for line in lines:
+        fields = line.split(":")
+        if len(fields) > 2 and fields[2].isdigit():
+            ids.add(int(fields[2]))
+    return ids
+
+
+class AccountDbWriter:
+    """Append accounts to ``<root>/etc/{passwd,group,shadow,gshadow}``."""
+
+    def __init__(
+        self,
+        root: str = "/",
+        uid_min: int = 1000,
+        uid_max: int = 60000,
+        lock_timeout: float = 15.0,
+    ) -> None:
+        self.etc = os.path.join(root, "etc")
+        self.uid_min = uid_min
+        self.uid_max = uid_max
+        self.lock_timeout = lock_timeout
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """Hold the lckpwdf-compatible lock, waiting up to ``lock_timeout``."""
+        fd = os.open(os.path.join(self.etc, LOCK_FILE), os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            deadline = time.monotonic() + self.lock_timeout
+            while True:
+                try:
+                    fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except OSError as exc:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError("Could not lock account databases") from exc
+                    time.sleep(0.05)
+            yield
+        finally:
+            os.close(fd)  # closing the descriptor releases the lock
+
+    def _read(self, name: str) -> list[str]:
+        try:
+            with open(os.path.join(self.etc, name), encoding="utf-8") as fh:
+                return fh.read().splitlines()
+        except FileNotFoundError:
+            return []
+
+    def _replace(self, name: str, lines: list[str]) -> None:
+        path = os.path.join(self.etc, name)
+        tmp = f"{path}.pubnix-tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                fh.write("\n".join(lines) + "\n")
+                fh.flush()
+                try:
+                    st = os.stat(path)
+                    os.fchmod(fh.fileno(), st.st_mode & 0o7777)
+                    os.fchown(fh.fileno(), st.st_uid, st.st_gid)
+                except FileNotFoundError:
+                    os.fchmod(fh.fileno(), 0o600 if "shadow" in name else 0o644)
+                os.fsync(fh.fileno())
+            os.rename(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def _next_free(self, used: set[int], start: int) -> int:
+        candidate = max(start, self.uid_min)
+        while candidate in used:
+            candidate += 1
+        if candidate > self.uid_max:
+            raise RuntimeError("No free uid/gid left in the configured range")
+        return candidate
+
+    def add_accounts(self, specs: list[AccountSpec]) -> list[NewAccount]:
+        """Create entries for every spec whose username is not yet taken.
+
+        Each account gets a user-private group with gid equal to uid when
+        possible, and a locked password (``!``) in shadow since logins are
+        key-based. Returns only the accounts actually created.
+        """
+        with self.lock():
+            passwd = self._read("passwd")
+            group = self._read("group")
+            shadow = self._read("shadow")
+            gshadow = self._read("gshadow")
+
+            taken_names = {line.split(":", 1)[0] for line in passwd + group}
+            used_uids = _numeric_ids(passwd)
+            used_gids = _numeric_ids(group)
+            last_change = int(time.time() // 86400)
+
+            created: list[NewAccount] = []
+            next_uid = self.uid_min
+            for spec in specs:
+                if spec.username in taken_names:
+                    continue
+                uid = self._next_free(used_uids, next_uid)
+                gid = uid if uid not in used_gids else self._next_free(used_gids, uid)
+                used_uids.add(uid)
+                used_gids.add(gid)
+                taken_names.add(spec.username)
+                next_uid = uid + 1
+
+                passwd.append(
+                    f"{spec.username}:x:{uid}:{gid}:{spec.gecos}:{spec.home}:{spec.shell}"
+                )
+                group.append(f"{spec.username}:x:{gid}:")
+                shadow.append(f"{spec.username}:!:{last_change}:0:99999:7:::")
+                gshadow.append(f"{spec.username}:!::")
+                created.append(
+                    NewAccount(spec.username, uid, gid, spec.home, spec.shell)
+                )
+
+            if created:
+                self._replace("group", group)
+                if os.path.exists(os.path.join(self.etc, "gshadow")):
+                    self._replace("gshadow", gshadow)
+                self._replace("passwd", passwd)
+                self._replace("shadow", shadow)
+            return created
@@ -0,0 +1,336 @@
+"""In-process alert rules evaluated incrementally over metric samples.
+
+Rules are declarative (see ``AlertRule``) and can be loaded from a JSON
+file named by ``PUBNIX_ALERT_RULES``. Each sample is checked against the
+rules for its source as it arrives; the engine only keeps the last value
+per rule and subject (for rates) and when a breach started (for
+``for_seconds``), so no history is re-queried. Transitions to firing and
+back to resolved are written to the audit log.
+
+Per-user samples are only seen by the enforcement daemon, so its engine
+publishes its alerts to a JSON file (``PUBNIX_ALERT_STATE``) every round.
+The API's engine merges that file into ``report`` and ignores it once it
+is older than ``SHARED_STATE_MAX_AGE``, i.e. when the daemon is not running.
+"""
+
+from __future__ import annotations
+
+import json
+import operator
+import os
+import threading
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Literal, Optional
+
+import structlog
+from pydantic import BaseModel, Field, model_validator
+
+from models import SystemMetrics, UserMetrics
+from services.audit_logger import AuditLogger
+from services.metrics_collector import MetricsCollector
+from services.metrics_rollup import SOURCES
+
+_OPS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+SEVERITY_ORDER = {"warning": 1, "critical": 2}
+
+SHARED_STATE_MAX_AGE = 300.0  # seconds
+
+
+class AlertRule(BaseModel):
+    name: str = Field(..., min_length=1)
+    source: Literal["system", "user"]
+    metric: str = Field(..., description="SystemMetrics/UserMetrics field")
+    op: Literal[">", ">=", "<", "<="] = ">"
+    threshold: float
+    # "value" compares the sample; "rate" compares its change per second
+    kind: Literal["value", "rate"] = "value"
+    for_seconds: float = Field(0, ge=0, description="Breach must last this long")
+    severity: Literal["warning", "critical"] = "warning"
+    description: str = ""
+
+    @model_validator(mode="after")
+    def _known_metric(self) -> AlertRule:
+        metrics = SOURCES[self.source][2]
+        if self.metric not in metrics:
+            raise ValueError(
+                f"Unknown {self.source} metric {self.metric!r}; "
+                f"expected one of {', '.join(metrics)}"
+            )
+        return self
+
+
+DEFAULT_RULES = [
+    AlertRule(
+        name="high_cpu",
+        source="system",
+        metric="cpu_usage_percent",
+        threshold=90,
+        for_seconds=300,
+        description="System CPU above 90% for 5 minutes",
+    ),
+    AlertRule(
+        name="high_memory",
+        source="system",
+        metric="memory_usage_percent",
+        threshold=90,
+        for_seconds=300,
+        description="System memory above 90% for 5 minutes",
+    ),
+    AlertRule(
+        name="disk_almost_full",
+        source="system",
+        metric="disk_usage_percent",
+        threshold=95,
+        severity="critical",
+        description="Root filesystem above 95%",
+    ),
+    AlertRule(
+        name="user_cpu_burn",
+        source="user",
+        metric="cpu_time_seconds",
+        kind="rate",
+        threshold=0.9,
+        for_seconds=600,
+        description="User consuming more than 0.9 CPU cores for 10 minutes",
+    ),
+]
+
+
+def load_rules(path: Optional[str] = None) -> list[AlertRule]:
+    """Rules from a JSON list at ``path`` (or $PUBNIX_ALERT_RULES), else defaults."""
+    path = path or os.getenv("PUBNIX_ALERT_RULES")
+    if not path:
+        return list(DEFAULT_RULES)
+    with open(path, encoding="utf-8") as f:
+        return [AlertRule.model_validate(item) for item in json.load(f)]
+
+
+@dataclass
+class AlertState:
+    rule: AlertRule
+    subject: str  # username, or "" for system rules
+    state: Literal["pending", "firing"]
+    since: datetime  # when the current breach started
+    value: float
+    fired_at: Optional[datetime] = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "rule": self.rule.name,
+            "subject": self.subject,
+            "state": self.state,
+            "severity": self.rule.severity,
+            "value": self.value,
+            "threshold": self.rule.threshold,
+            "since": self.since.isoformat(),
+            "fired_at": self.fired_at.isoformat() if self.fired_at else None,
+            "description": self.rule.description,
+        }
+
+
+def _aware(ts: datetime) -> datetime:
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def read_published(
+    path: str,
+    max_age: float = SHARED_STATE_MAX_AGE,
+    now: Optional[datetime] = None,
+) -> list[dict[str, Any]]:
+    """Alerts written by ``AlertEngine.publish``; empty if missing or stale."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        updated_at = datetime.fromisoformat(payload["updated_at"])
+        alerts = payload["alerts"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return []
+    now = now or datetime.now(timezone.utc)
+    if (now - _aware(updated_at)).total_seconds() > max_age:
+        return []
+    return alerts
+
+
+class AlertEngine:
+    """Tracks pending and firing alerts for a fixed set of rules."""
+
+    def __init__(
+        self,
+        rules: Optional[Iterable[AlertRule]] = None,
+        shared_state: Optional[str] = None,
+    ) -> None:
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self.shared_state = shared_state  # file published by another engine
+        self._by_source: dict[str, list[AlertRule]] = {"system": [], "user": []}
+        for rule in self.rules:
+            self._by_source[rule.source].append(rule)
+        self._alerts: dict[tuple[str, str], AlertState] = {}
+        self._last: dict[tuple[str, str], tuple[float, datetime]] = {}
+        self._lock = threading.Lock()
+        self.auditor = AuditLogger()
+
+    def observe_system(self, sample: SystemMetrics) -> None:
+        self._observe("system", "", sample)
+
+    def observe_users(self, samples: Iterable[UserMetrics]) -> None:
+        for sample in samples:
+            self._observe("user", sample.username, sample)
+
+    def _observe(self, source: str, subject: str, sample: Any) -> None:
+        ts = _aware(sample.timestamp)
+        with self._lock:
+            for rule in self._by_source[source]:
+                value = float(getattr(sample, rule.metric))
+                key = (rule.name, subject)
+                if rule.kind == "rate":
+                    previous = self._last.get(key)
+                    self._last[key] = (value, ts)
+                    if previous is None:
+                        continue
+                    elapsed = (ts - previous[1]).total_seconds()
+                    if elapsed <= 0 or value < previous[0]:
+                        continue  # out of order, or the counter was reset
+                    value = (value - previous[0]) / elapsed
+                self._evaluate(rule, subject, value, ts)
+
+    def _evaluate(
+        self, rule: AlertRule, subject: str, value: float, ts: datetime
+    ) -> None:
+        key = (rule.name, subject)
+        alert = self._alerts.get(key)
+        if not _OPS[rule.op](value, rule.threshold):
+            if alert is not None:
+                del self._alerts[key]
+                if alert.state == "firing":
+                    self.auditor.log(
+                        "alert_resolved", **self._audit_fields(alert), value=value
+                    )
+            return
+        if alert is None:
+            alert = self._alerts[key] = AlertState(
+                rule=rule, subject=subject, state="pending", since=ts, value=value
+            )
+        alert.value = value
+        if (
+            alert.state == "pending"
+            and (ts - alert.since).total_seconds() >= rule.for_seconds
+        ):
+            alert.state = "firing"
+            alert.fired_at = ts
+            self.auditor.log("alert_firing", **self._audit_fields(alert), value=value)
+
+    @staticmethod
+    def _audit_fields(alert: AlertState) -> dict[str, Any]:
+        return {
+            "rule": alert.rule.name,
+            "subject": alert.subject,
+            "severity": alert.rule.severity,
+            "threshold": alert.rule.threshold,
+        }
+
+    def forget_users(self, keep: Iterable[str]) -> None:
+        """Drop state for users not in ``keep`` (e.g. after deprovisioning)."""
+        keep = set(keep)
+        with self._lock:
+            for store in (self._alerts, self._last):
+                for key in [k for k in store if k[1] and k[1] not in keep]:
+                    del store[key]
+
+    def alerts(self, include_pending: bool = True) -> list[AlertState]:
+        with self._lock:
+            return [
+                a
+                for a in self._alerts.values()
+                if include_pending or a.state == "firing"
+            ]
+
+    def status(self) -> str:
+        """``ok``, or the highest severity among firing alerts."""
+        firing = self.alerts(include_pending=False)
+        if not firing:
+            return "ok"
+        return max((a.rule.severity for a in firing), key=SEVERITY_ORDER.__getitem__)
+
+    def publish(self, path: str) -> None:
+        """Atomically write the current alerts to ``path`` for other processes."""
+        payload = {
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "alerts": [a.to_dict() for a in self.alerts()],
+        }
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp, path)
+
+    def report(self, now: Optional[datetime] = None) -> dict[str, Any]:
+        """Own alerts plus the published ones of ``shared_state``, by state."""
+        alerts = [a.to_dict() for a in self.alerts()]
+        if self.shared_state:
+            seen = {(a["rule"], a["subject"]) for a in alerts}
+            alerts += [
+                a
+                for a in read_published(self.shared_state, now=now)
+                if (a["rule"], a["subject"]) not in seen
+            ]
+        firing = [a for a in alerts if a["state"] == "firing"]
+        status = max(
+            (a["severity"] for a in firing),
+            key=SEVERITY_ORDER.__getitem__,
+            default="ok",
+        )
+        return {
+            "status": status,
+            "firing": firing,
+            "pending": [a for a in alerts if a["state"] == "pending"],
+        }
+
+
+class AlertSampler:
+    """Feeds system metrics into an engine from a background thread."""
+
+    def __init__(
+        self,
+        engine: AlertEngine,
+        collector: Optional[MetricsCollector] = None,
+        interval: float = 30.0,
+    ) -> None:
+        self.engine = engine
+        self.collector = collector or MetricsCollector()
+        self.interval = interval
+        self.logger = structlog.get_logger("alerts")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="alert-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.engine.observe_system(self.collector.collect_system_metrics())
+            except Exception as exc:  # keep sampling after transient failures
+                self.logger.warning("alert_sample_failed", error=str(exc))
+            self._stop.wait(self.interval)
+
+
+@lru_cache(maxsize=1)
+def get_alert_engine() -> AlertEngine:
+    """Process-wide engine, used as a FastAPI dependency."""
+    return AlertEngine(load_rules(), shared_state=os.getenv("PUBNIX_ALERT_STATE"))
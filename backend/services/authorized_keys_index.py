@@ -0,0 +1,164 @@
+"""In-memory authorized_keys lookup for sshd's AuthorizedKeysCommand.
+
+sshd asks for a user's keys on every login attempt. The index keeps the
+rendered ``authorized_keys`` bytes per username, so a lookup is a dict hit.
+A miss loads that one user's active keys with a single query. Each line
+is rebuilt from the parsed key (``algorithm key comment``) rather than
+copied from the row, so a stored value can never add options or extra
+lines; rows that no longer parse are left out. Blob checks are memoized,
+so re-parsing costs a base64 decode and one SHA256 per key.
+
+Only approved users get keys. Unknown or keyless usernames are cached too,
+in a bounded LRU, so a storm of invalid usernames cannot hammer the
+database or grow memory without bound. ``routers/ssh_keys.py`` invalidates
+a user's entry whenever one of their keys changes.
+
+Invalidation only reaches the cache of the process that made the change,
+so the API must run as a single uvicorn worker. ``claim_single_process``
+holds an ``flock`` for the life of the process: a second worker fails to
+start instead of serving revoked keys from its own cache.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable
+
+import structlog
+from sqlmodel import Session, col, select
+
+from database import get_db_session
+from models import SshKey, User, UserStatus
+from services.ssh_key_service import SshKeyService
+
+SessionFactory = Callable[[], Session]
+
+logger = structlog.get_logger("authorized_keys_index")
+
+
+def render_authorized_keys(public_keys: list[str]) -> bytes:
+    lines: list[str] = []
+    for key in public_keys:
+        try:
+            lines.append(f"{SshKeyService.parse_public_key(key).line}\n")
+        except ValueError as exc:
+            logger.warning("authorized_key_skipped", error=str(exc))
+    return "".join(lines).encode()
+
+
+def claim_single_process(lock_path: str) -> int:
+    """Lock ``lock_path`` until exit; RuntimeError if another process has it."""
+    fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError as exc:
+        os.close(fd)
+        raise RuntimeError(
+            "another process already serves authorized_keys; "
+            "run the API with a single worker"
+        ) from exc
+    return fd
+
+
+class AuthorizedKeysIndex:
+    def __init__(
+        self,
+        session_factory: SessionFactory = get_db_session,
+        max_negative: int = 10_000,
+    ) -> None:
+        self.session_factory = session_factory
+        self.max_negative = max_negative
+        self._entries: dict[str, bytes] = {}
+        self._negative: OrderedDict[str, None] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by every invalidation
+        self.hits = 0
+        self.misses = 0
+
+    def _query(
+        self, session: Session, usernames: list[str] | None
+    ) -> dict[str, list[str]]:
+        query = (
+            select(User.username, SshKey.public_key)
+            .join(SshKey, SshKey.user_id == User.id)
+            .where(
+                (User.status == UserStatus.APPROVED) & col(SshKey.is_active).is_(True)
+            )
+            .order_by(User.username, SshKey.id)
+        )
+        if usernames is not None:
+            query = query.where(col(User.username).in_(usernames))
+        keys: dict[str, list[str]] = {}
+        for username, public_key in session.exec(query):
+            keys.setdefault(username, []).append(public_key)
+        return keys
+
+    def get(self, username: str) -> bytes:
+        """Rendered authorized_keys for ``username`` (empty if none)."""
+        entry = self._entries.get(username)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        with self._lock:
+            if username in self._negative:
+                self._negative.move_to_end(username)
+                self.hits += 1
+                return b""
+            generation = self._generation
+        self.misses += 1
+
+        session = self.session_factory()
+        try:
+            keys = self._query(session, [username]).get(username, [])
+        finally:
+            session.close()
+        rendered = render_authorized_keys(keys)
+
+        with self._lock:
+            # Drop the result if the user was invalidated while we queried
+            if generation == self._generation:
+                if rendered:
+                    self._entries[username] = rendered
+                else:
+                    self._negative[username] = None
+                    while len(self._negative) > self.max_negative:
+                        self._negative.popitem(last=False)
+        return rendered
+
+    def warm(self) -> int:
+        """Load every approved user's keys at once; returns users indexed."""
+        with self._lock:
+            generation = self._generation
+        session = self.session_factory()
+        try:
+            keys = self._query(session, None)
+        finally:
+            session.close()
+        entries = {user: render_authorized_keys(k) for user, k in keys.items()}
+        with self._lock:
+            if generation == self._generation:
+                self._entries = entries
+                self._negative.clear()
+        return len(entries)
+
+    def invalidate(self, username: str) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(username, None)
+            self._negative.pop(username, None)
+
+    def invalidate_all(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries = {}
+            self._negative.clear()
+
+
+@lru_cache(maxsize=1)
+def get_authorized_keys_index() -> AuthorizedKeysIndex:
+    """Process-wide index, used as a FastAPI dependency."""
+    return AuthorizedKeysIndex()
@@ -0,0 +1,361 @@
+"""Materialize ``~/.ssh/authorized_keys`` files from the ssh_keys table.
+
+Each user's desired file content is hashed and compared with the file on
+disk. What was last written or verified is remembered as the content hash
+plus the file's size, mtime and inode (in memory and, optionally, in a
+JSON state file that survives restarts), so an untouched file costs one
+``stat``. A file whose stat differs is read and hashed before deciding, so
+a manually edited, deleted or re-permissioned file is repaired, while a
+lost state file does not rewrite everything. Writes go to a temporary file
+in ``~/.ssh`` that is fsynced, chowned and renamed over the old one, so
+sshd never sees a partial file. Home and ``.ssh`` are opened with
+``O_NOFOLLOW`` so a symlink planted by a user cannot redirect the write.
+
+The API process and the reconcile CLI share the state file. Saving takes
+an ``flock`` on ``<state>.lock`` and merges with what is on disk, so
+neither drops the other's entries.
+
+``reconcile`` checks every user in parallel. ``follow`` then keeps files
+current between reconciles: every ``interval`` seconds ``poll`` renders
+all users with one query and touches only those whose content changed
+since the previous poll. Both run as root (see ``sync_authorized_keys.py``
+and ``pubnix-authkeys-sync.service``); the API runs as ``www-data`` with
+``ProtectHome`` and never writes these files.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import os
+import stat
+import threading
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Optional
+
+import structlog
+from sqlmodel import Session, col, select
+
+from database import get_db_session
+from models import SshKey, User, UserStatus
+from services.authorized_keys_index import render_authorized_keys
+from services.provisioning_service import lookup_passwd
+
+SessionFactory = Callable[[], Session]
+
+
+@dataclass
+class SyncReport:
+    written: list[str] = field(default_factory=list)
+    unchanged: int = 0
+    skipped: list[str] = field(default_factory=list)  # no account or home
+    errors: dict[str, str] = field(default_factory=dict)
+
+    def record(self, username: str, outcome: str) -> None:
+        if outcome == "unchanged":
+            self.unchanged += 1
+        elif outcome == "skipped":
+            self.skipped.append(username)
+        else:
+            self.written.append(username)
+
+
+class AuthorizedKeysSync:
+    def __init__(
+        self,
+        session_factory: SessionFactory = get_db_session,
+        root: str = "/",
+        state_path: Optional[str] = None,
+        max_workers: int = 8,
+    ) -> None:
+        self.session_factory = session_factory
+        self.root = root
+        self.state_path = state_path
+        self.max_workers = max_workers
+        self.logger = structlog.get_logger("authorized_keys_sync")
+        # username -> [sha256, size, mtime_ns, inode] of the file on disk
+        self._state: dict[str, list] = {}
+        self._dirty: set[str] = set()
+        # username -> content last brought to disk, for ``poll``
+        self._synced: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._load_state()
+
+    # -- state -------------------------------------------------------------
+
+    def _read_state(self) -> dict[str, list]:
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Older state files stored only the hash: verified on first use
+        return {u: v if isinstance(v, list) else [v] for u, v in data.items()}
+
+    def _load_state(self) -> None:
+        if self.state_path:
+            self._state = self._read_state()
+
+    def _remember(self, username: str, signature: list) -> None:
+        with self._lock:
+            if self._state.get(username) != signature:
+                self._state[username] = signature
+                self._dirty.add(username)
+
+    def _save_state(self) -> None:
+        if not self.state_path:
+            return
+        with self._lock:
+            dirty = {u: self._state[u] for u in self._dirty}
+            self._dirty.clear()
+        if not dirty:
+            return
+        lock_fd = os.open(f"{self.state_path}.lock", os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            merged = self._read_state()
+            merged.update(dirty)
+            tmp = f"{self.state_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(merged, f, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.state_path)
+        finally:
+            os.close(lock_fd)  # releases the flock
+        with self._lock:
+            for username, signature in merged.items():
+                if username not in self._dirty:
+                    self._state[username] = signature
+
+    # -- desired content ---------------------------------------------------
+
+    def desired(self, usernames: Optional[Iterable[str]] = None) -> dict[str, bytes]:
+        """Rendered files for all users, or just ``usernames``.
+
+        Only approved users get keys; everyone else (including requested
+        names without an account) maps to empty content, so suspending a
+        user also empties their file.
+        """
+        query = (
+            select(User.username, SshKey.public_key)
+            .outerjoin(
+                SshKey,
+                (SshKey.user_id == User.id)
+                & col(SshKey.is_active).is_(True)
+                & (User.status == UserStatus.APPROVED),
+            )
+            .order_by(User.username, SshKey.id)
+        )
+        wanted = None if usernames is None else set(usernames)
+        if wanted is not None:
+            query = query.where(col(User.username).in_(wanted))
+        keys: dict[str, list[str]] = {u: [] for u in wanted or ()}
+        session = self.session_factory()
+        try:
+            for username, public_key in session.exec(query):
+                user_keys = keys.setdefault(username, [])
+                if public_key is not None:
+                    user_keys.append(public_key)
+        finally:
+            session.close()
+        return {u: render_authorized_keys(k) for u, k in keys.items()}
+
+    # -- writing -----------------------------------------------------------
+
+    def _home(self, username: str) -> Optional[tuple[int, int, str]]:
+        entry = lookup_passwd(username, self.root)
+        if entry is None:
+            return None
+        uid, gid, home = entry
+        return uid, gid, os.path.join(self.root, home.lstrip("/"))
+
+    def _open_ssh_dir(
+        self, username: str, create: bool
+    ) -> Optional[tuple[int, int, int]]:
+        """``(uid, gid, fd of ~/.ssh)``, or None without account, home or .ssh."""
+        account = self._home(username)
+        if account is None:
+            return None
+        uid, gid, home = account
+        nofollow = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW
+        try:
+            home_fd = os.open(home, nofollow)
+        except FileNotFoundError:
+            return None
+        try:
+            if create:
+                try:
+                    os.mkdir(".ssh", 0o700, dir_fd=home_fd)
+                    os.chown(".ssh", uid, gid, dir_fd=home_fd, follow_symlinks=False)
+                except FileExistsError:
+                    pass
+            try:
+                ssh_fd = os.open(".ssh", nofollow, dir_fd=home_fd)
+            except FileNotFoundError:
+                return None
+        finally:
+            os.close(home_fd)
+        return uid, gid, ssh_fd
+
+    def matches_disk(self, username: str, content: bytes) -> bool:
+        """Whether the user's file already holds ``content`` with our owner and mode.
+
+        A matching remembered stat answers without reading; otherwise the
+        file is hashed, and a match is remembered.
+        """
+        opened = self._open_ssh_dir(username, create=False)
+        if opened is None:
+            return False
+        uid, _, ssh_fd = opened
+        try:
+            try:
+                st = os.stat("authorized_keys", dir_fd=ssh_fd, follow_symlinks=False)
+            except FileNotFoundError:
+                return False
+            if (
+                not stat.S_ISREG(st.st_mode)
+                or st.st_size != len(content)
+                or st.st_uid != uid
+                or stat.S_IMODE(st.st_mode) != 0o600
+            ):
+                return False
+            digest = hashlib.sha256(content).hexdigest()
+            signature = [digest, st.st_size, st.st_mtime_ns, st.st_ino]
+            with self._lock:
+                if self._state.get(username) == signature:
+                    return True
+            fd = os.open(
+                "authorized_keys",
+                os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK,
+                dir_fd=ssh_fd,
+            )
+            with os.fdopen(fd, "rb") as f:
+                st = os.fstat(f.fileno())
+                if hashlib.sha256(f.read()).hexdigest() != digest:
+                    return False
+            self._remember(username, [digest, st.st_size, st.st_mtime_ns, st.st_ino])
+            return True
+        finally:
+            os.close(ssh_fd)
+
+    def write_file(self, username: str, content: bytes) -> bool:
+        """Atomically replace the user's file; False if they have no home."""
+        opened = self._open_ssh_dir(username, create=True)
+        if opened is None:
+            return False
+        uid, gid, ssh_fd = opened
+        try:
+            tmp = f".authorized_keys.{os.getpid()}.{threading.get_ident()}"
+            fd = os.open(
+                tmp,
+                os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW,
+                0o600,
+                dir_fd=ssh_fd,
+            )
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(content)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    os.fchown(f.fileno(), uid, gid)
+                    st = os.fstat(f.fileno())
+                os.replace(tmp, "authorized_keys", src_dir_fd=ssh_fd, dst_dir_fd=ssh_fd)
+            except BaseException:
+                try:
+                    os.unlink(tmp, dir_fd=ssh_fd)
+                except OSError:
+                    pass
+                raise
+        finally:
+            os.close(ssh_fd)
+        digest = hashlib.sha256(content).hexdigest()
+        self._remember(username, [digest, st.st_size, st.st_mtime_ns, st.st_ino])
+        return True
+
+    def _sync_one(self, username: str, content: bytes) -> str:
+        """``"unchanged"``, ``"skipped"`` or ``"written"``; raises OSError."""
+        if self.matches_disk(username, content):
+            return "unchanged"
+        if not self.write_file(username, content):
+            return "skipped"
+        return "written"
+
+    def _sync_each(self, desired: dict[str, bytes]) -> SyncReport:
+        report = SyncReport()
+        for username, content in desired.items():
+            try:
+                report.record(username, self._sync_one(username, content))
+            except OSError as exc:
+                report.errors[username] = str(exc)
+        self._save_state()
+        return report
+
+    def _remember_synced(self, desired: dict[str, bytes], report: SyncReport) -> None:
+        # Failed users are forgotten so the next poll retries them
+        for username, content in desired.items():
+            if username in report.errors:
+                self._synced.pop(username, None)
+            else:
+                self._synced[username] = content
+
+    def sync(self, usernames: Iterable[str]) -> SyncReport:
+        """Bring the given users' files up to date with one query."""
+        return self._sync_each(self.desired(usernames))
+
+    def reconcile(self) -> SyncReport:
+        """Check every user against their file on disk, repairing in parallel."""
+        report = SyncReport()
+        desired = self.desired()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                username: pool.submit(self._sync_one, username, content)
+                for username, content in desired.items()
+            }
+            # Outcomes are tallied here, not in the workers
+            for username, future in futures.items():
+                try:
+                    report.record(username, future.result())
+                except OSError as exc:
+                    report.errors[username] = str(exc)
+        self._save_state()
+        self._synced = {}
+        self._remember_synced(desired, report)
+        return report
+
+    # -- following changes -----------------------------------------------
+
+    def poll(self) -> SyncReport:
+        """Sync the users whose rendered keys changed since the last poll."""
+        desired = self.desired()
+        changed = {u: c for u, c in desired.items() if self._synced.get(u) != c}
+        report = self._sync_each(changed)
+        self._remember_synced(changed, report)
+        return report
+
+    def follow(self, stop: threading.Event, interval: float = 5.0) -> None:
+        """Reconcile once, then poll every ``interval`` seconds until ``stop``."""
+        self._log_report(self.reconcile())
+        while not stop.wait(interval):
+            try:
+                self._log_report(self.poll())
+            except Exception as exc:  # e.g. database down; retried next poll
+                self.logger.warning("authorized_keys_sync_failed", error=str(exc))
+
+    def _log_report(self, report: SyncReport) -> None:
+        for username in report.written:
+            self.logger.info("authorized_keys_written", user=username)
+        for username, error in report.errors.items():
+            self.logger.warning(
+                "authorized_keys_write_failed", user=username, error=error
+            )
+
+
+@lru_cache(maxsize=1)
+def get_authorized_keys_sync() -> AuthorizedKeysSync:
+    """Process-wide sync engine, used as a FastAPI dependency."""
+    return AuthorizedKeysSync(state_path=os.getenv("PUBNIX_AUTHKEYS_STATE"))
@@ -0,0 +1,229 @@
+"""Chunked authenticated encryption for backup archives.
+
+Fernet needs the whole plaintext in memory, which does not work for
+multi-gigabyte archives. This container splits the stream into fixed-size
+chunks, each sealed with AES-256-GCM, so encryption and decryption run in
+constant memory.
+
+Layout (all integers big-endian)::
+
+    header  magic "PNXBKUP\\0" | version u8 | chunk_size u32 | salt 16B | nonce prefix 8B
+    frame*  final u8 | length u32 | ciphertext+tag (length bytes)
+
+The key is derived from the password and salt with PBKDF2-SHA256. Chunk
+``i`` uses nonce ``prefix || i`` (u32), and its associated data is the
+header, ``i`` and the final flag. Reordered, dropped or spliced chunks
+therefore fail authentication, and a stream that stops before a final
+chunk is reported as truncated.
+
+Version 1 is the legacy format: 16 bytes of salt followed by a Fernet
+token. Those files are still readable (in memory) via ``decrypt_legacy``.
+"""
+
+from __future__ import annotations
+
+import base64
+import io
+import os
+import struct
+from typing import BinaryIO, Optional
+
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+MAGIC = b"PNXBKUP\0"
+FORMAT_VERSION = 2
+LEGACY_FORMAT_VERSION = 1
+DEFAULT_CHUNK_SIZE = 1 << 20
+MAX_CHUNK_SIZE = 1 << 26
+KDF_ITERATIONS = 200_000
+
+HEADER = struct.Struct(">8sBI16s8s")
+FRAME = struct.Struct(">BI")
+TAG_SIZE = 16
+
+
+class BackupDecryptionError(ValueError):
+    """Wrong password, or the backup was corrupted or tampered with."""
+
+
+def derive_key(password: str, salt: bytes, length: int = 32) -> bytes:
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=length,
+        salt=salt,
+        iterations=KDF_ITERATIONS,
+    )
+    return kdf.derive(password.encode("utf-8"))
+
+
+def _aad(header: bytes, index: int, final: bool) -> bytes:
+    return header + struct.pack(">QB", index, final)
+
+
+def _nonce(prefix: bytes, index: int) -> bytes:
+    if index >= 1 << 32:
+        raise ValueError("Too many chunks for one backup")
+    return prefix + struct.pack(">I", index)
+
+
+class EncryptingWriter(io.RawIOBase):
+    """Writable stream that seals everything written into ``dst``.
+
+    ``close`` writes the final chunk; ``dst`` itself is left open.
+    """
+
+    def __init__(
+        self, dst: BinaryIO, password: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> None:
+        super().__init__()
+        if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError("Invalid chunk size")
+        self.dst = dst
+        self.chunk_size = chunk_size
+        salt = os.urandom(16)
+        self._prefix = os.urandom(8)
+        self._header = HEADER.pack(
+            MAGIC, FORMAT_VERSION, chunk_size, salt, self._prefix
+        )
+        self._aead = AESGCM(derive_key(password, salt))
+        self._buffer = bytearray()
+        self._index = 0
+        self._aborted = False
+        dst.write(self._header)
+
+    def writable(self) -> bool:
+        return True
+
+    def _seal(self, data: bytes, final: bool) -> None:
+        sealed = self._aead.encrypt(
+            _nonce(self._prefix, self._index),
+            data,
+            _aad(self._header, self._index, final),
+        )
+        self.dst.write(FRAME.pack(final, len(sealed)))
+        self.dst.write(sealed)
+        self._index += 1
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("write to closed stream")
+        self._buffer += data
+        # Keep the last (possibly full) chunk back: only close knows it is final
+        size = self.chunk_size
+        if len(self._buffer) > size:
+            cut = (len(self._buffer) - 1) // size * size
+            with memoryview(self._buffer) as view:
+                for start in range(0, cut, size):
+                    self._seal(view[start : start + size], final=False)
+            del self._buffer[:cut]
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed and not self._aborted:
+            self._seal(bytes(self._buffer), final=True)
+            self._buffer = bytearray()
+        super().close()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # Without a final chunk the output reads as truncated, never as a
+        # complete backup of partial input
+        self._aborted = exc_type is not None
+        self.close()
+
+
+class DecryptingReader(io.RawIOBase):
+    """Readable stream of the plaintext sealed in ``src`` by EncryptingWriter."""
+
+    def __init__(self, src: BinaryIO, password: str) -> None:
+        super().__init__()
+        self.src = src
+        header = _read_exact(src, HEADER.size)
+        magic, version, chunk_size, salt, prefix = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise BackupDecryptionError("Not a chunked backup container")
+        if version != FORMAT_VERSION:
+            raise BackupDecryptionError(f"Unsupported backup format {version}")
+        if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            raise BackupDecryptionError("Invalid chunk size in header")
+        self.chunk_size = chunk_size
+        self._header = header
+        self._prefix = prefix
+        self._aead = AESGCM(derive_key(password, salt))
+        self._chunk = memoryview(b"")
+        self._index = 0
+        self._done = False
+
+    def readable(self) -> bool:
+        return True
+
+    def _next_chunk(self) -> None:
+        frame = self.src.read(FRAME.size)
+        if len(frame) < FRAME.size:
+            raise BackupDecryptionError("Backup is truncated")
+        final, length = FRAME.unpack(frame)
+        if final > 1 or length > self.chunk_size + TAG_SIZE:
+            raise BackupDecryptionError("Backup is corrupt")
+        sealed = _read_exact(self.src, length)
+        try:
+            data = self._aead.decrypt(
+                _nonce(self._prefix, self._index),
+                sealed,
+                _aad(self._header, self._index, bool(final)),
+            )
+        except InvalidTag as exc:
+            raise BackupDecryptionError(
+                "Backup is corrupt or the password is wrong"
+            ) from exc
+        self._index += 1
+        self._chunk = memoryview(data)
+        if final:
+            if self.src.read(1):
+                raise BackupDecryptionError("Unexpected data after final chunk")
+            self._done = True
+
+    def readinto(self, buffer) -> int:
+        while not self._chunk and not self._done:
+            self._next_chunk()
+        n = min(len(buffer), len(self._chunk))
+        buffer[:n] = self._chunk[:n]
+        self._chunk = self._chunk[n:]
+        return n
+
+
+def _read_exact(src: BinaryIO, size: int) -> bytes:
+    data = src.read(size)
+    if len(data) != size:
+        raise BackupDecryptionError("Backup is truncated")
+    return data
+
+
+def detect_format(src: BinaryIO) -> int:
+    """Container version of the stream at its current position (not consumed)."""
+    start = src.tell()
+    head = src.read(len(MAGIC) + 1)
+    src.seek(start)
+    if head[: len(MAGIC)] == MAGIC:
+        return head[len(MAGIC)]
+    return LEGACY_FORMAT_VERSION
+
+
+def decrypt_legacy(blob: bytes, password: str) -> bytes:
+    salt, token = blob[:16], blob[16:]
+    key = base64.urlsafe_b64encode(derive_key(password, salt))
+    try:
+        return Fernet(key).decrypt(token)
+    except InvalidToken as exc:
+        raise BackupDecryptionError(
+            "Backup is corrupt or the password is wrong"
+        ) from exc
+
+
+def open_decrypted(src: BinaryIO, password: str) -> Optional[io.BufferedReader]:
+    """Buffered plaintext reader for a chunked container, None for legacy files."""
+    if detect_format(src) == LEGACY_FORMAT_VERSION:
+        return None
+    return io.BufferedReader(DecryptingReader(src, password), DEFAULT_CHUNK_SIZE)
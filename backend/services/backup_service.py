@@ -1,31 +1,122 @@
 """Backup and restore service for ATL Pubnix.
 
-Creates compressed archives of important paths, encrypts them with Fernet
-(AES-128-CBC + HMAC via cryptography's Fernet), writes a manifest with
-checksums, and can verify and restore. Upload step is abstracted to a simple
-filesystem copy to simulate remote storage (e.g., Hetzner Storage Box mount).
+Creates compressed archives of important paths (gzip by default, or
+zstd/lz4 via ``services.backup_compression``), encrypts them into the
+chunked AES-GCM container from ``services.backup_crypto``, writes a manifest
+with checksums, and can verify and restore. Every step streams in fixed-size
+blocks, so memory use does not grow with the archive. Upload step is
+abstracted to a simple filesystem copy to simulate remote storage (e.g.,
+Hetzner Storage Box mount). Archives encrypted with the older whole-file
+Fernet format can still be restored.
 """
 
 from __future__ import annotations
 
-import base64
 import hashlib
-import os
+import io
+import queue
+import shutil
 import tarfile
+import threading
 from collections.abc import Iterable
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Optional
+from typing import BinaryIO, List, Optional
 
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from services.backup_compression import Compression, detect_compression
+from services.backup_crypto import (
+    DEFAULT_CHUNK_SIZE,
+    FORMAT_VERSION,
+    EncryptingWriter,
+    decrypt_legacy,
+    open_decrypted,
+)
+
+COPY_BUFSIZE = 1 << 20
+
+
+class _HashingWriter(io.RawIOBase):
+    """Pass-through writer that hashes and counts what goes to ``dst``."""
+
+    def __init__(self, dst: BinaryIO) -> None:
+        super().__init__()
+        self.dst = dst
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        self.dst.write(data)
+        return len(data)
+
+
+class _ThreadedSink(io.RawIOBase):
+    """Hands written blocks to a thread that writes them on to ``dst``.
+
+    Compression in the caller overlaps with encryption, hashing and disk
+    writes in the thread. The queue is bounded, so at most ``depth`` blocks
+    are in flight; a failure in the thread is raised in the caller.
+    """
+
+    def __init__(self, dst: BinaryIO, depth: int = 4) -> None:
+        super().__init__()
+        self.dst = dst
+        self._queue: queue.Queue[Optional[bytes]] = queue.Queue(maxsize=depth)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="backup-writer")
+        self._thread.start()
+
+    def writable(self) -> bool:
+        return True
+
+    def _run(self) -> None:
+        while (block := self._queue.get()) is not None:
+            if self._error is None:  # keep draining so the caller never blocks
+                try:
+                    self.dst.write(block)
+                except BaseException as exc:
+                    self._error = exc
+
+    def write(self, data) -> int:
+        if self._error is not None:
+            raise self._error
+        self._queue.put(bytes(data))
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._queue.put(None)
+            self._thread.join()
+        super().close()
+        if self._error is not None:
+            raise self._error
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while block := f.read(COPY_BUFSIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(manifest_path: Path) -> dict[str, str]:
+    entries: dict[str, str] = {}
+    for line in manifest_path.read_text().splitlines():
+        key, sep, value = line.partition("=")
+        if sep:
+            entries[key.strip()] = value.strip()
+    return entries
 
 
 @dataclass
 class BackupResult:
-    archive_path: Path
+    archive_path: Optional[Path]  # None when pipelined: no plaintext copy
     encrypted_path: Path
     manifest_path: Path
 
@@ -35,67 +126,86 @@ class BackupService:
         self,
         backup_dir: Path | str = "backups",
         remote_dir: Optional[Path | str] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        compression: Optional[Compression] = None,
     ) -> None:
         self.backup_dir = Path(backup_dir)
+        self.chunk_size = chunk_size
+        self.compression = compression or Compression()
         self.remote_dir = Path(remote_dir) if remote_dir else None
         self.backup_dir.mkdir(parents=True, exist_ok=True)
         if self.remote_dir:
             self.remote_dir.mkdir(parents=True, exist_ok=True)
 
-    def _derive_key(self, password: str, salt: bytes) -> bytes:
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=200_000,
-        )
-        return base64.urlsafe_b64encode(kdf.derive(password.encode("utf-8")))
+    def _archive_path(self, name_prefix: str) -> Path:
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        return self.backup_dir / f"{name_prefix}_{timestamp}{self.compression.suffix}"
 
-    def _encrypt_bytes(self, data: bytes, password: str) -> bytes:
-        salt = os.urandom(16)
-        key = self._derive_key(password, salt)
-        token = Fernet(key).encrypt(data)
-        return salt + token  # prepend salt for later derivation
+    @staticmethod
+    def _add_paths(tf: tarfile.TarFile, paths: Iterable[Path | str]) -> None:
+        for p in paths:
+            p = Path(p)
+            if not p.exists():
+                continue
+            tf.add(p, arcname=p.name)
 
-    def _decrypt_bytes(self, blob: bytes, password: str) -> bytes:
-        salt, token = blob[:16], blob[16:]
-        key = self._derive_key(password, salt)
-        return Fernet(key).decrypt(token)
+    def _write_archive(self, fileobj: BinaryIO, paths: Iterable[Path | str]) -> None:
+        with self.compression.writer(fileobj) as compressed:
+            with tarfile.open(fileobj=compressed, mode="w|") as tf:
+                self._add_paths(tf, paths)
 
     def create_archive(self, name_prefix: str, paths: Iterable[Path | str]) -> Path:
-        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-        archive_path = self.backup_dir / f"{name_prefix}_{timestamp}.tar.gz"
-        with tarfile.open(archive_path, "w:gz") as tf:
-            for p in paths:
-                p = Path(p)
-                if not p.exists():
-                    continue
-                tf.add(p, arcname=p.name)
+        archive_path = self._archive_path(name_prefix)
+        with archive_path.open("wb") as f:
+            self._write_archive(f, paths)
         return archive_path
 
+    def _encrypt_file(self, archive_path: Path, password: str) -> tuple[Path, str]:
+        encrypted_path = archive_path.with_suffix(archive_path.suffix + ".enc")
+        with archive_path.open("rb") as src, encrypted_path.open("wb") as dst:
+            hashed = _HashingWriter(dst)
+            with EncryptingWriter(hashed, password, self.chunk_size) as writer:
+                shutil.copyfileobj(src, writer, COPY_BUFSIZE)
+        return encrypted_path, hashed.sha256.hexdigest()
+
     def encrypt_archive(self, archive_path: Path, password: str) -> Path:
+        return self._encrypt_file(archive_path, password)[0]
+
+    def _archive_encrypted(
+        self, name_prefix: str, paths: Iterable[Path | str], password: str
+    ) -> tuple[Path, str]:
+        """tar -> compress -> encrypt -> SHA-256 -> disk in a single pass."""
+        archive_path = self._archive_path(name_prefix)
         encrypted_path = archive_path.with_suffix(archive_path.suffix + ".enc")
-        data = archive_path.read_bytes()
-        enc = self._encrypt_bytes(data, password)
-        encrypted_path.write_bytes(enc)
-        return encrypted_path
+        try:
+            with encrypted_path.open("wb") as dst:
+                hashed = _HashingWriter(dst)
+                with EncryptingWriter(hashed, password, self.chunk_size) as writer:
+                    sink = _ThreadedSink(writer)
+                    with io.BufferedWriter(sink, COPY_BUFSIZE) as buffered:
+                        self._write_archive(buffered, paths)
+        except BaseException:
+            encrypted_path.unlink(missing_ok=True)
+            raise
+        return encrypted_path, hashed.sha256.hexdigest()
 
-    def write_manifest(self, encrypted_path: Path) -> Path:
-        sha256 = hashlib.sha256(encrypted_path.read_bytes()).hexdigest()
+    def write_manifest(
+        self, encrypted_path: Path, sha256: Optional[str] = None
+    ) -> Path:
+        """Write the checksum manifest; ``sha256`` skips re-reading the file."""
+        sha256 = sha256 or _sha256_file(encrypted_path)
         manifest_path = encrypted_path.with_suffix(encrypted_path.suffix + ".manifest")
-        manifest_path.write_text(f"sha256={sha256}\nfilename={encrypted_path.name}\n")
+        manifest_path.write_text(
+            f"sha256={sha256}\nfilename={encrypted_path.name}\n"
+            f"format={FORMAT_VERSION}\ncompression={self.compression.codec}\n"
+        )
         return manifest_path
 
     def verify(self, encrypted_path: Path, manifest_path: Path) -> bool:
-        expected = None
-        for line in manifest_path.read_text().splitlines():
-            if line.startswith("sha256="):
-                expected = line.split("=", 1)[1].strip()
-                break
+        expected = read_manifest(manifest_path).get("sha256")
         if not expected:
             return False
-        actual = hashlib.sha256(encrypted_path.read_bytes()).hexdigest()
-        return expected == actual
+        return expected == _sha256_file(encrypted_path)
 
     def upload(self, encrypted_path: Path, manifest_path: Path) -> Optional[List[Path]]:
         if not self.remote_dir:
@@ -103,24 +213,37 @@ class BackupService:
         dest_files: List[Path] = []
         for src in (encrypted_path, manifest_path):
             dest = self.remote_dir / src.name
-            dest.write_bytes(src.read_bytes())
+            shutil.copyfile(src, dest)
             dest_files.append(dest)
         return dest_files
 
     def restore(
         self, encrypted_path: Path, password: str, target_dir: Path | str
     ) -> Path:
-        blob = encrypted_path.read_bytes()
-        tar_bytes = self._decrypt_bytes(blob, password)
-        temp_tar = encrypted_path.with_suffix(".restore.tmp.tar.gz")
-        temp_tar.write_bytes(tar_bytes)
+        """Decrypt and unpack a backup into ``target_dir``.
+
+        The decompressor is chosen from the manifest next to the file, or
+        from the archive's magic bytes when there is none. Chunks are
+        authenticated as they stream, so a corrupted archive can fail
+        part-way through; ``verify`` it against its manifest first.
+        """
         target = Path(target_dir)
         target.mkdir(parents=True, exist_ok=True)
-        with tarfile.open(temp_tar, "r:gz") as tf:
-            # Use safe extraction filter to avoid deprecation warnings and
-            # protect against path traversal or special files.
-            tf.extractall(path=target, filter="data")
-        temp_tar.unlink(missing_ok=True)
+        manifest_path = encrypted_path.with_suffix(encrypted_path.suffix + ".manifest")
+        codec = None
+        if manifest_path.exists():
+            codec = read_manifest(manifest_path).get("compression")
+        with encrypted_path.open("rb") as src:
+            plaintext = open_decrypted(src, password)
+            if plaintext is None:  # legacy Fernet file, decrypted in memory
+                plaintext = io.BytesIO(decrypt_legacy(src.read(), password))
+                codec = codec or "gzip"
+            codec = codec or detect_compression(plaintext.peek(4)[:4])
+            decompressed = Compression.reader(codec, plaintext)
+            with tarfile.open(fileobj=decompressed, mode="r|") as tf:
+                # Use safe extraction filter to avoid deprecation warnings and
+                # protect against path traversal or special files.
+                tf.extractall(path=target, filter="data")
         return target
 
     def backup(
@@ -128,10 +251,21 @@ class BackupService:
         name_prefix: str,
         paths: Iterable[Path | str],
         password: str,
+        pipelined: bool = False,
     ) -> BackupResult:
-        archive = self.create_archive(name_prefix, paths)
-        encrypted = self.encrypt_archive(archive, password)
-        manifest = self.write_manifest(encrypted)
+        """Archive, encrypt and checksum ``paths``.
+
+        By default the plaintext ``.tar.gz`` is kept next to the encrypted
+        file. ``pipelined`` streams the archive straight into the encrypted
+        file instead: one pass over the data and no plaintext on disk.
+        """
+        if pipelined:
+            archive = None
+            encrypted, sha256 = self._archive_encrypted(name_prefix, paths, password)
+        else:
+            archive = self.create_archive(name_prefix, paths)
+            encrypted, sha256 = self._encrypt_file(archive, password)
+        manifest = self.write_manifest(encrypted, sha256)
         return BackupResult(
             archive_path=archive, encrypted_path=encrypted, manifest_path=manifest
         )
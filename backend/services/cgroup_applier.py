@@ -0,0 +1,164 @@
+"""Apply ResourceLimits to per-user cgroup v2 slices.
+
+systemd places every logged-in user's processes under
+``user.slice/user-<uid>.slice``. This module writes ``cpu.max``,
+``memory.max`` and ``pids.max`` there directly, remembering what it last
+wrote so unchanged limits cost one ``stat`` on the next reconciliation
+pass. What was written is remembered per slice directory (its inode), not
+per uid: when a user logs out and back in, systemd recreates the slice with
+``max`` defaults, and the new inode makes the limits get written again.
+Writes for different users are issued in parallel from a thread pool.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from models import ResourceLimits
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+CPU_PERIOD_US = 100_000
+MIN_CPU_QUOTA_US = 1_000  # kernel rejects smaller quotas
+
+
+@dataclass
+class ApplyReport:
+    written: int = 0  # number of cgroup files written
+    unchanged: int = 0  # users whose limits were already applied
+    missing: list[int] = field(default_factory=list)  # uids without a slice
+    errors: dict[int, str] = field(default_factory=dict)
+
+
+class CgroupApplier:
+    """Reconciles ResourceLimits rows with cgroup v2 interface files."""
+
+    def __init__(
+        self,
+        cgroup_root: Optional[Path | str] = None,
+        cpu_period_us: int = CPU_PERIOD_US,
+        max_workers: int = 8,
+    ) -> None:
+        self.cgroup_root = Path(
+            cgroup_root or os.getenv("PUBNIX_CGROUP_ROOT", CGROUP_ROOT)
+        )
+        self.cpu_period_us = cpu_period_us
+        self.max_workers = max_workers
+        # uid -> (inode of the slice directory, values written to it)
+        self._applied: dict[int, tuple[int, dict[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def slice_path(self, uid: int) -> Path:
+        return self.cgroup_root / "user.slice" / f"user-{uid}.slice"
+
+    def render(self, limits: ResourceLimits) -> dict[str, str]:
+        """Translate limits into cgroup file contents.
+
+        ``cpu_limit_percent`` is a share of a single CPU, so 10 becomes a
+        10ms quota per 100ms period.
+        """
+        quota = max(
+            MIN_CPU_QUOTA_US, limits.cpu_limit_percent * self.cpu_period_us // 100
+        )
+        return {
+            "cpu.max": f"{quota} {self.cpu_period_us}",
+            "memory.max": str(limits.memory_limit_mb * 1024 * 1024),
+            "pids.max": str(limits.max_processes),
+        }
+
+    def forget(self, uid: int) -> None:
+        """Drop cached state, e.g. after the user's slice was torn down."""
+        with self._lock:
+            self._applied.pop(uid, None)
+
+    def read_current(self, uid: int) -> dict[str, str]:
+        """Values currently in the slice's interface files (missing ones omitted)."""
+        current = {}
+        for name in ("cpu.max", "memory.max", "pids.max"):
+            try:
+                current[name] = (self.slice_path(uid) / name).read_text().strip()
+            except OSError:
+                continue
+        return current
+
+    def apply(
+        self, limits_by_uid: Mapping[int, ResourceLimits], verify: bool = False
+    ) -> ApplyReport:
+        """Write changed limits for all users, skipping values already applied.
+
+        With ``verify``, what is applied is re-read from the slice instead of
+        trusted from memory, so values changed behind our back (for example
+        by ``systemctl set-property``) are written again.
+        """
+        report = ApplyReport()
+        pending: dict[int, tuple[int, dict[str, str]]] = {}
+        for uid, limits in limits_by_uid.items():
+            try:
+                inode = os.stat(self.slice_path(uid)).st_ino
+            except FileNotFoundError:
+                self.forget(uid)
+                report.missing.append(uid)
+                continue
+            with self._lock:
+                applied_inode, previous = self._applied.get(uid, (None, {}))
+            if verify:
+                previous = self.read_current(uid)
+            elif applied_inode != inode:
+                previous = {}  # a new slice starts out with systemd's defaults
+            changes = {
+                name: value
+                for name, value in self.render(limits).items()
+                if previous.get(name) != value
+            }
+            if changes:
+                pending[uid] = (inode, changes)
+            else:
+                report.unchanged += 1
+
+        if not pending:
+            return report
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            outcomes = pool.map(self._write_slice, pending.keys(), pending.values())
+            for uid, (written, error) in zip(list(pending), outcomes):
+                report.written += written
+                if error is None:
+                    continue
+                if error == "missing":
+                    report.missing.append(uid)
+                else:
+                    report.errors[uid] = error
+        return report
+
+    def _write_slice(
+        self, uid: int, target: tuple[int, dict[str, str]]
+    ) -> tuple[int, Optional[str]]:
+        inode, changes = target
+        slice_dir = self.slice_path(uid)
+        written = 0
+        for name, value in changes.items():
+            try:
+                # cgroupfs expects the whole value in a single write(2)
+                fd = os.open(slice_dir / name, os.O_WRONLY | os.O_TRUNC)
+                try:
+                    os.write(fd, value.encode("ascii"))
+                finally:
+                    os.close(fd)
+            except OSError as exc:
+                if not slice_dir.is_dir():  # torn down since the stat
+                    self.forget(uid)
+                    return written, "missing"
+                return written, f"{name}: {exc.strerror or exc}"
+            written += 1
+            with self._lock:
+                applied_inode, values = self._applied.get(uid, (inode, {}))
+                if applied_inode != inode:
+                    values = {}
+                values[name] = value
+                self._applied[uid] = (inode, values)
+        return written, None
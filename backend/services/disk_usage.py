@@ -0,0 +1,154 @@
+"""Per-user disk usage accounting for ATL Pubnix home directories.
+
+Filesystem quotas are the cheapest source: when ``repquota`` reports usage
+for a UID it is used as-is. Otherwise home directories are walked with
+``os.scandir``, but each directory's own file total is cached keyed by its
+mtime. A directory whose mtime is unchanged is not listed again, so after
+the first pass the walker only stats directories and re-lists those where
+entries were added, removed or renamed.
+
+A directory's mtime does not change when an existing file grows in place,
+so cached entries are also refreshed after ``refresh_after`` seconds.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+QuotaReader = Callable[[], Optional[Mapping[int, int]]]
+
+# "#1001  --  2048  1048576  2097152  ..." from ``repquota -n`` (1K blocks)
+_REPQUOTA_LINE = re.compile(r"^#(\d+)\s+[-+]{2}\s+(\d+)", re.MULTILINE)
+
+
+def read_repquota(filesystem: str = "/home") -> Optional[Mapping[int, int]]:
+    """Return used KiB per UID from ``repquota``, or None if quotas are off."""
+    if shutil.which("repquota") is None:
+        return None
+    completed = subprocess.run(
+        ["repquota", "-u", "-n", filesystem],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if completed.returncode != 0:
+        return None
+    usage = {int(uid): int(kb) for uid, kb in _REPQUOTA_LINE.findall(completed.stdout)}
+    return usage or None
+
+
+@dataclass
+class _DirEntry:
+    mtime_ns: int
+    files_bytes: int
+    subdirs: tuple[str, ...]
+    scanned_at: float
+
+
+class DiskUsageAccountant:
+    """Computes disk usage per user, reusing work from previous passes."""
+
+    def __init__(
+        self,
+        quota_reader: Optional[QuotaReader] = None,
+        max_workers: int = 8,
+        refresh_after: float = 3600.0,
+    ) -> None:
+        self.quota_reader = quota_reader or read_repquota
+        self.max_workers = max_workers
+        self.refresh_after = refresh_after
+        self._cache: dict[str, _DirEntry] = {}
+        self._lock = threading.Lock()
+        self.dirs_scanned = 0  # directories listed (cache misses) so far
+
+    def usage_mb(
+        self,
+        homes: Mapping[str, str],
+        uids: Optional[Mapping[str, int]] = None,
+    ) -> dict[str, int]:
+        """Return disk usage in MB for each ``username -> home`` entry."""
+        quota = self.quota_reader() if uids else None
+        result: dict[str, int] = {}
+        to_walk: list[tuple[str, str]] = []
+        for username, home in homes.items():
+            uid = uids.get(username) if uids else None
+            if quota is not None and uid is not None and uid in quota:
+                result[username] = quota[uid] // 1024
+            else:
+                to_walk.append((username, home))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            totals = pool.map(self.tree_bytes, [home for _, home in to_walk])
+            for (username, _), total in zip(to_walk, totals):
+                result[username] = total // (1024 * 1024)
+        return result
+
+    def tree_bytes(self, top: str) -> int:
+        """Allocated bytes below ``top`` (like ``du -s``), symlinks not followed."""
+        total = 0
+        stack = [top]
+        now = time.monotonic()
+        while stack:
+            path = stack.pop()
+            try:
+                st = os.lstat(path)
+            except OSError:
+                self._forget(path)
+                continue
+            with self._lock:
+                entry = self._cache.get(path)
+            if (
+                entry is None
+                or entry.mtime_ns != st.st_mtime_ns
+                or now - entry.scanned_at > self.refresh_after
+            ):
+                entry = self._scan_dir(path, st.st_mtime_ns, now)
+                if entry is None:
+                    continue
+            total += st.st_blocks * 512 + entry.files_bytes
+            stack.extend(os.path.join(path, name) for name in entry.subdirs)
+        return total
+
+    def _scan_dir(self, path: str, mtime_ns: int, now: float) -> Optional[_DirEntry]:
+        files_bytes = 0
+        subdirs: list[str] = []
+        try:
+            with os.scandir(path) as entries:
+                for item in entries:
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            subdirs.append(item.name)
+                        else:
+                            files_bytes += (
+                                item.stat(follow_symlinks=False).st_blocks * 512
+                            )
+                    except OSError:
+                        continue
+        except OSError:
+            self._forget(path)
+            return None
+        entry = _DirEntry(mtime_ns, files_bytes, tuple(subdirs), now)
+        with self._lock:
+            previous = self._cache.get(path)
+            self._cache[path] = entry
+            self.dirs_scanned += 1
+        if previous is not None:
+            for gone in set(previous.subdirs) - set(subdirs):
+                self._forget(os.path.join(path, gone))
+        return entry
+
+    def _forget(self, path: str) -> None:
+        """Drop cached entries for ``path`` and everything below it."""
+        prefix = path.rstrip(os.sep) + os.sep
+        with self._lock:
+            for key in [k for k in self._cache if k == path or k.startswith(prefix)]:
+                del self._cache[key]
@@ -0,0 +1,336 @@
+"""Periodic resource enforcement with hysteresis and coalesced actions.
+
+Acting on every over-limit sample makes enforcement flap (a short compile
+spike would renice a user, then un-renice, then renice again). The loop here
+keeps a sliding window of recent samples per user and violation kind, and
+only escalates a kind once it was violated in ``trigger`` of the last
+``window`` samples. A kind is cleared again only after ``clear_after``
+consecutive clean samples. Escalated users get at most one batch of
+enforcement commands per ``cooldown`` seconds, however many samples arrive
+in between. Each round's samples are checked against their limits in one
+vectorized pass (``ResourceEnforcer.violated_kinds``) when numpy is
+installed.
+
+With a ``cgroup_applier``, every round also reconciles each user's
+ResourceLimits with their cgroup slice (production only, like the
+commands); limits that are already in place cost one ``stat`` per user.
+An action for sustained process or memory violations re-reads the slice
+and rewrites limits that no longer match, so each escalated user gets at
+most one renice and one cgroup write per cooldown.
+
+``EnforcementStats`` is exported through ``registry`` for Prometheus.
+A round that fails (database unavailable, missing binary) is logged and
+counted, and the loop carries on with the next one.
+"""
+
+from __future__ import annotations
+
+import os
+import shlex
+import threading
+import time
+from collections import deque
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import structlog
+from prometheus_client import CollectorRegistry
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from models import ResourceLimits, UserMetrics
+from services.alert_engine import AlertEngine
+from services.audit_logger import AuditLogger
+from services.cgroup_applier import CgroupApplier
+from services.metrics_collector import MetricsCollector
+from services.metrics_writer import MetricsWriter
+from services.provisioning_service import ShellRunner, run_subprocess
+from services.resource_enforcer import ResourceEnforcer
+from services.ssh_key_usage import KeyUsageTracker
+from services.utmp import LoginTracker
+
+LimitsProvider = Callable[[], Mapping[str, ResourceLimits]]
+
+
+@dataclass
+class EnforcementPolicy:
+    window: int = 6  # samples kept per user and kind
+    trigger: int = 4  # violating samples in the window needed to escalate
+    clear_after: int = 3  # consecutive clean samples needed to de-escalate
+    cooldown: float = 60.0  # minimum seconds between actions for one user
+
+
+@dataclass
+class EnforcementStats:
+    ticks: int = 0
+    samples: int = 0
+    actions: int = 0  # command batches issued (one per user per cooldown)
+    commands: int = 0
+    cgroup_writes: int = 0  # cgroup files rewritten by actions
+    errors: int = 0  # failed rounds and commands
+    escalated_users: int = 0
+
+
+class _StatsCollector:
+    """Prometheus view of ``EnforcementStats``."""
+
+    COUNTERS = {
+        "ticks": "Enforcement rounds completed",
+        "samples": "User samples evaluated",
+        "actions": "Enforcement actions (one per user per cooldown)",
+        "commands": "Enforcement commands issued",
+        "cgroup_writes": "cgroup files rewritten by enforcement actions",
+        "errors": "Failed enforcement rounds and commands",
+    }
+
+    def __init__(self, stats: EnforcementStats) -> None:
+        self.stats = stats
+
+    def collect(self):
+        for name, documentation in self.COUNTERS.items():
+            yield CounterMetricFamily(
+                f"pubnix_enforcement_{name}",
+                documentation,
+                value=getattr(self.stats, name),
+            )
+        yield GaugeMetricFamily(
+            "pubnix_enforcement_escalated_users",
+            "Users with a sustained violation",
+            value=self.stats.escalated_users,
+        )
+
+
+@dataclass
+class _UserState:
+    history: dict[str, deque[bool]] = field(default_factory=dict)
+    clean_streak: dict[str, int] = field(default_factory=dict)
+    active: set[str] = field(default_factory=set)
+    last_action: Optional[float] = None
+
+
+class EnforcementLoop:
+    """Samples user metrics, tracks sustained violations and acts on them."""
+
+    def __init__(
+        self,
+        limits_provider: LimitsProvider,
+        collector: Optional[MetricsCollector] = None,
+        enforcer: Optional[ResourceEnforcer] = None,
+        shell_runner: Optional[ShellRunner] = None,
+        policy: Optional[EnforcementPolicy] = None,
+        interval: float = 10.0,
+        env: Optional[str] = None,
+        clock: Callable[[], float] = time.monotonic,
+        metrics_writer: Optional[MetricsWriter] = None,
+        alert_engine: Optional[AlertEngine] = None,
+        login_tracker: Optional[LoginTracker] = None,
+        key_usage_tracker: Optional[KeyUsageTracker] = None,
+        cgroup_applier: Optional[CgroupApplier] = None,
+        alert_state_path: Optional[str] = None,
+    ) -> None:
+        self.limits_provider = limits_provider
+        self.collector = collector or MetricsCollector()
+        self.enforcer = enforcer or ResourceEnforcer()
+        self.shell_runner = shell_runner or run_subprocess
+        self.policy = policy or EnforcementPolicy()
+        self.interval = interval
+        self.env = (env or os.getenv("PUBNIX_ENV", "development")).lower()
+        self.clock = clock
+        self.stats = EnforcementStats()
+        self.registry = CollectorRegistry()
+        self.registry.register(_StatsCollector(self.stats))
+        self.auditor = AuditLogger()
+        self.metrics_writer = metrics_writer
+        self.alert_engine = alert_engine
+        self.login_tracker = login_tracker
+        self.key_usage_tracker = key_usage_tracker
+        self.cgroup_applier = cgroup_applier
+        self.alert_state_path = alert_state_path
+        self.logger = structlog.get_logger("enforcement")
+        self._users: dict[str, _UserState] = {}
+
+    def _observe(self, state: _UserState, kind: str, violated: bool) -> None:
+        history = state.history.get(kind)
+        if history is None:
+            history = state.history[kind] = deque(maxlen=self.policy.window)
+        history.append(violated)
+        streak = 0 if violated else state.clean_streak.get(kind, 0) + 1
+        state.clean_streak[kind] = streak
+        if kind in state.active:
+            if streak >= self.policy.clear_after:
+                state.active.discard(kind)
+        elif sum(history) >= self.policy.trigger:
+            state.active.add(kind)
+
+    def tick(
+        self,
+        samples: list[UserMetrics],
+        limits: Mapping[str, ResourceLimits],
+        now: Optional[float] = None,
+    ) -> dict[str, list[str]]:
+        """Feed one round of samples; return the commands issued per user."""
+        now = self.clock() if now is None else now
+        actions: dict[str, list[str]] = {}
+        rows = [(s, limits[s.username]) for s in samples if s.username in limits]
+        # One vectorized check for the round; details only for users acted on
+        kinds = self.enforcer.violated_kinds(
+            [sample for sample, _ in rows], [user_limits for _, user_limits in rows]
+        )
+        for (sample, user_limits), violated in zip(rows, kinds):
+            state = self._users.setdefault(sample.username, _UserState())
+            for kind in violated | set(state.history):
+                self._observe(state, kind, kind in violated)
+
+            if not state.active:
+                continue
+            if (
+                state.last_action is not None
+                and now - state.last_action < self.policy.cooldown
+            ):
+                continue
+            sustained = [
+                v
+                for v in self.enforcer.check_user_violations(sample, user_limits)
+                if v.kind in state.active
+            ]
+            if not sustained:
+                continue
+            commands = self.enforcer.build_enforcement_commands(
+                sample.username, sustained
+            )
+            state.last_action = now
+            actions[sample.username] = commands
+            self._execute(
+                sample.username,
+                commands,
+                sustained_kinds=state.active,
+                limits=user_limits,
+            )
+
+        self.stats.ticks += 1
+        self.stats.samples += len(samples)
+        self.stats.escalated_users = sum(1 for s in self._users.values() if s.active)
+        # Forget users that are gone so state does not grow without bound
+        for username in set(self._users) - set(limits):
+            del self._users[username]
+        return actions
+
+    def _execute(
+        self,
+        username: str,
+        commands: list[str],
+        sustained_kinds: set[str],
+        limits: ResourceLimits,
+    ) -> None:
+        self.stats.actions += 1
+        self.stats.commands += len(commands)
+        executed = self.env == "production"
+        if executed:
+            for cmd in commands:
+                if cmd.lstrip().startswith("#"):
+                    continue  # advisory placeholder, nothing to run
+                try:
+                    self.shell_runner(shlex.split(cmd))
+                except Exception as exc:  # e.g. the binary is missing
+                    self.stats.errors += 1
+                    self.logger.warning(
+                        "enforcement_command_failed", command=cmd, error=str(exc)
+                    )
+            if sustained_kinds & {"processes", "memory"}:
+                self._rewrite_cgroup(username, limits)
+        self.auditor.log(
+            "resource_enforcement",
+            username=username,
+            kinds=sorted(sustained_kinds),
+            commands=commands,
+            executed=executed,
+        )
+
+    def _rewrite_cgroup(self, username: str, limits: ResourceLimits) -> None:
+        uid = self.collector.uid_of(username)
+        if self.cgroup_applier is None or uid is None:
+            return
+        try:
+            report = self.cgroup_applier.apply({uid: limits}, verify=True)
+        except Exception as exc:
+            self.stats.errors += 1
+            self.logger.warning(
+                "cgroup_write_failed", username=username, error=str(exc)
+            )
+            return
+        self.stats.cgroup_writes += report.written
+        if report.errors:
+            self.stats.errors += 1
+            self.logger.warning(
+                "cgroup_write_failed", username=username, error=report.errors[uid]
+            )
+
+    def apply_cgroup_limits(self, limits: Mapping[str, ResourceLimits]) -> None:
+        """Write changed limits to the slices of users that are logged in."""
+        if self.cgroup_applier is None or self.env != "production":
+            return
+        by_uid = {
+            uid: user_limits
+            for username, user_limits in limits.items()
+            if (uid := self.collector.uid_of(username)) is not None
+        }
+        try:
+            report = self.cgroup_applier.apply(by_uid)
+        except OSError as exc:  # e.g. cgroupfs not mounted; enforcement goes on
+            self.stats.errors += 1
+            self.logger.warning("cgroup_apply_failed", error=str(exc))
+            return
+        if report.errors:
+            self.logger.warning("cgroup_apply_failed", errors=report.errors)
+
+    def run(self, stop: threading.Event) -> None:
+        """Run until ``stop`` is set, sampling every ``interval`` seconds.
+
+        When a ``metrics_writer`` is configured, each round of samples is also
+        persisted with a single batched write; an ``alert_engine`` sees every
+        round too, along with a system sample, and publishes its alerts to
+        ``alert_state_path`` for the API. A ``login_tracker`` records new
+        logins once per round.
+        A ``key_usage_tracker`` reads the auth log every round and writes
+        key usage on its own, longer interval.
+        """
+        while not stop.is_set():
+            started = self.clock()
+            try:
+                self._round(started)
+            except Exception as exc:  # retried next round
+                self.stats.errors += 1
+                self.logger.error("enforcement_round_failed", error=str(exc))
+            if self.login_tracker is not None:
+                try:
+                    self.login_tracker.poll()
+                except Exception as exc:  # logins stay pending for next tick
+                    self.logger.warning("last_login_update_failed", error=str(exc))
+            if self.key_usage_tracker is not None:
+                try:
+                    self.key_usage_tracker.poll()
+                except Exception as exc:  # uses stay pending for next flush
+                    self.logger.warning("key_usage_update_failed", error=str(exc))
+            elapsed = self.clock() - started
+            stop.wait(max(0.0, self.interval - elapsed))
+
+    def _round(self, started: float) -> None:
+        limits = self.limits_provider()
+        self.apply_cgroup_limits(limits)
+        samples = self.collector.collect_user_metrics(limits.keys())
+        self.tick(samples, limits, now=started)
+        if self.alert_engine is not None:
+            self.alert_engine.observe_users(samples)
+            self.alert_engine.forget_users(limits.keys())
+            self.alert_engine.observe_system(self.collector.collect_system_metrics())
+            if self.alert_state_path:
+                try:
+                    self.alert_engine.publish(self.alert_state_path)
+                except OSError as exc:
+                    self.logger.warning("alert_publish_failed", error=str(exc))
+        if self.metrics_writer is not None:
+            self.metrics_writer.add(samples)
+            try:
+                self.metrics_writer.flush()
+            except Exception as exc:  # samples stay buffered for next tick
+                self.logger.warning("metrics_flush_failed", error=str(exc))
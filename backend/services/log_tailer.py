@@ -0,0 +1,81 @@
+"""Follow an append-only log file across rotation and truncation.
+
+``LogTailer.read_lines`` returns the complete lines appended since the
+previous call. The file descriptor stays open between calls, so after a
+rename-style rotation (logrotate's default) the rest of the old file is
+drained before the tailer switches to the new file at the same path. A file
+that shrinks (``copytruncate``) is read again from the start. A trailing
+partial line is held back until its newline arrives.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import BinaryIO, Optional
+
+
+class LogTailer:
+    def __init__(
+        self, path: str, from_end: bool = True, read_size: int = 1 << 20
+    ) -> None:
+        self.path = path
+        self.from_end = from_end
+        self.read_size = read_size
+        self._file: Optional[BinaryIO] = None
+        self._partial = b""
+        self.rotations = 0
+
+    def _open(self, at_end: bool) -> bool:
+        try:
+            self._file = open(self.path, "rb")
+        except OSError:
+            self._file = None
+            return False
+        if at_end:
+            self._file.seek(0, os.SEEK_END)
+        self._partial = b""
+        return True
+
+    def _drain(self, f: BinaryIO) -> list[bytes]:
+        lines: list[bytes] = []
+        while chunk := f.read(self.read_size):
+            parts = (self._partial + chunk).split(b"\n")
+            self._partial = parts.pop()
+            lines.extend(parts)
+        return lines
+
+    def read_lines(self) -> list[bytes]:
+        """Complete lines appended since the last call (without newlines)."""
+        if self._file is None:
+            # Only the very first open may skip existing content
+            if not self._open(at_end=self.from_end and self.rotations == 0):
+                return []
+        f = self._file
+        assert f is not None
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            st = None  # rotated away and not recreated yet
+
+        current = os.fstat(f.fileno())
+        if st is not None and st.st_ino == current.st_ino:
+            if st.st_size < f.tell():
+                f.seek(0)  # truncated in place
+                self._partial = b""
+            return self._drain(f)
+
+        # Rotated: finish the old file, then continue with the new one
+        lines = self._drain(f)
+        if self._partial:
+            lines.append(self._partial)
+        f.close()
+        self._file = None
+        self.rotations += 1
+        if st is not None and self._open(at_end=False):
+            lines.extend(self._drain(self._file))
+        return lines
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,241 @@
+"""Columnar archive of raw metrics history.
+
+Raw ``user_metrics``/``system_metrics`` rows only stay in PostgreSQL for the
+raw retention window (see ``services.metrics_rollup``). Before they are
+pruned, ``MetricsArchiver`` streams each complete UTC day out of the
+database in chunks and writes it to one compressed columnar file:
+
+    <archive_dir>/<source>_metrics/<YYYY-MM-DD>.parquet   (or .arrow)
+
+Files are written to a temporary name and renamed, so a partition either
+exists completely or not at all, and existing partitions are never
+rewritten. ``MetricsArchiveReader`` memory-maps partitions for scans.
+
+Requires the optional ``pyarrow`` dependency (``pip install .[archive]``).
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from typing import Any, Literal, Optional
+
+from sqlalchemy import DateTime, Float, Integer, func, select
+from sqlmodel import Session
+
+from models import SystemMetrics, UserMetrics
+from services.metrics_rollup import utc_naive
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for archiving
+    pa = None
+
+ArchiveFormat = Literal["parquet", "arrow"]
+
+TABLES = {"user": UserMetrics.__table__, "system": SystemMetrics.__table__}
+_SUFFIXES = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("pyarrow is required for metrics archiving")
+
+
+def arrow_schema(source: str) -> Any:
+    """Arrow schema mirroring the columns of a raw metrics table."""
+    _require_pyarrow()
+    fields = []
+    for column in TABLES[source].columns:
+        if isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us", tz="UTC")
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Float):
+            arrow_type = pa.float64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type, nullable=column.nullable))
+    return pa.schema(fields)
+
+
+@dataclass
+class ArchivedPartition:
+    source: str
+    day: date
+    path: Path
+    rows: int
+
+
+class MetricsArchiver:
+    """Writes complete days of raw metrics to columnar files."""
+
+    def __init__(
+        self,
+        session: Session,
+        archive_dir: Path | str,
+        remote_dir: Optional[Path | str] = None,
+        fmt: ArchiveFormat = "parquet",
+        compression: Optional[str] = None,
+        chunk_rows: int = 50_000,
+    ) -> None:
+        _require_pyarrow()
+        self.session = session
+        self.archive_dir = Path(archive_dir)
+        self.remote_dir = Path(remote_dir) if remote_dir else None
+        self.fmt = fmt
+        # zstd for Parquet; lz4 keeps memory-mapped IPC reads cheap
+        self.compression = compression or ("zstd" if fmt == "parquet" else "lz4")
+        self.chunk_rows = chunk_rows
+
+    def partition_path(
+        self, source: str, day: date, root: Optional[Path] = None
+    ) -> Path:
+        root = root or self.archive_dir
+        return root / f"{source}_metrics" / f"{day.isoformat()}{_SUFFIXES[self.fmt]}"
+
+    def archive(
+        self,
+        now: Optional[datetime] = None,
+        sources: Sequence[str] = ("user", "system"),
+    ) -> list[ArchivedPartition]:
+        """Archive every complete day not archived yet; returns new partitions."""
+        today = utc_naive(now or datetime.now(timezone.utc)).date()
+        written: list[ArchivedPartition] = []
+        for source in sources:
+            ts = TABLES[source].c.timestamp
+            oldest = self.session.execute(select(func.min(ts))).scalar()
+            if oldest is None:
+                continue
+            day = utc_naive(oldest).date()
+            while day < today:
+                if not self.partition_path(source, day).exists():
+                    written.append(self.archive_day(source, day))
+                day += timedelta(days=1)
+        return written
+
+    def _chunks(self, source: str, day: date) -> Iterator[list[Any]]:
+        table = TABLES[source]
+        start = datetime.combine(day, time())
+        query = (
+            select(*table.columns)
+            .where(
+                (table.c.timestamp >= start)
+                & (table.c.timestamp < start + timedelta(days=1))
+            )
+            .order_by(table.c.timestamp)
+        )
+        result = self.session.connection().execute(
+            query.execution_options(yield_per=self.chunk_rows)
+        )
+        yield from result.partitions()
+
+    def archive_day(self, source: str, day: date) -> ArchivedPartition:
+        schema = arrow_schema(source)
+        path = self.partition_path(source, day)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        rows = 0
+        if self.fmt == "parquet":
+            writer = pq.ParquetWriter(tmp, schema, compression=self.compression)
+        else:
+            writer = ipc.new_file(
+                str(tmp),
+                schema,
+                options=ipc.IpcWriteOptions(compression=self.compression),
+            )
+        try:
+            for chunk in self._chunks(source, day):
+                columns = list(zip(*chunk))
+                writer.write_batch(
+                    pa.RecordBatch.from_arrays(
+                        [
+                            pa.array(values, type=field.type)
+                            for values, field in zip(columns, schema)
+                        ],
+                        schema=schema,
+                    )
+                )
+                rows += len(chunk)
+        finally:
+            writer.close()
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        if self.remote_dir is not None:
+            remote = self.partition_path(source, day, root=self.remote_dir)
+            remote.parent.mkdir(parents=True, exist_ok=True)
+            remote_tmp = remote.with_name(remote.name + ".tmp")
+            shutil.copyfile(path, remote_tmp)
+            os.replace(remote_tmp, remote)
+        return ArchivedPartition(source=source, day=day, path=path, rows=rows)
+
+
+class MetricsArchiveReader:
+    """Reads archived partitions through memory maps."""
+
+    def __init__(self, archive_dir: Path | str) -> None:
+        _require_pyarrow()
+        self.archive_dir = Path(archive_dir)
+
+    def partitions(self, source: str, start: date, end: date) -> list[Path]:
+        """Partition files for days in ``[start, end]``, oldest first."""
+        found = []
+        for path in (self.archive_dir / f"{source}_metrics").glob("*.*"):
+            if path.suffix not in (".parquet", ".arrow"):
+                continue
+            try:
+                day = date.fromisoformat(path.stem)
+            except ValueError:
+                continue
+            if start <= day <= end:
+                found.append((day, path))
+        return [path for _, path in sorted(found)]
+
+    @staticmethod
+    def read_partition(path: Path, columns: Optional[Sequence[str]] = None) -> Any:
+        if path.suffix == ".parquet":
+            return pq.read_table(path, columns=columns, memory_map=True)
+        with pa.memory_map(str(path)) as source:
+            table = ipc.open_file(source).read_all()
+        return table.select(columns) if columns else table
+
+    def read(
+        self,
+        source: str,
+        start: datetime,
+        end: datetime,
+        columns: Optional[Sequence[str]] = None,
+        usernames: Optional[Sequence[str]] = None,
+    ) -> Any:
+        """Rows with ``start <= timestamp < end`` as one Arrow table."""
+        start, end = utc_naive(start), utc_naive(end)
+        wanted = list(columns) if columns else None
+        if wanted is not None:
+            extra = ["timestamp"] + (["username"] if usernames else [])
+            wanted += [c for c in extra if c not in wanted]
+        paths = self.partitions(source, start.date(), end.date())
+        if not paths:
+            empty = arrow_schema(source).empty_table()
+            return empty.select(list(columns)) if columns else empty
+        table = pa.concat_tables(self.read_partition(p, wanted) for p in paths)
+        utc = pa.timestamp("us", tz="UTC")
+        mask = pc.and_(
+            pc.greater_equal(
+                table["timestamp"], pa.scalar(start.replace(tzinfo=timezone.utc), utc)
+            ),
+            pc.less(
+                table["timestamp"], pa.scalar(end.replace(tzinfo=timezone.utc), utc)
+            ),
+        )
+        if usernames:
+            mask = pc.and_(mask, pc.is_in(table["username"], pa.array(list(usernames))))
+        table = table.filter(mask)
+        return table.select(list(columns)) if columns else table
@@ -1,22 +1,56 @@
-"""Collect system and user metrics (stubbed for tests)."""
+"""Collect system and user metrics."""
 
 from __future__ import annotations
 
-from collections.abc import Iterable
+import os
+import pwd
+from collections.abc import Iterable, Mapping
 from datetime import datetime, timezone
-from typing import List
+from functools import lru_cache
+from typing import Callable, List, Optional
 
 import psutil
 
 from models import SystemMetrics, UserMetrics
+from services.disk_usage import DiskUsageAccountant
+from services.proc_scanner import ProcScanner
+from services.utmp import UTMP_PATH, read_utmp, remote_session_count, session_counts
+from services.web_requests import WebRequestCounter
+
+SessionCounter = Callable[[], Mapping[str, int]]
+
+
+def utmp_session_counts(path: str = UTMP_PATH) -> Mapping[str, int]:
+    """Count login sessions per user from a single utmp read."""
+    return session_counts(read_utmp(path))
 
 
 class MetricsCollector:
+    def __init__(
+        self,
+        proc_root: str = "/proc",
+        session_counter: Optional[SessionCounter] = None,
+        uid_lookup: Optional[Callable[[str], int]] = None,
+        disk_accountant: Optional[DiskUsageAccountant] = None,
+        home_root: str = "/home",
+        utmp_path: str = UTMP_PATH,
+        web_counter: Optional[WebRequestCounter] = None,
+    ) -> None:
+        self.scanner = ProcScanner(proc_root)
+        self.disk_accountant = disk_accountant or DiskUsageAccountant()
+        self.home_root = home_root
+        self.utmp_path = utmp_path
+        self.web_counter = web_counter or WebRequestCounter()
+        self.session_counter = session_counter
+        self.uid_lookup = uid_lookup or (lambda name: pwd.getpwnam(name).pw_uid)
+        self._uids: dict[str, Optional[int]] = {}
+
     def collect_system_metrics(self) -> SystemMetrics:
         vm = psutil.virtual_memory()
         disk = psutil.disk_usage("/")
         cpu = psutil.cpu_percent(interval=None)
         net_conns = len(psutil.net_connections(kind="tcp"))
+        self.web_counter.poll()
         return SystemMetrics(
             total_users=0,  # filled elsewhere
             active_users_24h=0,
@@ -24,25 +58,67 @@ class MetricsCollector:
             memory_usage_percent=float(vm.percent),
             disk_usage_percent=float(disk.percent),
             network_connections=net_conns,
-            ssh_sessions=0,
-            web_requests_per_hour=0,
+            ssh_sessions=remote_session_count(read_utmp(self.utmp_path)),
+            web_requests_per_hour=self.web_counter.requests_last_hour(),
             timestamp=datetime.now(timezone.utc),
         )
 
+    def uid_of(self, username: str) -> Optional[int]:
+        """Cached uid of ``username``, None if there is no such account."""
+        if username not in self._uids:
+            try:
+                self._uids[username] = self.uid_lookup(username)
+            except KeyError:
+                self._uids[username] = None
+        return self._uids[username]
+
     def collect_user_metrics(self, usernames: Iterable[str]) -> List[UserMetrics]:
+        """Build one UserMetrics row per user from a single /proc and utmp pass."""
         now = datetime.now(timezone.utc)
-        # Stub: produce zeroed metrics for each user for testing
-        return [
-            UserMetrics(
-                username=u,
-                cpu_time_seconds=0,
-                memory_usage_mb=0,
-                disk_usage_mb=0,
-                active_processes=0,
-                login_sessions=0,
-                last_activity=now,
-                web_requests_count=0,
-                timestamp=now,
+        usernames = list(usernames)
+        usage = self.scanner.scan()
+        if self.session_counter is not None:
+            sessions = self.session_counter()
+        else:
+            sessions = utmp_session_counts(self.utmp_path)
+        self.web_counter.poll()
+        web_requests = self.web_counter.drain()
+        clock_ticks = self.scanner.clock_ticks
+        uids = {u: uid for u in usernames if (uid := self.uid_of(u)) is not None}
+        disk_mb = self.disk_accountant.usage_mb(
+            {u: os.path.join(self.home_root, u) for u in usernames}, uids
+        )
+
+        metrics: List[UserMetrics] = []
+        for username in usernames:
+            uid = uids.get(username)
+            row = usage.get(uid) if uid is not None else None
+            rss_kb, ticks, processes = row if row else (0, 0, 0)
+            login_sessions = sessions.get(username, 0)
+            metrics.append(
+                UserMetrics(
+                    username=username,
+                    cpu_time_seconds=ticks // clock_ticks,
+                    memory_usage_mb=rss_kb // 1024,
+                    disk_usage_mb=disk_mb.get(username, 0),
+                    active_processes=processes,
+                    login_sessions=login_sessions,
+                    last_activity=now if processes or login_sessions else None,
+                    web_requests_count=web_requests.get(username, 0),
+                    timestamp=now,
+                )
             )
-            for u in usernames
-        ]
+        return metrics
+
+    def close(self) -> None:
+        self.web_counter.close()
+
+
+@lru_cache(maxsize=1)
+def get_metrics_collector() -> MetricsCollector:
+    """Process-wide collector, used as a FastAPI dependency.
+
+    Shared so the web request counter keeps tailing the access log between
+    requests; a fresh one would start at the end of the log and count zero.
+    """
+    return MetricsCollector()
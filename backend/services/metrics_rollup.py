@@ -0,0 +1,451 @@
+"""Downsampling rollups, retention and resolution selection for metrics.
+
+Raw ``system_metrics``/``user_metrics`` samples are folded into 1-minute
+buckets, 1-minute buckets into 1-hour buckets and those into 1-day buckets,
+all stored in ``metric_rollups``. Each level keeps a cursor so a run only
+reads data that arrived since the previous run, and only complete buckets
+are written. A bucket is rolled up only once it ended at least ``lag``
+ago (one minute by default), so collectors that write a little late still
+land in their bucket; samples later than that are not folded in.
+
+Retention prunes raw and fine-grained data, but never rows that the next
+level has not consumed yet. Readers use ``choose_resolution`` to pick the
+coarsest stored resolution that still satisfies a requested range and step,
+and ``segments`` to read it up to its cursor and the not yet rolled-up tail
+from finer levels and raw samples.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from sqlalchemy import delete, insert
+from sqlmodel import Session, col, select
+
+from models import MetricRollup, RollupCursor, SystemMetrics, UserMetrics
+
+RAW = "raw"
+# (name, bucket width in seconds), finest first
+RESOLUTIONS = [("1m", 60), ("1h", 3600), ("1d", 86400)]
+RESOLUTION_SECONDS = dict(RESOLUTIONS)
+
+# How long after a bucket ends before it is rolled up, for late writers
+DEFAULT_LAG = timedelta(minutes=1)
+
+DEFAULT_RETENTION = {
+    RAW: timedelta(days=7),
+    "1m": timedelta(days=30),
+    "1h": timedelta(days=400),
+    "1d": None,  # kept forever
+}
+
+SOURCES: dict[str, tuple[Any, str | None, tuple[str, ...]]] = {
+    # source: (raw model, subject column, rolled-up metric columns)
+    "system": (
+        SystemMetrics,
+        None,
+        (
+            "total_users",
+            "active_users_24h",
+            "cpu_usage_percent",
+            "memory_usage_percent",
+            "disk_usage_percent",
+            "network_connections",
+            "ssh_sessions",
+            "web_requests_per_hour",
+        ),
+    ),
+    "user": (
+        UserMetrics,
+        "username",
+        (
+            "cpu_time_seconds",
+            "memory_usage_mb",
+            "disk_usage_mb",
+            "active_processes",
+            "login_sessions",
+            "web_requests_count",
+        ),
+    ),
+}
+
+
+def utc_naive(dt: datetime) -> datetime:
+    """Normalise to naive UTC, the form timestamps are stored and compared in."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def floor_time(dt: datetime, seconds: int) -> datetime:
+    epoch = int(dt.replace(tzinfo=timezone.utc).timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, timezone.utc).replace(
+        tzinfo=None
+    )
+
+
+@dataclass
+class _Agg:
+    min_value: float
+    max_value: float
+    sum_value: float
+    sample_count: int
+    last_value: float
+    last_at: datetime
+
+    def merge(self, other: _Agg) -> None:
+        self.min_value = min(self.min_value, other.min_value)
+        self.max_value = max(self.max_value, other.max_value)
+        self.sum_value += other.sum_value
+        self.sample_count += other.sample_count
+        if other.last_at >= self.last_at:
+            self.last_value, self.last_at = other.last_value, other.last_at
+
+
+@dataclass
+class SeriesPoint:
+    bucket_start: datetime
+    min: float
+    avg: float
+    max: float
+    last: float
+
+
+class MetricsRollupService:
+    """Maintains rollups incrementally and answers range queries."""
+
+    def __init__(
+        self,
+        session: Session,
+        retention: Optional[dict[str, Optional[timedelta]]] = None,
+        batch_size: int = 5000,
+        lag: timedelta = DEFAULT_LAG,
+    ) -> None:
+        self.session = session
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+        self.batch_size = batch_size
+        self.lag = lag
+
+    # -- cursors -----------------------------------------------------------
+
+    def _cursor(self, source: str, resolution: str) -> Optional[RollupCursor]:
+        return self.session.exec(
+            select(RollupCursor).where(
+                (RollupCursor.source == source)
+                & (RollupCursor.resolution == resolution)
+            )
+        ).first()
+
+    def processed_until(self, source: str, resolution: str) -> Optional[datetime]:
+        """End of the data already rolled up at ``resolution``, if any."""
+        cursor = self._cursor(source, resolution)
+        return cursor.processed_until if cursor else None
+
+    def _advance(self, source: str, resolution: str, until: datetime) -> None:
+        cursor = self._cursor(source, resolution)
+        if cursor is None:
+            cursor = RollupCursor(source=source, resolution=resolution)
+        cursor.processed_until = until
+        self.session.add(cursor)
+
+    # -- rollup ------------------------------------------------------------
+
+    def rollup(self, now: Optional[datetime] = None) -> dict[str, int]:
+        """Fold new data into every resolution; returns rows written per level."""
+        now = utc_naive(now or datetime.now(timezone.utc))
+        # Same horizon for every level, so coarser cutoffs never pass finer ones
+        horizon = now - self.lag
+        written: dict[str, int] = {}
+        for source in SOURCES:
+            previous = RAW
+            for resolution, seconds in RESOLUTIONS:
+                cutoff = floor_time(horizon, seconds)
+                cursor = self._cursor(source, resolution)
+                since = cursor.processed_until if cursor else None
+                if since is not None and since >= cutoff:
+                    previous = resolution
+                    continue
+                if previous == RAW:
+                    samples = self._raw_samples(source, since, cutoff)
+                else:
+                    samples = self._rollup_samples(source, previous, since, cutoff)
+                count = self._write(source, resolution, seconds, samples)
+                written[f"{source}:{resolution}"] = count
+                self._advance(source, resolution, cutoff)
+                self.session.commit()
+                previous = resolution
+        return written
+
+    def _raw_samples(
+        self, source: str, since: Optional[datetime], until: datetime
+    ) -> Iterator[tuple[datetime, str, str, _Agg]]:
+        model, subject_col, metrics = SOURCES[source]
+        ts = col(model.timestamp)
+        query = select(model).where(ts < until).order_by(ts)
+        if since is not None:
+            query = query.where(ts >= since)
+        for row in self.session.exec(
+            query.execution_options(yield_per=self.batch_size)
+        ):
+            at = utc_naive(row.timestamp)
+            subject = getattr(row, subject_col) if subject_col else ""
+            for metric in metrics:
+                v = float(getattr(row, metric))
+                yield at, subject, metric, _Agg(v, v, v, 1, v, at)
+
+    def _rollup_samples(
+        self,
+        source: str,
+        resolution: str,
+        since: Optional[datetime],
+        until: datetime,
+    ) -> Iterator[tuple[datetime, str, str, _Agg]]:
+        bucket = col(MetricRollup.bucket_start)
+        query = (
+            select(MetricRollup)
+            .where(
+                (MetricRollup.source == source)
+                & (MetricRollup.resolution == resolution)
+                & (bucket < until)
+            )
+            .order_by(bucket)
+        )
+        if since is not None:
+            query = query.where(bucket >= since)
+        for r in self.session.exec(query.execution_options(yield_per=self.batch_size)):
+            yield (
+                r.bucket_start,
+                r.subject,
+                r.metric,
+                _Agg(
+                    r.min_value,
+                    r.max_value,
+                    r.sum_value,
+                    r.sample_count,
+                    r.last_value,
+                    r.last_at,
+                ),
+            )
+
+    def _write(
+        self,
+        source: str,
+        resolution: str,
+        seconds: int,
+        samples: Iterable[tuple[datetime, str, str, _Agg]],
+    ) -> int:
+        """Aggregate time-ordered samples, flushing each bucket once it closes."""
+        written = 0
+        current: Optional[datetime] = None
+        open_buckets: dict[tuple[str, str], _Agg] = {}
+
+        def flush() -> int:
+            if not open_buckets:
+                return 0
+            rows = [
+                {
+                    "resolution": resolution,
+                    "source": source,
+                    "subject": subject,
+                    "metric": metric,
+                    "bucket_start": current,
+                    **vars(agg),
+                }
+                for (subject, metric), agg in open_buckets.items()
+            ]
+            self.session.execute(insert(MetricRollup), rows)
+            open_buckets.clear()
+            return len(rows)
+
+        for at, subject, metric, agg in samples:
+            bucket = floor_time(at, seconds)
+            if bucket != current:
+                written += flush()
+                current = bucket
+            existing = open_buckets.get((subject, metric))
+            if existing is None:
+                open_buckets[(subject, metric)] = agg
+            else:
+                existing.merge(agg)
+        written += flush()
+        return written
+
+    # -- retention ---------------------------------------------------------
+
+    def prune(self, now: Optional[datetime] = None) -> dict[str, int]:
+        """Delete data past its retention that the next level already consumed."""
+        now = utc_naive(now or datetime.now(timezone.utc))
+        deleted: dict[str, int] = {}
+        levels = [RAW] + [name for name, _ in RESOLUTIONS]
+        for source, (model, _, _) in SOURCES.items():
+            for level, consumer in zip(levels, levels[1:] + [None]):
+                keep = self.retention.get(level)
+                if keep is None:
+                    continue
+                horizon = now - keep
+                if consumer is not None:
+                    cursor = self._cursor(source, consumer)
+                    if cursor is None:
+                        deleted[f"{source}:{level}"] = 0  # nothing rolled up yet
+                        continue
+                    horizon = min(horizon, cursor.processed_until)
+                if level == RAW:
+                    stmt = delete(model).where(col(model.timestamp) < horizon)
+                else:
+                    stmt = delete(MetricRollup).where(
+                        (MetricRollup.source == source)
+                        & (MetricRollup.resolution == level)
+                        & (col(MetricRollup.bucket_start) < horizon)
+                    )
+                deleted[f"{source}:{level}"] = self.session.execute(stmt).rowcount
+        self.session.commit()
+        return deleted
+
+    # -- queries -----------------------------------------------------------
+
+    def choose_resolution(
+        self,
+        start: datetime,
+        step_seconds: int,
+        now: Optional[datetime] = None,
+        source: Optional[str] = None,
+    ) -> str:
+        """Pick the coarsest resolution no wider than the step covering ``start``.
+
+        If no stored resolution is fine enough while still reaching back to
+        ``start``, the finest resolution that does reach back is used. With a
+        ``source``, resolutions that have not been rolled up yet are skipped.
+        """
+        now = utc_naive(now or datetime.now(timezone.utc))
+        start = utc_naive(start)
+        levels = [(RAW, 0)] + RESOLUTIONS
+
+        def covers(level: str) -> bool:
+            if (
+                source is not None
+                and level != RAW
+                and self.processed_until(source, level) is None
+            ):
+                return False
+            keep = self.retention.get(level)
+            return keep is None or now - keep <= start
+
+        fitting = [name for name, width in levels if width <= step_seconds]
+        for name in reversed(fitting):
+            if covers(name):
+                return name
+        for name, _ in levels:
+            if covers(name):
+                return name
+        return levels[-1][0]
+
+    def segments(
+        self, source: str, resolution: str, start: datetime, end: datetime
+    ) -> list[tuple[str, datetime, datetime]]:
+        """Split ``[start, end)`` into ``(level, from, until)`` reads, coarsest first.
+
+        ``resolution`` is read up to its cursor, each finer level up to its
+        own, and raw samples cover the rest. The first segment starts at the
+        bucket containing ``start``, so that bucket is not lost.
+        """
+        start, end = utc_naive(start), utc_naive(end)
+        names = [RAW] + [name for name, _ in RESOLUTIONS]
+        chain = reversed(names[: names.index(resolution) + 1])
+        pos = start
+        if resolution != RAW:
+            pos = floor_time(start, RESOLUTION_SECONDS[resolution])
+        out = []
+        for level in chain:
+            until = end
+            if level != RAW:
+                until = min(end, self.processed_until(source, level) or pos)
+            if until > pos:
+                out.append((level, pos, until))
+                pos = until
+        return out
+
+    def _read(
+        self,
+        source: str,
+        level: str,
+        metric: str,
+        subject: str,
+        since: datetime,
+        until: datetime,
+    ) -> Iterator[tuple[datetime, _Agg]]:
+        model, subject_col, _ = SOURCES[source]
+        if level == RAW:
+            ts = col(model.timestamp)
+            query = select(ts, getattr(model, metric)).where(
+                (ts >= since) & (ts < until)
+            )
+            if subject_col:
+                query = query.where(getattr(model, subject_col) == subject)
+            for at, v in self.session.exec(query.order_by(ts)):
+                at = utc_naive(at)
+                yield at, _Agg(v, v, v, 1, v, at)
+            return
+        bucket = col(MetricRollup.bucket_start)
+        rows = self.session.exec(
+            select(MetricRollup)
+            .where(
+                (MetricRollup.source == source)
+                & (MetricRollup.resolution == level)
+                & (MetricRollup.metric == metric)
+                & (MetricRollup.subject == subject)
+                & (bucket >= since)
+                & (bucket < until)
+            )
+            .order_by(bucket)
+        )
+        for r in rows:
+            yield (
+                r.bucket_start,
+                _Agg(
+                    r.min_value,
+                    r.max_value,
+                    r.sum_value,
+                    r.sample_count,
+                    r.last_value,
+                    r.last_at,
+                ),
+            )
+
+    def query(
+        self,
+        source: str,
+        metric: str,
+        start: datetime,
+        end: datetime,
+        step_seconds: int,
+        subject: str = "",
+        now: Optional[datetime] = None,
+    ) -> tuple[str, list[SeriesPoint]]:
+        """Return ``(resolution used, points)`` for one series, one point per step."""
+        _, _, metrics = SOURCES[source]
+        if metric not in metrics:
+            raise ValueError(f"Unknown metric {metric!r} for {source}")
+        start, end = utc_naive(start), utc_naive(end)
+        resolution = self.choose_resolution(start, step_seconds, now=now, source=source)
+
+        points: dict[datetime, _Agg] = {}
+        for level, since, until in self.segments(source, resolution, start, end):
+            for at, agg in self._read(source, level, metric, subject, since, until):
+                key = floor_time(at, step_seconds)
+                if key in points:
+                    points[key].merge(agg)
+                else:
+                    points[key] = agg
+        return resolution, [
+            SeriesPoint(
+                bucket_start=key,
+                min=agg.min_value,
+                avg=agg.sum_value / agg.sample_count,
+                max=agg.max_value,
+                last=agg.last_value,
+            )
+            for key, agg in sorted(points.items())
+        ]
@@ -0,0 +1,241 @@
+"""Time-bucketed metric series and top-N rankings computed in SQL.
+
+Bucketing and aggregation happen in the database: ``date_trunc`` (or
+``date_bin`` for other step widths) on PostgreSQL, integer division of the
+unix time on SQLite. Only one row per bucket (or per user) comes back, and
+results are returned column-wise (``{"t": [...], "avg": [...]}``) so large
+series serialise compactly.
+
+Ranges that reach back past the raw retention are read from
+``metric_rollups``; the tail that has not been rolled up yet is read from
+finer rollups and the raw tables and merged in, so recent data is never
+missing (see ``MetricsRollupService.segments``).
+"""
+
+from __future__ import annotations
+
+import heapq
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from sqlalchemy import Integer, cast, func, literal_column
+from sqlalchemy.sql.elements import ColumnElement
+from sqlmodel import Session, col, select
+
+from models import MetricRollup, UserMetrics
+from services.metrics_rollup import RAW, SOURCES, MetricsRollupService, utc_naive
+
+MAX_POINTS = 10_000
+
+_TRUNC_UNITS = {60: "minute", 3600: "hour", 86400: "day"}
+
+# ranking name: (user_metrics column, aggregate over the window)
+TOP_METRICS = {
+    "cpu": ("cpu_time_seconds", "delta"),  # CPU seconds consumed in the window
+    "memory": ("memory_usage_mb", "avg"),
+    "disk": ("disk_usage_mb", "max"),
+}
+
+
+def bucket_epoch(
+    column: Any, step_seconds: int, dialect_name: str
+) -> ColumnElement[Any]:
+    """SQL expression for the start of ``column``'s bucket, in epoch seconds."""
+    step = int(step_seconds)
+    if dialect_name == "postgresql":
+        unit = _TRUNC_UNITS.get(step)
+        if unit is not None:
+            bucket = func.date_trunc(unit, column)
+        else:
+            # Literal SQL keeps the SELECT and GROUP BY expressions identical
+            bucket = func.date_bin(
+                literal_column(f"INTERVAL '{step} seconds'"),
+                column,
+                literal_column("TIMESTAMP '1970-01-01'"),
+            )
+        return cast(func.extract("epoch", bucket), Integer)
+    return (
+        cast(func.strftime("%s", column), Integer)
+        // literal_column(str(step))
+        * literal_column(str(step))
+    )
+
+
+def _merge(into: dict[Any, list[float]], rows: Any) -> None:
+    """Fold ``(key, min, max, sum, count)`` rows into ``into``."""
+    for key, lo, hi, total, count in rows:
+        current = into.get(key)
+        if current is None:
+            into[key] = [float(lo), float(hi), float(total), float(count)]
+        else:
+            current[0] = min(current[0], float(lo))
+            current[1] = max(current[1], float(hi))
+            current[2] += float(total)
+            current[3] += float(count)
+
+
+class MetricsSeriesService:
+    """Reads metric history with aggregation pushed down into SQL."""
+
+    def __init__(
+        self, session: Session, rollups: Optional[MetricsRollupService] = None
+    ) -> None:
+        self.session = session
+        self.rollups = rollups or MetricsRollupService(session)
+        self.dialect = session.get_bind().dialect.name
+
+    def series(
+        self,
+        source: str,
+        metric: str,
+        start: datetime,
+        end: datetime,
+        step_seconds: int,
+        subject: str = "",
+        now: Optional[datetime] = None,
+    ) -> dict[str, Any]:
+        """Return one series as columns ``t``/``min``/``avg``/``max``.
+
+        ``t`` holds bucket starts as unix seconds; empty buckets are omitted.
+        """
+        if source not in SOURCES:
+            raise ValueError(f"Unknown source {source!r}")
+        model, subject_col, metrics = SOURCES[source]
+        if metric not in metrics:
+            raise ValueError(f"Unknown metric {metric!r} for {source}")
+        start, end = utc_naive(start), utc_naive(end)
+        if step_seconds < 1 or end <= start:
+            raise ValueError("Invalid range or step")
+        if (end - start).total_seconds() / step_seconds > MAX_POINTS:
+            raise ValueError(f"Range and step exceed {MAX_POINTS} points")
+
+        resolution = self.rollups.choose_resolution(
+            start, step_seconds, now=now, source=source
+        )
+        buckets: dict[int, list[float]] = {}
+        for level, since, until in self.rollups.segments(
+            source, resolution, start, end
+        ):
+            if level == RAW:
+                ts = col(model.timestamp)
+                value = getattr(model, metric)
+                bucket = bucket_epoch(ts, step_seconds, self.dialect)
+                query = select(
+                    bucket,
+                    func.min(value),
+                    func.max(value),
+                    func.sum(value),
+                    func.count(),
+                ).where((ts >= since) & (ts < until))
+                if subject_col:
+                    query = query.where(getattr(model, subject_col) == subject)
+            else:
+                ts = col(MetricRollup.bucket_start)
+                bucket = bucket_epoch(ts, step_seconds, self.dialect)
+                query = select(
+                    bucket,
+                    func.min(MetricRollup.min_value),
+                    func.max(MetricRollup.max_value),
+                    func.sum(MetricRollup.sum_value),
+                    func.sum(MetricRollup.sample_count),
+                ).where(
+                    (MetricRollup.source == source)
+                    & (MetricRollup.resolution == level)
+                    & (MetricRollup.metric == metric)
+                    & (MetricRollup.subject == subject)
+                    & (ts >= since)
+                    & (ts < until)
+                )
+            _merge(buckets, self.session.exec(query.group_by(bucket)))
+
+        t = sorted(buckets)
+        return {
+            "source": source,
+            "metric": metric,
+            "subject": subject,
+            "resolution": resolution,
+            "step": step_seconds,
+            "t": [int(k) for k in t],
+            "min": [buckets[k][0] for k in t],
+            "avg": [buckets[k][2] / buckets[k][3] for k in t],
+            "max": [buckets[k][1] for k in t],
+        }
+
+    def top_users(
+        self,
+        by: str,
+        start: datetime,
+        end: Optional[datetime] = None,
+        limit: int = 10,
+        now: Optional[datetime] = None,
+    ) -> dict[str, Any]:
+        """Rank users by ``cpu``, ``memory`` or ``disk`` over a window."""
+        if by not in TOP_METRICS:
+            raise ValueError(f"Unknown ranking {by!r}")
+        metric, aggregate = TOP_METRICS[by]
+        start = utc_naive(start)
+        end = utc_naive(end or now or datetime.now(timezone.utc))
+        # Precision beats granularity here: raw if it still reaches back
+        resolution = self.rollups.choose_resolution(start, 0, now=now, source="user")
+        segments = self.rollups.segments("user", resolution, start, end)
+
+        ts = col(UserMetrics.timestamp)
+        value = getattr(UserMetrics, metric)
+        lo, hi = func.min(value), func.max(value)
+        score = {"delta": hi - lo, "avg": func.avg(value), "max": hi}[aggregate]
+        if all(level == RAW for level, _, _ in segments):
+            # Everything is raw: rank and limit in the database
+            rows = self.session.exec(
+                select(UserMetrics.username, score)
+                .where((ts >= start) & (ts < end))
+                .group_by(UserMetrics.username)
+                .order_by(score.desc(), UserMetrics.username)
+                .limit(limit)
+            ).all()
+        else:
+            # Rolled-up history plus the tail; one row per user and segment
+            per_user: dict[str, list[float]] = {}
+            rollup_ts = col(MetricRollup.bucket_start)
+            for level, since, until in segments:
+                if level == RAW:
+                    query = (
+                        select(
+                            UserMetrics.username, lo, hi, func.sum(value), func.count()
+                        )
+                        .where((ts >= since) & (ts < until))
+                        .group_by(UserMetrics.username)
+                    )
+                else:
+                    query = (
+                        select(
+                            MetricRollup.subject,
+                            func.min(MetricRollup.min_value),
+                            func.max(MetricRollup.max_value),
+                            func.sum(MetricRollup.sum_value),
+                            func.sum(MetricRollup.sample_count),
+                        )
+                        .where(
+                            (MetricRollup.source == "user")
+                            & (MetricRollup.resolution == level)
+                            & (MetricRollup.metric == metric)
+                            & (rollup_ts >= since)
+                            & (rollup_ts < until)
+                        )
+                        .group_by(MetricRollup.subject)
+                    )
+                _merge(per_user, self.session.exec(query))
+            scores = {
+                name: {"delta": v[1] - v[0], "avg": v[2] / v[3], "max": v[1]}[aggregate]
+                for name, v in per_user.items()
+            }
+            rows = heapq.nsmallest(
+                limit, scores.items(), key=lambda item: (-item[1], item[0])
+            )
+        return {
+            "by": by,
+            "metric": metric,
+            "aggregate": aggregate,
+            "resolution": resolution,
+            "username": [name for name, _ in rows],
+            "value": [float(v) for _, v in rows],
+        }
@@ -0,0 +1,112 @@
+"""Buffered, batched persistence of UserMetrics samples.
+
+Adding one ORM object per user per interval means thousands of INSERT
+round-trips every tick. ``MetricsWriter`` buffers plain row tuples and
+flushes them in one statement: ``COPY ... FROM STDIN`` on PostgreSQL, a
+multi-row executemany INSERT on other backends (e.g. SQLite in tests).
+"""
+
+from __future__ import annotations
+
+import io
+import threading
+from collections.abc import Iterable
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+
+from models import UserMetrics
+
+COLUMNS = (
+    "username",
+    "timestamp",
+    "cpu_time_seconds",
+    "memory_usage_mb",
+    "disk_usage_mb",
+    "active_processes",
+    "login_sessions",
+    "last_activity",
+    "web_requests_count",
+)
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_value(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def encode_copy_rows(rows: Iterable[tuple[Any, ...]]) -> str:
+    """Render rows in PostgreSQL's COPY text format."""
+    return "".join("\t".join(_copy_value(v) for v in row) + "\n" for row in rows)
+
+
+class MetricsWriter:
+    """Buffers UserMetrics samples and writes them in one round-trip."""
+
+    def __init__(self, engine: Engine, max_buffer: int = 200_000) -> None:
+        self.engine = engine
+        self.max_buffer = max_buffer
+        self.table = UserMetrics.__table__
+        self._buffer: list[tuple[Any, ...]] = []
+        self._lock = threading.Lock()
+        self.rows_written = 0
+        self.dropped = 0
+
+    def add(self, samples: Iterable[UserMetrics]) -> None:
+        rows = [tuple(getattr(s, c) for c in COLUMNS) for s in samples]
+        with self._lock:
+            room = self.max_buffer - len(self._buffer)
+            if len(rows) > room:
+                # The database is not keeping up; shed the newest samples
+                self.dropped += len(rows) - max(room, 0)
+                rows = rows[: max(room, 0)]
+            self._buffer.extend(rows)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def flush(self) -> int:
+        """Write all buffered rows; returns how many were written."""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        try:
+            if self.engine.dialect.name == "postgresql":
+                self._copy(rows)
+            else:
+                with self.engine.begin() as conn:
+                    conn.execute(
+                        insert(self.table), [dict(zip(COLUMNS, r)) for r in rows]
+                    )
+        except Exception:
+            with self._lock:
+                # Keep the samples for the next attempt
+                self._buffer[:0] = rows[: max(0, self.max_buffer - len(self._buffer))]
+            raise
+        self.rows_written += len(rows)
+        return len(rows)
+
+    def _copy(self, rows: list[tuple[Any, ...]]) -> None:
+        payload = io.StringIO(encode_copy_rows(rows))
+        raw = self.engine.raw_connection()
+        try:
+            with raw.cursor() as cur:
+                cur.copy_expert(
+                    f"COPY {self.table.name} ({', '.join(COLUMNS)}) FROM STDIN",
+                    payload,
+                )
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            raw.close()
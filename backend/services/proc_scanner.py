@@ -0,0 +1,57 @@
+"""Single-pass /proc scanner aggregating process usage by UID.
+
+Walking ``/proc`` once per interval and bucketing by UID keeps collection at
+O(processes) regardless of how many users are asked about, instead of the
+O(users x processes) cost of filtering the process list per user.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import NamedTuple
+
+
+class UidUsage(NamedTuple):
+    rss_kb: int
+    cpu_ticks: int
+    processes: int
+
+
+class ProcScanner:
+    """Reads ``<proc_root>/<pid>/{status,stat}`` for every process once."""
+
+    def __init__(self, proc_root: str = "/proc") -> None:
+        self.proc_root = proc_root
+        self.page_kb = os.sysconf("SC_PAGE_SIZE") // 1024
+        self.clock_ticks = os.sysconf("SC_CLK_TCK")
+
+    def scan(self) -> dict[int, UidUsage]:
+        """Return RSS, cumulative CPU ticks and process count per real UID."""
+        totals: dict[int, list[int]] = {}
+        with os.scandir(self.proc_root) as entries:
+            for entry in entries:
+                if not entry.name.isdigit():
+                    continue
+                try:
+                    with open(f"{entry.path}/status", "rb") as fh:
+                        status = fh.read()
+                    with open(f"{entry.path}/stat", "rb") as fh:
+                        stat = fh.read()
+                except OSError:
+                    continue  # process exited between readdir and open
+                uid_at = status.find(b"\nUid:")
+                if uid_at < 0:
+                    continue
+                uid = int(status[uid_at + 5 :].split(None, 1)[0])
+                # comm may contain spaces/parens; fields resume after the last ')'
+                fields = stat[stat.rindex(b")") + 2 :].split()
+                ticks = int(fields[11]) + int(fields[12])  # utime + stime
+                rss_kb = int(fields[21]) * self.page_kb
+                row = totals.get(uid)
+                if row is None:
+                    totals[uid] = [rss_kb, ticks, 1]
+                else:
+                    row[0] += rss_kb
+                    row[1] += ticks
+                    row[2] += 1
+        return {uid: UidUsage(*row) for uid, row in totals.items()}
@@ -5,19 +5,28 @@ prepare their home directories, and deploy initial skeleton files.
 
 In development and tests, it operates in dry-run mode and never executes
 system commands. In production, it can be configured to execute commands
-via a pluggable runner.
+via a pluggable runner. ``NativeRunner`` is such a runner: it performs the
+directory, ownership and permission steps in-process so that provisioning a
+user costs a single fork/exec (``useradd``) instead of one per command.
 """
 
 from __future__ import annotations
 
+import grp
 import os
+import pwd
 import shlex
+import shutil
+import stat
 import subprocess
-from dataclasses import dataclass
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Callable, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
-from models import User
+from models import User, UserStatus
+from services.account_db import AccountDbWriter, AccountSpec, NewAccount
 
 
 @dataclass
@@ -27,7 +36,242 @@ class ProvisionResult:
     message: str = ""
 
 
+@dataclass
+class BatchProvisionResult:
+    created: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    dry_run: bool = False
+
+
+@dataclass
+class AccountState:
+    """Observed on-disk state of a user account, used for planning."""
+
+    exists: bool
+    uid: Optional[int] = None
+    gid: Optional[int] = None
+    home: Optional[os.stat_result] = None
+    public_html: Optional[os.stat_result] = None
+
+
 ShellRunner = Callable[[List[str]], int]
+IdResolver = Callable[[str, str], Tuple[int, int]]
+
+
+def run_subprocess(argv: List[str]) -> int:
+    completed = subprocess.run(argv, check=False)
+    return completed.returncode
+
+
+def _read_db(root: str, name: str) -> List[List[str]]:
+    """Read a colon-separated account database (passwd/group) below ``root``."""
+    path = os.path.join(root, "etc", name)
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return [line.rstrip("\n").split(":") for line in fh if ":" in line]
+    except FileNotFoundError:
+        return []
+
+
+def lookup_passwd(username: str, root: str = "/") -> Optional[Tuple[int, int, str]]:
+    """Return ``(uid, gid, home)`` for ``username`` or None if it has no entry.
+
+    With the default root the host's NSS databases are queried; otherwise
+    ``<root>/etc/passwd`` is parsed so a fake root can be inspected in tests.
+    """
+    if root in ("", "/"):
+        try:
+            entry = pwd.getpwnam(username)
+        except KeyError:
+            return None
+        return entry.pw_uid, entry.pw_gid, entry.pw_dir
+    for fields in _read_db(root, "passwd"):
+        if fields[0] == username and len(fields) >= 6:
+            return int(fields[2]), int(fields[3]), fields[5]
+    return None
+
+
+def resolve_ids(user: str, group: str, root: str = "/") -> Tuple[int, int]:
+    """Resolve a ``user:group`` pair to numeric ids using the account databases."""
+    if user.isdigit():
+        uid = int(user)
+        primary_gid: Optional[int] = None
+    else:
+        entry = lookup_passwd(user, root)
+        if entry is None:
+            raise KeyError(user)
+        uid, primary_gid = entry[0], entry[1]
+    if not group:
+        if primary_gid is None:
+            primary_gid = pwd.getpwuid(uid).pw_gid
+        return uid, primary_gid
+    if group.isdigit():
+        return uid, int(group)
+    if root in ("", "/"):
+        return uid, grp.getgrnam(group).gr_gid
+    for fields in _read_db(root, "group"):
+        if fields[0] == group and len(fields) >= 3:
+            return uid, int(fields[2])
+    raise KeyError(group)
+
+
+def _copy_file(src: str, dst: str) -> None:
+    """Copy file contents, preferring copy_file_range (reflinks on btrfs/xfs)."""
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        except (AttributeError, OSError):
+            # Unsupported on this kernel/filesystem: restart with a plain copy
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+            shutil.copyfileobj(fsrc, fdst)
+
+
+def copy_skeleton(src: str, dst: str, uid: int, gid: int) -> None:
+    """Recursively copy a skeleton tree into ``dst`` owned by ``uid:gid``.
+
+    Uses ``os.scandir`` so each entry is stat'ed at most once; modes are
+    preserved and symlinks are recreated rather than followed.
+    """
+    with os.scandir(src) as entries:
+        for entry in entries:
+            target = os.path.join(dst, entry.name)
+            if entry.is_symlink():
+                os.symlink(os.readlink(entry.path), target)
+            elif entry.is_dir(follow_symlinks=False):
+                os.makedirs(target, exist_ok=True)
+                copy_skeleton(entry.path, target, uid, gid)
+            else:
+                _copy_file(entry.path, target)
+            if not entry.is_symlink():
+                os.chmod(target, entry.stat(follow_symlinks=False).st_mode & 0o7777)
+            os.chown(target, uid, gid, follow_symlinks=False)
+
+
+class NativeRunner:
+    """ShellRunner that executes provisioning steps in-process where possible.
+
+    ``mkdir``, ``chown`` and ``chmod`` are performed with ``os`` calls. For
+    ``useradd`` only the account entry is delegated to ``account_runner``
+    (``-m``/``-k`` are replaced by ``-M``); the home directory and skeleton
+    copy are then done natively. Anything else falls through to
+    ``account_runner`` unchanged.
+
+    All absolute paths are resolved below ``root`` so the runner can target a
+    chroot or a temporary directory in tests and benchmarks.
+    """
+
+    def __init__(
+        self,
+        account_runner: Optional[ShellRunner] = None,
+        id_resolver: Optional[IdResolver] = None,
+        root: str = "/",
+        home_mode: int = 0o755,
+    ) -> None:
+        self.account_runner = account_runner or run_subprocess
+        self.id_resolver = id_resolver or (lambda u, g: resolve_ids(u, g, root))
+        self.root = root
+        self.home_mode = home_mode
+        self.forks = 0
+
+    def __call__(self, argv: List[str]) -> int:
+        if not argv:
+            return 0
+        handler = {
+            "useradd": self._useradd,
+            "mkdir": self._mkdir,
+            "chown": self._chown,
+            "chmod": self._chmod,
+        }.get(argv[0])
+        if handler is None:
+            return self._fork(argv)
+        try:
+            return handler(argv[1:])
+        except (KeyError, OSError, ValueError):
+            return 1
+
+    def _fork(self, argv: List[str]) -> int:
+        self.forks += 1
+        return self.account_runner(argv)
+
+    def _path(self, path: str) -> str:
+        if self.root in ("", "/"):
+            return path
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def _useradd(self, args: List[str]) -> int:
+        create_home = "-m" in args
+        home: Optional[str] = None
+        skel: Optional[str] = None
+        passthrough: List[str] = []
+        it = iter(args)
+        for arg in it:
+            if arg == "-m":
+                continue
+            if arg == "-k":
+                skel = next(it)
+                continue
+            if arg == "-d":
+                home = next(it)
+                passthrough.extend([arg, home])
+                continue
+            passthrough.append(arg)
+        username = passthrough[-1]
+        if create_home:
+            passthrough.insert(0, "-M")
+
+        rc = self._fork(["useradd", *passthrough])
+        if rc != 0 or not create_home:
+            return rc
+
+        home_path = self._path(home or f"/home/{username}")
+        uid, gid = self.id_resolver(username, "")
+        os.makedirs(home_path, exist_ok=True)
+        os.chmod(home_path, self.home_mode)
+        os.chown(home_path, uid, gid)
+        if skel and os.path.isdir(skel):
+            copy_skeleton(skel, home_path, uid, gid)
+        return 0
+
+    def _mkdir(self, args: List[str]) -> int:
+        parents = "-p" in args
+        for path in (a for a in args if not a.startswith("-")):
+            if parents:
+                os.makedirs(self._path(path), exist_ok=True)
+            else:
+                os.mkdir(self._path(path))
+        return 0
+
+    def _chown(self, args: List[str]) -> int:
+        recursive = "-R" in args
+        owner, *paths = [a for a in args if not a.startswith("-")]
+        user, _, group = owner.partition(":")
+        uid, gid = self.id_resolver(user, group)
+        for path in paths:
+            top = self._path(path)
+            os.chown(top, uid, gid, follow_symlinks=False)
+            if not recursive:
+                continue
+            for dirpath, dirnames, filenames in os.walk(top):
+                for name in dirnames + filenames:
+                    os.chown(
+                        os.path.join(dirpath, name), uid, gid, follow_symlinks=False
+                    )
+        return 0
+
+    def _chmod(self, args: List[str]) -> int:
+        mode_str, *paths = [a for a in args if not a.startswith("-")]
+        mode = int(mode_str, 8)
+        for path in paths:
+            os.chmod(self._path(path), mode)
+        return 0
 
 
 class ProvisioningService:
@@ -39,17 +283,20 @@ class ProvisioningService:
         env: Optional[str] = None,
         skeleton_dir: Optional[str] = None,
         default_shell: str = "/bin/bash",
+        root: str = "/",
     ) -> None:
         self.env = (env or os.getenv("PUBNIX_ENV", "development")).lower()
+        if shell_runner is None and os.getenv("PUBNIX_PROVISION_BACKEND") == "native":
+            shell_runner = NativeRunner()
         self.shell_runner = shell_runner or self._default_runner
         self.skeleton_dir = skeleton_dir or os.getenv(
             "PUBNIX_SKEL_DIR", str(Path(__file__).resolve().parent.parent / "skel")
         )
         self.default_shell = default_shell
+        self.root = root
 
     def _default_runner(self, argv: List[str]) -> int:
-        completed = subprocess.run(argv, check=False)
-        return completed.returncode
+        return run_subprocess(argv)
 
     def build_commands(self, user: User) -> List[str]:
         """Build the list of system commands required to provision the user."""
@@ -70,15 +317,175 @@ class ProvisioningService:
         ]
         return commands
 
+    def _stat(self, path: str) -> Optional[os.stat_result]:
+        if self.root not in ("", "/"):
+            path = os.path.join(self.root, path.lstrip("/"))
+        try:
+            return os.stat(path)
+        except FileNotFoundError:
+            return None
+
+    def inspect_account(self, user: User) -> AccountState:
+        """Collect the passwd entry and home/public_html ownership and modes."""
+        entry = lookup_passwd(user.username, self.root)
+        if entry is None:
+            return AccountState(exists=False)
+        uid, gid, _ = entry
+        try:
+            # Commands chown to user:user, so compare against that group
+            uid, gid = resolve_ids(user.username, user.username, self.root)
+        except KeyError:
+            pass
+        home = user.home_directory or f"/home/{user.username}"
+        return AccountState(
+            exists=True,
+            uid=uid,
+            gid=gid,
+            home=self._stat(home),
+            public_html=self._stat(f"{home}/public_html"),
+        )
+
+    def plan_commands(
+        self, user: User, state: Optional[AccountState] = None
+    ) -> List[str]:
+        """Compute the minimal commands that bring the account to its target state.
+
+        Accounts without a passwd entry get the full ``build_commands`` list;
+        existing accounts only get the steps whose checks fail. Ownership of
+        ``public_html`` is checked on the directory itself, not recursively.
+        """
+        state = state or self.inspect_account(user)
+        if not state.exists:
+            return self.build_commands(user)
+
+        home = shlex.quote(user.home_directory or f"/home/{user.username}")
+        owner = f"{shlex.quote(user.username)}:{shlex.quote(user.username)}"
+        ids = (state.uid, state.gid)
+        commands: List[str] = []
+
+        if state.home is None:
+            commands += [
+                f"mkdir -p {home}",
+                f"chown {owner} {home}",
+                f"chmod 755 {home}",
+            ]
+        else:
+            if (state.home.st_uid, state.home.st_gid) != ids:
+                commands.append(f"chown {owner} {home}")
+            if stat.S_IMODE(state.home.st_mode) != 0o755:
+                commands.append(f"chmod 755 {home}")
+
+        pub = state.public_html
+        if pub is None:
+            commands += [
+                f"mkdir -p {home}/public_html",
+                f"chown -R {owner} {home}/public_html",
+                f"chmod 755 {home}/public_html",
+            ]
+        else:
+            if (pub.st_uid, pub.st_gid) != ids:
+                commands.append(f"chown -R {owner} {home}/public_html")
+            if stat.S_IMODE(pub.st_mode) != 0o755:
+                commands.append(f"chmod 755 {home}/public_html")
+        return commands
+
+    def reconcile(
+        self, users: Iterable[User], dry_run: Optional[bool] = None
+    ) -> Dict[str, ProvisionResult]:
+        """Re-provision approved users whose accounts drifted.
+
+        Only accounts with a non-empty plan are touched; the result maps the
+        username of each drifted account to its provisioning result.
+        """
+        results: Dict[str, ProvisionResult] = {}
+        for user in users:
+            if user.status != UserStatus.APPROVED:
+                continue
+            commands = self.plan_commands(user)
+            if commands:
+                results[user.username] = self._run(commands, dry_run)
+        return results
+
     def provision_user(
         self, user: User, dry_run: Optional[bool] = None
     ) -> ProvisionResult:
         """Provision the given user account on the host system.
 
+        Idempotent: only the steps reported by ``plan_commands`` are run, so
+        re-provisioning an existing account does not fail on ``useradd``.
         In non-production environments, defaults to dry-run (no command execution).
         """
+        commands = self.plan_commands(user)
+        if not commands:
+            return ProvisionResult(
+                success=True, commands=[], message="Already provisioned"
+            )
+        return self._run(commands, dry_run)
+
+    def provision_batch(
+        self,
+        users: Iterable[User],
+        dry_run: Optional[bool] = None,
+        max_workers: int = 8,
+    ) -> BatchProvisionResult:
+        """Create many accounts with one passwd/group/shadow transaction.
+
+        All new entries are written by ``AccountDbWriter`` under a single
+        account-database lock; home directories are then populated in
+        parallel. Users that already have a passwd entry are skipped.
+        """
+        is_dry_run = dry_run if dry_run is not None else (self.env != "production")
+        result = BatchProvisionResult(dry_run=is_dry_run)
+        specs: List[AccountSpec] = []
+        for user in users:
+            if lookup_passwd(user.username, self.root) is not None:
+                result.skipped.append(user.username)
+                continue
+            specs.append(
+                AccountSpec(
+                    username=user.username,
+                    home=user.home_directory or f"/home/{user.username}",
+                    shell=user.shell or self.default_shell,
+                    gecos=user.full_name.replace(":", " ").replace(",", " "),
+                )
+            )
+
+        if is_dry_run:
+            result.created = [spec.username for spec in specs]
+            return result
+
+        requested = {spec.username for spec in specs}
+        accounts = AccountDbWriter(root=self.root).add_accounts(specs)
+        result.skipped += sorted(requested - {a.username for a in accounts})
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            outcomes = pool.map(self._create_home, accounts)
+            for account, error in zip(accounts, outcomes):
+                if error:
+                    result.failed[account.username] = error
+                else:
+                    result.created.append(account.username)
+        return result
+
+    def _create_home(self, account: NewAccount) -> Optional[str]:
+        home = account.home
+        if self.root not in ("", "/"):
+            home = os.path.join(self.root, home.lstrip("/"))
+        public_html = os.path.join(home, "public_html")
+        try:
+            os.makedirs(home, exist_ok=True)
+            if os.path.isdir(self.skeleton_dir):
+                copy_skeleton(self.skeleton_dir, home, account.uid, account.gid)
+            os.makedirs(public_html, exist_ok=True)
+            for path in (home, public_html):
+                os.chmod(path, 0o755)
+                os.chown(path, account.uid, account.gid)
+        except OSError as exc:
+            return str(exc)
+        return None
+
+    def _run(self, commands: List[str], dry_run: Optional[bool]) -> ProvisionResult:
         is_dry_run = dry_run if dry_run is not None else (self.env != "production")
-        commands = self.build_commands(user)
 
         if is_dry_run:
             return ProvisionResult(
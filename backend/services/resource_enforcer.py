@@ -2,10 +2,36 @@
 
 from __future__ import annotations
 
+from collections.abc import Iterable, Mapping
 from dataclasses import dataclass
+from typing import Any
 
 from models import ResourceLimits, UserMetrics
 
+try:
+    import numpy as np
+except ImportError:  # optional: only needed for batch evaluation
+    np = None
+
+# Violation kind -> (UserMetrics column, ResourceLimits column)
+LIMIT_COLUMNS = {
+    "processes": ("active_processes", "max_processes"),
+    "memory": ("memory_usage_mb", "memory_limit_mb"),
+    "sessions": ("login_sessions", "max_login_sessions"),
+    "disk": ("disk_usage_mb", "disk_quota_mb"),
+}
+
+
+def to_columns(rows: Iterable[Any], fields: Iterable[str]) -> dict[str, Any]:
+    """Convert model rows into NumPy columns for ``check_batch_violations``."""
+    if np is None:
+        raise RuntimeError("numpy is required for columnar resource checks")
+    rows = list(rows)
+    return {
+        name: np.fromiter((getattr(r, name) for r in rows), np.int64, len(rows))
+        for name in fields
+    }
+
 
 @dataclass
 class Violation:
@@ -65,6 +91,49 @@ class ResourceEnforcer:
 
         return violations
 
+    def check_batch_violations(
+        self, metrics: Mapping[str, Any], limits: Mapping[str, Any]
+    ) -> dict[str, Any]:
+        """Evaluate all users at once over columnar arrays.
+
+        ``metrics`` maps UserMetrics field names and ``limits`` maps
+        ResourceLimits field names to equally long arrays, one element per
+        user. Returns a boolean mask per violation kind; kinds whose columns
+        are absent are skipped.
+        """
+        if np is None:
+            raise RuntimeError("numpy is required for batch resource checks")
+        masks: dict[str, Any] = {}
+        for kind, (metric_col, limit_col) in LIMIT_COLUMNS.items():
+            if metric_col in metrics and limit_col in limits:
+                masks[kind] = np.greater(
+                    np.asarray(metrics[metric_col]), np.asarray(limits[limit_col])
+                )
+        return masks
+
+    def violated_kinds(
+        self, metrics: list[UserMetrics], limits: list[ResourceLimits]
+    ) -> list[set[str]]:
+        """Violated kinds for each (metrics, limits) pair, in order.
+
+        Uses ``check_batch_violations`` when numpy is installed and falls back
+        to ``check_user_violations`` per user otherwise.
+        """
+        if np is None or not metrics:
+            return [
+                {v.kind for v in self.check_user_violations(m, lim)}
+                for m, lim in zip(metrics, limits)
+            ]
+        masks = self.check_batch_violations(
+            to_columns(metrics, (m for m, _ in LIMIT_COLUMNS.values())),
+            to_columns(limits, (lim for _, lim in LIMIT_COLUMNS.values())),
+        )
+        kinds: list[set[str]] = [set() for _ in metrics]
+        for kind, mask in masks.items():
+            for i in np.flatnonzero(mask):
+                kinds[i].add(kind)
+        return kinds
+
     def build_enforcement_commands(
         self, username: str, violations: list[Violation]
     ) -> list[str]:
@@ -0,0 +1,184 @@
+"""Bulk import of SSH public keys, e.g. when migrating users from another host.
+
+Keys arrive as whole ``authorized_keys`` files per user or as individual
+entries. They are parsed and fingerprinted in bulk, spread over a process
+pool once the input is large enough that hashing outweighs the pool's
+start-up cost. Existing fingerprints for every owner are fetched with one
+query, and the remaining keys are inserted with one multi-row INSERT. Keys
+are stored as the normalized ``algorithm key comment`` line. If a
+concurrent add wins the race for a key, the batch is retried row by row
+and the losers are counted as duplicates.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, col, select
+
+from models import SshKey, User
+from services.ssh_key_service import ALLOWED_ALGORITHMS, ParsedKey, SshKeyService
+
+# Below this many keys, parsing inline is faster than starting workers
+PARALLEL_THRESHOLD = 5_000
+CHUNK_SIZE = 1_000
+
+NAME_MAX_LENGTH = 100
+
+
+@dataclass
+class ImportEntry:
+    username: str
+    public_key: str
+    name: Optional[str] = None
+    line: Optional[int] = None  # line number within an uploaded file
+
+
+@dataclass
+class ImportFailure:
+    username: str
+    detail: str
+    line: Optional[int] = None
+
+
+@dataclass
+class ImportReport:
+    imported: dict[str, int] = field(default_factory=dict)  # username -> keys
+    duplicates: int = 0
+    errors: list[ImportFailure] = field(default_factory=list)
+
+
+def entries_from_authorized_keys(username: str, content: str) -> list[ImportEntry]:
+    """One entry per key line; blank lines and comments are skipped."""
+    return [
+        ImportEntry(username=username, public_key=line.strip(), line=number)
+        for number, line in enumerate(content.splitlines(), start=1)
+        if line.strip() and not line.lstrip().startswith("#")
+    ]
+
+
+def _parse(public_key: str) -> Union[ParsedKey, str]:
+    tokens = public_key.split()
+    if tokens and tokens[0] not in ALLOWED_ALGORITHMS:
+        if any(token in ALLOWED_ALGORITHMS for token in tokens[1:]):
+            # Dropping options such as command="..." would widen access
+            return "Key options are not supported"
+    try:
+        return SshKeyService.parse_public_key(public_key)
+    except ValueError as exc:
+        return str(exc)
+
+
+def _parse_chunk(public_keys: list[str]) -> list[Union[ParsedKey, str]]:
+    return [_parse(key) for key in public_keys]
+
+
+def parse_keys(
+    public_keys: list[str],
+    max_workers: Optional[int] = None,
+    parallel_threshold: int = PARALLEL_THRESHOLD,
+) -> list[Union[ParsedKey, str]]:
+    """Parse keys in order; invalid ones come back as an error message."""
+    if len(public_keys) < parallel_threshold:
+        return _parse_chunk(public_keys)
+    chunks = [
+        public_keys[i : i + CHUNK_SIZE] for i in range(0, len(public_keys), CHUNK_SIZE)
+    ]
+    # forkserver: forking the threaded API process could deadlock workers
+    context = multiprocessing.get_context("forkserver")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+        return [parsed for chunk in pool.map(_parse_chunk, chunks) for parsed in chunk]
+
+
+def _key_name(entry: ImportEntry, parsed: ParsedKey, index: int) -> str:
+    name = entry.name or parsed.comment or f"imported-{index}"
+    return name[:NAME_MAX_LENGTH]
+
+
+def _insert_each(
+    session: Session, rows: list[dict], owners: list[str], report: ImportReport
+) -> None:
+    for row, username in zip(rows, owners):
+        try:
+            with session.begin_nested():
+                session.execute(insert(SshKey), [row])
+        except IntegrityError:
+            report.duplicates += 1
+            report.imported[username] -= 1
+            if not report.imported[username]:
+                del report.imported[username]
+    session.commit()
+
+
+def import_keys(
+    session: Session,
+    entries: Iterable[ImportEntry],
+    parallel_threshold: int = PARALLEL_THRESHOLD,
+) -> ImportReport:
+    """Insert every new, valid key and commit; see ``ImportReport``."""
+    entries = list(entries)
+    report = ImportReport()
+    parsed_keys = parse_keys(
+        [e.public_key for e in entries], parallel_threshold=parallel_threshold
+    )
+
+    usernames = {e.username for e in entries}
+    user_ids = dict(
+        session.exec(
+            select(User.username, User.id).where(col(User.username).in_(usernames))
+        ).all()
+    )
+    seen = set(
+        session.exec(
+            select(SshKey.user_id, SshKey.fingerprint).where(
+                col(SshKey.user_id).in_(user_ids.values())
+            )
+        ).all()
+    )
+
+    rows: list[dict] = []
+    owners: list[str] = []
+    now = datetime.now(timezone.utc)
+    for index, (entry, parsed) in enumerate(zip(entries, parsed_keys), start=1):
+        user_id = user_ids.get(entry.username)
+        if user_id is None:
+            report.errors.append(
+                ImportFailure(entry.username, "User not found", entry.line)
+            )
+            continue
+        if isinstance(parsed, str):
+            report.errors.append(ImportFailure(entry.username, parsed, entry.line))
+            continue
+        if (user_id, parsed.fingerprint) in seen:
+            report.duplicates += 1
+            continue
+        seen.add((user_id, parsed.fingerprint))
+        rows.append(
+            {
+                "user_id": user_id,
+                "name": _key_name(entry, parsed, index),
+                "public_key": parsed.line,
+                "fingerprint": parsed.fingerprint,
+                "is_active": True,
+                "created_at": now,
+            }
+        )
+        owners.append(entry.username)
+        report.imported[entry.username] = report.imported.get(entry.username, 0) + 1
+
+    if rows:
+        try:
+            session.execute(insert(SshKey), rows)
+            session.commit()
+        except IntegrityError:
+            # Lost a race with a concurrent add of some of these keys
+            session.rollback()
+            _insert_each(session, rows, owners, report)
+    return report
@@ -0,0 +1,81 @@
+"""Fingerprint-to-owner lookups over the ssh_keys fingerprint index.
+
+``ix_ssh_keys_fingerprint_user_id`` keeps all owners of a key next to each
+other, so both "who holds this key?" (incident response) and "which keys are
+held by more than one account?" (shared or leaked credentials) are index
+scans rather than table scans.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Collection, Iterable
+from dataclasses import dataclass
+
+from sqlalchemy import func
+from sqlmodel import Session, col, select
+
+from models import SshKey, User
+
+
+@dataclass
+class KeyOwner:
+    key_id: int
+    user_id: int
+    username: str
+    is_active: bool
+
+
+def normalize_fingerprint(value: str) -> str:
+    """Accept ``ssh-keygen -l`` style ``SHA256:...`` as well as the bare digest."""
+    return value.strip().removeprefix("SHA256:").rstrip("=")
+
+
+def _owners(
+    session: Session, fingerprints: Collection[str]
+) -> dict[str, list[KeyOwner]]:
+    query = (
+        select(
+            SshKey.fingerprint,
+            SshKey.id,
+            SshKey.user_id,
+            User.username,
+            SshKey.is_active,
+        )
+        .join(User, User.id == SshKey.user_id)
+        .where(col(SshKey.fingerprint).in_(fingerprints))
+        .order_by(SshKey.fingerprint, SshKey.user_id)
+    )
+    owners: dict[str, list[KeyOwner]] = {}
+    for fingerprint, key_id, user_id, username, is_active in session.exec(query):
+        owners.setdefault(fingerprint, []).append(
+            KeyOwner(key_id, user_id, username, is_active)
+        )
+    return owners
+
+
+def owners_by_fingerprint(
+    session: Session, fingerprints: Iterable[str]
+) -> dict[str, list[KeyOwner]]:
+    """Owners of each known fingerprint; unknown fingerprints are left out."""
+    return _owners(session, [normalize_fingerprint(fp) for fp in fingerprints])
+
+
+def duplicate_fingerprints(
+    session: Session, min_owners: int = 2, limit: int = 100
+) -> dict[str, list[KeyOwner]]:
+    """Fingerprints registered by at least ``min_owners`` accounts.
+
+    Most widely shared first. (fingerprint, user_id) is unique, so counting
+    rows per fingerprint counts distinct accounts.
+    """
+    owner_count = func.count(SshKey.user_id)
+    shared = (
+        select(SshKey.fingerprint)
+        .group_by(SshKey.fingerprint)
+        .having(owner_count >= min_owners)
+        .order_by(owner_count.desc(), SshKey.fingerprint)
+        .limit(limit)
+    )
+    fingerprints = list(session.exec(shared))
+    owners = _owners(session, fingerprints)
+    return {fp: owners[fp] for fp in fingerprints if fp in owners}
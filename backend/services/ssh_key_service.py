@@ -1,9 +1,19 @@
-"""SSH key parsing and validation utilities."""
+"""SSH key parsing and validation utilities.
+
+Besides the base64 layer, the key blob itself is parsed in the SSH wire
+format (RFC 4253 section 6.6, RFC 5656, RFC 8709): its algorithm must match
+the one on the line, RSA moduli must be at least ``MIN_RSA_BITS``, ECDSA
+curves must match the algorithm and ed25519 keys must be 32 bytes. Those
+checks are memoized per blob hash, so re-rendering known keys only costs a
+base64 decode and one SHA256.
+"""
 
 from __future__ import annotations
 
 import base64
 import hashlib
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
 from typing import List
 
@@ -15,6 +25,18 @@ ALLOWED_ALGORITHMS = {
     "ecdsa-sha2-nistp521",
 }
 
+MIN_RSA_BITS = 2048
+MAX_RSA_BITS = 16384
+
+# Curve name and uncompressed point length per ECDSA algorithm
+ECDSA_CURVES = {
+    "ecdsa-sha2-nistp256": ("nistp256", 65),
+    "ecdsa-sha2-nistp384": ("nistp384", 97),
+    "ecdsa-sha2-nistp521": ("nistp521", 133),
+}
+
+BLOB_CACHE_SIZE = 4096
+
 
 @dataclass
 class ParsedKey:
@@ -22,12 +44,110 @@ class ParsedKey:
     key_b64: str
     comment: str
     fingerprint: str  # SHA256 base64 without trailing '='
+    bits: int = 0
+
+    @property
+    def line(self) -> str:
+        """Normalized ``algorithm key comment`` line, as written to authorized_keys."""
+        return f"{self.algorithm} {self.key_b64} {self.comment}".strip()
+
+
+class _WireReader:
+    """Sequential reader for SSH wire-format strings and mpints."""
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.pos = 0
+
+    def string(self) -> bytes:
+        if self.pos + 4 > len(self.data):
+            raise ValueError("Truncated public key data")
+        length = int.from_bytes(self.data[self.pos : self.pos + 4], "big")
+        start = self.pos + 4
+        if start + length > len(self.data):
+            raise ValueError("Truncated public key data")
+        self.pos = start + length
+        return self.data[start : self.pos]
+
+    def mpint(self) -> int:
+        raw = self.string()
+        if raw and raw[0] & 0x80:
+            raise ValueError("Negative integer in public key data")
+        return int.from_bytes(raw, "big")
+
+    def done(self) -> None:
+        if self.pos != len(self.data):
+            raise ValueError("Trailing data after public key")
+
+
+def inspect_key_blob(algorithm: str, blob: bytes) -> int:
+    """Validate a decoded key blob and return its size in bits."""
+    reader = _WireReader(blob)
+    if reader.string() != algorithm.encode("ascii"):
+        raise ValueError("Key type does not match key data")
+    if algorithm == "ssh-ed25519":
+        if len(reader.string()) != 32:
+            raise ValueError("Invalid ed25519 key length")
+        bits = 256
+    elif algorithm == "ssh-rsa":
+        exponent = reader.mpint()
+        bits = reader.mpint().bit_length()
+        if exponent < 3 or exponent % 2 == 0:
+            raise ValueError("Invalid RSA public exponent")
+        if bits < MIN_RSA_BITS:
+            raise ValueError(f"RSA keys must be at least {MIN_RSA_BITS} bits")
+        if bits > MAX_RSA_BITS:
+            raise ValueError(f"RSA keys must be at most {MAX_RSA_BITS} bits")
+    else:
+        curve, point_length = ECDSA_CURVES[algorithm]
+        if reader.string() != curve.encode("ascii"):
+            raise ValueError("ECDSA curve does not match key type")
+        point = reader.string()
+        if len(point) != point_length or point[0] != 0x04:
+            raise ValueError("Invalid ECDSA public point")
+        bits = int(curve.removeprefix("nistp"))
+    reader.done()
+    return bits
+
+
+class _BlobCache:
+    """Bounded LRU of blob digest -> (algorithm, bits) for validated keys."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[bytes, tuple[str, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: bytes) -> tuple[str, int] | None:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+            return entry
+
+    def put(self, digest: bytes, entry: tuple[str, int]) -> None:
+        with self._lock:
+            self._entries[digest] = entry
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_blob_cache = _BlobCache(BLOB_CACHE_SIZE)
 
 
 class SshKeyService:
     @staticmethod
     def parse_public_key(public_key: str) -> ParsedKey:
-        parts = public_key.strip().split()
+        public_key = public_key.strip()
+        if "\n" in public_key or "\r" in public_key:
+            # A second line would be a separate authorized_keys entry
+            raise ValueError("Public key must be a single line")
+        parts = public_key.split()
         if len(parts) < 2:
             raise ValueError("Invalid public key format")
         algorithm, key_b64 = parts[0], parts[1]
@@ -44,17 +164,24 @@ class SshKeyService:
         fp_raw = hashlib.sha256(key_bytes).digest()
         fp_b64 = base64.b64encode(fp_raw).decode("ascii").rstrip("=")
 
+        # Only valid blobs are cached, keyed by the same digest as the fingerprint
+        cached = _blob_cache.get(fp_raw)
+        if cached is not None and cached[0] == algorithm:
+            bits = cached[1]
+        else:
+            bits = inspect_key_blob(algorithm, key_bytes)
+            _blob_cache.put(fp_raw, (algorithm, bits))
+
         return ParsedKey(
-            algorithm=algorithm, key_b64=key_b64, comment=comment, fingerprint=fp_b64
+            algorithm=algorithm,
+            key_b64=key_b64,
+            comment=comment,
+            fingerprint=fp_b64,
+            bits=bits,
         )
 
     @staticmethod
     def build_authorized_keys(keys: List[str]) -> str:
         """Build authorized_keys content from a list of public keys."""
-        valid_lines: list[str] = []
-        for key in keys:
-            parsed = SshKeyService.parse_public_key(key)
-            valid_lines.append(
-                f"{parsed.algorithm} {parsed.key_b64} {parsed.comment}".strip()
-            )
+        valid_lines = [SshKeyService.parse_public_key(key).line for key in keys]
         return "\n".join(valid_lines) + ("\n" if valid_lines else "")
@@ -0,0 +1,133 @@
+"""Record when SSH keys are used, from sshd's auth log.
+
+sshd logs every key login as
+``Accepted publickey for alice from 203.0.113.5 port 50022 ssh2: ED25519
+SHA256:<fingerprint>``. ``KeyUsageTracker`` tails the log with
+``LogTailer``, keeps the latest use per (user, fingerprint) in memory and
+writes ``SshKey.last_used_at`` for all of them with one executemany UPDATE
+every ``flush_interval`` seconds. Rows are matched through the
+(fingerprint, user_id) index, so no login costs a database write of its own.
+
+Uses are stamped with the time the line was read, which is at most one
+polling interval after the login; that is plenty for expiring stale keys.
+
+The log is ``$PUBNIX_AUTH_LOG`` if set, else ``/var/log/auth.log``
+(Debian family) or ``/var/log/secure`` (RHEL family), whichever exists.
+OpenSSH 9.8+ logs the accept line from ``sshd-session`` rather than
+``sshd``; both are recognised. On journald-only hosts, have rsyslog (or
+``journalctl -f``) feed a file and point ``PUBNIX_AUTH_LOG`` at it.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import time
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import bindparam, or_, select, update
+from sqlalchemy.engine import Engine
+
+from models import SshKey, User
+from services.log_tailer import LogTailer
+
+AUTH_LOGS = ("/var/log/auth.log", "/var/log/secure")
+
+_ACCEPTED_KEY = re.compile(
+    rb"sshd(?:-session)?\[\d+\]: Accepted publickey for (\S+) from \S+ port \d+ ssh2: "
+    rb"\S+ SHA256:([A-Za-z0-9+/]+)"
+)
+
+
+def default_auth_log() -> str:
+    """``$PUBNIX_AUTH_LOG``, else the first of ``AUTH_LOGS`` that exists."""
+    configured = os.getenv("PUBNIX_AUTH_LOG")
+    if configured:
+        return configured
+    for path in AUTH_LOGS:
+        if os.path.exists(path):
+            return path
+    return AUTH_LOGS[0]
+
+
+def update_last_used(engine: Engine, uses: Mapping[tuple[str, str], datetime]) -> int:
+    """Advance ``SshKey.last_used_at`` for many (username, fingerprint) pairs."""
+    if not uses:
+        return 0
+    keys = SshKey.__table__
+    users = User.__table__
+    owner = (
+        select(users.c.id)
+        .where(users.c.username == bindparam("b_username"))
+        .scalar_subquery()
+    )
+    stmt = (
+        update(keys)
+        .where(keys.c.fingerprint == bindparam("b_fingerprint"))
+        .where(keys.c.user_id == owner)
+        .where(
+            or_(
+                keys.c.last_used_at.is_(None),
+                keys.c.last_used_at < bindparam("b_used_at"),
+            )
+        )
+        .values(last_used_at=bindparam("b_used_at"))
+    )
+    params = [
+        {"b_username": u, "b_fingerprint": fp, "b_used_at": at}
+        for (u, fp), at in uses.items()
+    ]
+    with engine.begin() as conn:
+        return conn.execute(stmt, params).rowcount
+
+
+class KeyUsageTracker:
+    """Aggregates key logins from the auth log and flushes them periodically."""
+
+    def __init__(
+        self,
+        engine: Engine,
+        tailer: Optional[LogTailer] = None,
+        flush_interval: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.engine = engine
+        self.tailer = tailer or LogTailer(default_auth_log())
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self._pending: dict[tuple[str, str], datetime] = {}
+        self._last_flush = clock()
+
+    def feed(self, lines: list[bytes], now: Optional[float] = None) -> int:
+        """Record the key logins among ``lines``; returns how many were found."""
+        seen_at = datetime.fromtimestamp(
+            self.clock() if now is None else now, timezone.utc
+        ).replace(tzinfo=None)
+        found = 0
+        search = _ACCEPTED_KEY.search
+        for line in lines:
+            match = search(line)
+            if match is not None:
+                user, fingerprint = match.groups()
+                self._pending[(user.decode(), fingerprint.decode())] = seen_at
+                found += 1
+        return found
+
+    def flush(self) -> int:
+        """Write pending uses; kept for the next flush if the UPDATE fails."""
+        updated = update_last_used(self.engine, self._pending)
+        self._pending.clear()
+        self._last_flush = self.clock()
+        return updated
+
+    def poll(self) -> int:
+        """Read new log lines and flush once per ``flush_interval``.
+
+        Returns the number of rows updated (0 when no flush was due).
+        """
+        self.feed(self.tailer.read_lines())
+        if self.clock() - self._last_flush < self.flush_interval:
+            return 0
+        return self.flush()
@@ -0,0 +1,168 @@
+"""Readers for the binary utmp/wtmp login records.
+
+Both files are arrays of fixed-size ``struct utmp`` records (384 bytes on
+Linux x86_64/aarch64 glibc). They are memory-mapped and unpacked in place
+with a precompiled ``struct.Struct``; only user-process records have their
+strings decoded.
+
+``/var/run/utmp`` holds the sessions that are open right now.
+``/var/log/wtmp`` is an append-only log of every login, so ``WtmpFollower``
+remembers how far it has read and only unpacks records appended since,
+starting over when the file is rotated or truncated.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from collections import Counter
+from collections.abc import Iterator, Mapping
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+from sqlalchemy import bindparam, or_, update
+from sqlalchemy.engine import Engine
+
+from models import User
+
+UTMP_PATH = "/var/run/utmp"
+WTMP_PATH = "/var/log/wtmp"
+
+USER_PROCESS = 7
+
+# type, (pad), pid, line, id, user, host, exit, session, tv_sec, tv_usec,
+# addr_v6, unused
+UTMP_STRUCT = struct.Struct("<hxxi32s4s32s256s4xiii16x20x")
+RECORD_SIZE = UTMP_STRUCT.size  # 384
+
+
+class UtmpRecord(NamedTuple):
+    type: int
+    pid: int
+    line: str
+    user: str
+    host: str
+    tv_sec: int
+
+    @property
+    def time(self) -> datetime:
+        return datetime.fromtimestamp(self.tv_sec, timezone.utc)
+
+
+def _cstr(raw: bytes) -> str:
+    return raw.split(b"\0", 1)[0].decode("utf-8", "replace")
+
+
+def iter_user_records(
+    buf: bytes | memoryview | mmap.mmap, start: int = 0, end: Optional[int] = None
+) -> Iterator[UtmpRecord]:
+    """Yield USER_PROCESS records from whole records in ``buf[start:end]``."""
+    end = len(buf) if end is None else end
+    unpack_from = UTMP_STRUCT.unpack_from
+    for offset in range(start, end - RECORD_SIZE + 1, RECORD_SIZE):
+        ut_type, pid, line, _id, user, host, _session, tv_sec, _usec = unpack_from(
+            buf, offset
+        )
+        if ut_type != USER_PROCESS or not user.strip(b"\0"):
+            continue
+        yield UtmpRecord(ut_type, pid, _cstr(line), _cstr(user), _cstr(host), tv_sec)
+
+
+def read_utmp(path: str = UTMP_PATH) -> list[UtmpRecord]:
+    """Current login sessions; an unreadable or empty file means none."""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < RECORD_SIZE:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                return list(iter_user_records(buf))
+    except OSError:
+        return []
+
+
+def session_counts(records: list[UtmpRecord]) -> Counter[str]:
+    """Open sessions per username."""
+    return Counter(r.user for r in records)
+
+
+def remote_session_count(records: list[UtmpRecord]) -> int:
+    """Sessions opened from a remote host (i.e. over SSH)."""
+    return sum(1 for r in records if r.host)
+
+
+class WtmpFollower:
+    """Incrementally reads logins appended to wtmp."""
+
+    def __init__(self, path: str = WTMP_PATH) -> None:
+        self.path = path
+        self.offset = 0
+        self._inode: Optional[int] = None
+
+    def read_logins(self) -> dict[str, datetime]:
+        """Latest login time per user among records appended since last call."""
+        try:
+            f = open(self.path, "rb")
+        except OSError:
+            return {}
+        with f:
+            st = os.fstat(f.fileno())
+            if st.st_ino != self._inode or self.offset > st.st_size:
+                # First read, rotated or truncated: start from the top
+                self._inode = st.st_ino
+                self.offset = 0
+            end = st.st_size - st.st_size % RECORD_SIZE
+            if end <= self.offset:
+                return {}
+            logins: dict[str, int] = {}
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                for record in iter_user_records(buf, self.offset, end):
+                    if record.tv_sec > logins.get(record.user, 0):
+                        logins[record.user] = record.tv_sec
+            self.offset = end
+        return {
+            user: datetime.fromtimestamp(sec, timezone.utc)
+            for user, sec in logins.items()
+        }
+
+
+def update_last_login(engine: Engine, logins: Mapping[str, datetime]) -> int:
+    """Advance ``User.last_login`` for many users in one executemany UPDATE."""
+    if not logins:
+        return 0
+    table = User.__table__
+    stmt = (
+        update(table)
+        .where(table.c.username == bindparam("b_username"))
+        .where(
+            or_(
+                table.c.last_login.is_(None),
+                table.c.last_login < bindparam("b_last_login"),
+            )
+        )
+        .values(last_login=bindparam("b_last_login"))
+    )
+    params = [{"b_username": u, "b_last_login": t} for u, t in logins.items()]
+    with engine.begin() as conn:
+        return conn.execute(stmt, params).rowcount
+
+
+class LoginTracker:
+    """Feeds new wtmp logins into ``User.last_login`` once per interval."""
+
+    def __init__(self, engine: Engine, follower: Optional[WtmpFollower] = None) -> None:
+        self.engine = engine
+        self.follower = follower or WtmpFollower()
+        self._pending: dict[str, datetime] = {}
+
+    def poll(self) -> int:
+        """Apply logins recorded since the last poll; returns rows updated.
+
+        Logins are kept if the UPDATE fails and retried on the next poll.
+        """
+        for user, at in self.follower.read_logins().items():
+            if user not in self._pending or at > self._pending[user]:
+                self._pending[user] = at
+        updated = update_last_login(self.engine, self._pending)
+        self._pending.clear()
+        return updated
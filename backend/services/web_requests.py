@@ -0,0 +1,89 @@
+"""Per-user web request counters fed from the nginx access log.
+
+nginx serves user sites under ``/~user/`` (see
+``config/nginx/sites-available/pubnix-dev``). ``WebRequestCounter`` tails
+the access log and, for every line, pulls the username out of the request
+path with one precompiled bytes regex. Lines are never decoded and no other
+field is parsed. Counts accumulate in memory. ``drain`` hands out (and resets)
+the per-user counts once per sampling interval, so they reach the database
+in the same batched write as the rest of ``UserMetrics``. A ring of
+per-minute totals answers "requests in the last hour".
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections import Counter
+from typing import Callable, Optional
+
+from services.log_tailer import LogTailer
+
+ACCESS_LOG = "/var/log/nginx/access.log"
+
+# '... "GET /~alice/index.html HTTP/1.1" ...' (combined/common log format).
+# Usernames as accepted by ValidationService.validate_username.
+_USER_REQUEST = re.compile(rb'"[A-Z]+ /~([a-zA-Z_][a-zA-Z0-9_]{2,31})(?:[/? ]|")')
+
+
+class WebRequestCounter:
+    """Counts ``/~user/`` requests per user and in total per minute."""
+
+    def __init__(
+        self,
+        tailer: Optional[LogTailer] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.tailer = tailer or LogTailer(ACCESS_LOG)
+        self.clock = clock
+        self._pending: Counter[str] = Counter()
+        self._minutes = [0] * 60  # total requests per minute, ring buffer
+        self._minute_ids = [-1] * 60
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()  # LogTailer is not thread-safe
+        self.lines_seen = 0
+
+    def poll(self) -> int:
+        """Read newly appended log lines; returns how many were consumed."""
+        with self._poll_lock:
+            return self.feed(self.tailer.read_lines())
+
+    def close(self) -> None:
+        with self._poll_lock:
+            self.tailer.close()
+
+    def feed(self, lines: list[bytes], now: Optional[float] = None) -> int:
+        counts: Counter[bytes] = Counter()
+        search = _USER_REQUEST.search
+        for line in lines:
+            match = search(line)
+            if match is not None:
+                counts[match.group(1)] += 1
+        total = sum(counts.values())
+        minute = int((self.clock() if now is None else now) // 60)
+        slot = minute % 60
+        with self._lock:
+            for user, n in counts.items():
+                self._pending[user.decode()] += n
+            if self._minute_ids[slot] != minute:
+                self._minute_ids[slot] = minute
+                self._minutes[slot] = 0
+            self._minutes[slot] += total
+            self.lines_seen += len(lines)
+        return len(lines)
+
+    def drain(self) -> Counter[str]:
+        """Per-user counts since the previous drain."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        return pending
+
+    def requests_last_hour(self, now: Optional[float] = None) -> int:
+        minute = int((self.clock() if now is None else now) // 60)
+        with self._lock:
+            return sum(
+                count
+                for count, seen in zip(self._minutes, self._minute_ids)
+                if minute - 60 < seen <= minute
+            )
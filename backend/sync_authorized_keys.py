@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Bring every user's ~/.ssh/authorized_keys in line with the database.
+
+Runs after account reconciliation (see infrastructure/systemd/
+pubnix-reconcile.service). Files that already hold the right keys are left
+alone; edited, deleted or re-permissioned ones are rewritten. Set
+PUBNIX_AUTHKEYS_STATE so unchanged files cost a stat instead of a read.
+
+With --follow it keeps running and writes key changes within
+PUBNIX_AUTHKEYS_INTERVAL seconds (default 5); see
+infrastructure/systemd/pubnix-authkeys-sync.service.
+"""
+
+import os
+import signal
+import sys
+import threading
+
+from services.authorized_keys_sync import get_authorized_keys_sync
+
+
+def follow():
+    """Poll for key changes until SIGTERM/SIGINT."""
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+    print("authorized_keys sync following key changes")
+    get_authorized_keys_sync().follow(
+        stop, interval=float(os.getenv("PUBNIX_AUTHKEYS_INTERVAL", "5"))
+    )
+
+
+def main():
+    """Rewrite authorized_keys files that differ from the database."""
+    if "--follow" in sys.argv[1:]:
+        follow()
+        return
+    report = get_authorized_keys_sync().reconcile()
+    for username in sorted(report.written):
+        print(f"✓ {username}: authorized_keys updated")
+    for username, error in sorted(report.errors.items()):
+        print(f"✗ {username}: {error}")
+    for username in sorted(report.skipped):
+        print(f"  {username}: no home directory, skipped")
+    print(
+        f"authorized_keys sync complete: {len(report.written)} written, "
+        f"{report.unchanged} unchanged"
+    )
+
+
+if __name__ == "__main__":
+    main()
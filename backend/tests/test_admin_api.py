@@ -2,12 +2,23 @@ from collections.abc import Generator
 
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.pool import StaticPool
-from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel import Session, SQLModel, create_engine, select
 
 import main
 from database import get_session as prod_get_session
-from models import Application, ApplicationStatus, ResourceLimits, User, UserStatus
+from models import (
+    Application,
+    ApplicationStatus,
+    ResourceLimits,
+    SshKey,
+    User,
+    UserStatus,
+)
+from services.log_tailer import LogTailer
+from services.metrics_collector import MetricsCollector, get_metrics_collector
+from services.web_requests import WebRequestCounter
 
 
 @pytest.fixture
@@ -106,3 +117,67 @@ def test_list_users_suspend_unsuspend_limits_and_health(session):
     assert resp.status_code == 200
     data = resp.json()
     assert "system" in data and "summary" in data
+
+
+def test_health_counts_web_requests_between_calls(tmp_path):
+    log = tmp_path / "access.log"
+    log.write_bytes(b"")
+    collector = MetricsCollector(
+        web_counter=WebRequestCounter(tailer=LogTailer(str(log)))
+    )
+    main.app.dependency_overrides[get_metrics_collector] = lambda: collector
+    client = TestClient(main.app)
+
+    assert client.get("/api/v1/admin/health").status_code == 200
+    with open(log, "ab") as f:
+        f.write(
+            b'1.2.3.4 - - [01/Mar/2025:12:00:00 +0000] "GET /~alice/ HTTP/1.1"\n' * 2
+        )
+    system = client.get("/api/v1/admin/health").json()["system"]
+    assert system["web_requests_per_hour"] == 2
+    collector.close()
+    assert get_metrics_collector() is get_metrics_collector()
+
+
+def test_shared_ssh_keys(session):
+    seed_data(session)
+    users = {u.username: u.id for u in session.exec(select(User)).all()}
+    for username, fingerprint in [
+        ("u1", "shared"),
+        ("u2", "shared"),
+        ("u3", "shared"),
+        ("u1", "pair"),
+        ("u3", "pair"),
+        ("u2", "alone"),
+    ]:
+        session.add(
+            SshKey(
+                user_id=users[username],
+                name=fingerprint,
+                public_key=f"ssh-ed25519 {fingerprint}",
+                fingerprint=fingerprint,
+            )
+        )
+    session.commit()
+    client = TestClient(main.app)
+
+    resp = client.get("/api/v1/admin/ssh-keys/duplicates")
+    assert resp.status_code == 200
+    shared = resp.json()
+    assert [s["fingerprint"] for s in shared] == ["SHA256:shared", "SHA256:pair"]
+    assert [o["username"] for o in shared[0]["owners"]] == ["u1", "u2", "u3"]
+    resp = client.get("/api/v1/admin/ssh-keys/duplicates?min_owners=3")
+    assert len(resp.json()) == 1
+
+    resp = client.get("/api/v1/admin/ssh-keys/lookup?fingerprint=SHA256:alone")
+    assert resp.status_code == 200
+    assert [o["username"] for o in resp.json()["owners"]] == ["u2"]
+    resp = client.get("/api/v1/admin/ssh-keys/lookup?fingerprint=unknown")
+    assert resp.status_code == 404
+
+    # The same key cannot be registered twice for one account
+    session.add(
+        SshKey(user_id=users["u2"], name="again", public_key="x", fingerprint="alone")
+    )
+    with pytest.raises(IntegrityError):
+        session.commit()
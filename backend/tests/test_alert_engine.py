@@ -0,0 +1,173 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+import main
+from models import SystemMetrics, UserMetrics
+from services.alert_engine import AlertEngine, AlertRule, get_alert_engine, load_rules
+
+T0 = datetime(2025, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def system(minute: int, cpu: float) -> SystemMetrics:
+    return SystemMetrics(
+        timestamp=T0 + timedelta(minutes=minute),
+        total_users=1,
+        active_users_24h=1,
+        cpu_usage_percent=cpu,
+        memory_usage_percent=10.0,
+        disk_usage_percent=10.0,
+        network_connections=0,
+    )
+
+
+def test_threshold_rule_fires_after_duration_and_resolves():
+    rule = AlertRule(
+        name="cpu",
+        source="system",
+        metric="cpu_usage_percent",
+        threshold=90,
+        for_seconds=120,
+    )
+    engine = AlertEngine([rule])
+
+    engine.observe_system(system(0, 95))
+    assert [a.state for a in engine.alerts()] == ["pending"]
+    assert engine.status() == "ok"
+
+    engine.observe_system(system(1, 97))
+    assert engine.alerts()[0].state == "pending"
+    engine.observe_system(system(2, 99))
+    assert engine.alerts()[0].state == "firing"
+    assert engine.status() == "warning"
+
+    engine.observe_system(system(3, 50))
+    assert engine.alerts() == []
+    assert engine.status() == "ok"
+
+
+def test_rate_rule_uses_per_second_change():
+    rule = AlertRule(
+        name="burn",
+        source="user",
+        metric="cpu_time_seconds",
+        kind="rate",
+        threshold=0.5,
+        severity="critical",
+    )
+    engine = AlertEngine([rule])
+
+    def sample(name: str, second: int, cpu: int) -> UserMetrics:
+        return UserMetrics(
+            username=name,
+            timestamp=T0 + timedelta(seconds=second),
+            cpu_time_seconds=cpu,
+        )
+
+    engine.observe_users([sample("alice", 0, 100), sample("bob", 0, 100)])
+    assert engine.alerts() == []  # a rate needs two samples
+    engine.observe_users([sample("alice", 10, 109), sample("bob", 10, 101)])
+    firing = engine.alerts(include_pending=False)
+    assert [(a.subject, a.value) for a in firing] == [("alice", 0.9)]
+    assert engine.status() == "critical"
+
+    # Counter going backwards (processes exited) is not a negative rate
+    engine.observe_users([sample("alice", 20, 5)])
+    assert engine.alerts()[0].subject == "alice"
+
+    engine.forget_users(["bob"])
+    assert engine.alerts() == []
+
+
+def test_load_rules_from_json(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(
+        json.dumps(
+            [
+                {
+                    "name": "disk",
+                    "source": "system",
+                    "metric": "disk_usage_percent",
+                    "threshold": 80,
+                }
+            ]
+        )
+    )
+    rules = load_rules(str(path))
+    assert [(r.name, r.op, r.for_seconds) for r in rules] == [("disk", ">", 0)]
+
+    # A typo is rejected at load time, not in the middle of an evaluation
+    path.write_text(
+        json.dumps(
+            [
+                {
+                    "name": "disk",
+                    "source": "system",
+                    "metric": "disk_usage",
+                    "threshold": 1,
+                }
+            ]
+        )
+    )
+    with pytest.raises(ValidationError, match="Unknown system metric 'disk_usage'"):
+        load_rules(str(path))
+
+
+def test_alerts_health_endpoint_reports_engine_state():
+    engine = AlertEngine(
+        [
+            AlertRule(
+                name="cpu", source="system", metric="cpu_usage_percent", threshold=90
+            )
+        ]
+    )
+    main.app.dependency_overrides[get_alert_engine] = lambda: engine
+    try:
+        client = TestClient(main.app)
+        engine.observe_system(system(0, 99))
+        body = client.get("/api/v1/monitoring/alerts/health").json()
+        assert body["status"] == "warning"
+        assert body["firing"][0]["rule"] == "cpu"
+        assert body["firing"][0]["value"] == 99
+    finally:
+        main.app.dependency_overrides.clear()
+
+
+def test_health_endpoint_merges_alerts_published_by_the_enforcer(tmp_path):
+    rule = AlertRule(
+        name="burn",
+        source="user",
+        metric="cpu_time_seconds",
+        kind="rate",
+        threshold=0.5,
+        severity="critical",
+    )
+    enforcer = AlertEngine([rule])
+    enforcer.observe_users(
+        [
+            UserMetrics(username="alice", timestamp=T0, cpu_time_seconds=0),
+            UserMetrics(
+                username="alice",
+                timestamp=T0 + timedelta(seconds=10),
+                cpu_time_seconds=9,
+            ),
+        ]
+    )
+    state = tmp_path / "alerts.json"
+    enforcer.publish(str(state))
+
+    api = AlertEngine([], shared_state=str(state))
+    main.app.dependency_overrides[get_alert_engine] = lambda: api
+    try:
+        body = TestClient(main.app).get("/api/v1/monitoring/alerts/health").json()
+    finally:
+        main.app.dependency_overrides.clear()
+    assert body["status"] == "critical"
+    assert [(a["rule"], a["subject"]) for a in body["firing"]] == [("burn", "alice")]
+
+    # A snapshot the enforcer stopped refreshing is ignored
+    later = datetime.now(timezone.utc) + timedelta(hours=1)
+    assert api.report(now=later)["status"] == "ok"
@@ -0,0 +1,156 @@
+import os
+from collections.abc import Generator
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+import main
+from database import get_session as prod_get_session
+from models import SshKey, User, UserStatus
+from services.authorized_keys_index import (
+    AuthorizedKeysIndex,
+    claim_single_process,
+    get_authorized_keys_index,
+)
+
+KEY = "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIGZha2VfZWQyNTUxOV9wdWJsaWNfa2V5X2Zvcl90ZXN0 a@atl.sh"
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def index(engine) -> AuthorizedKeysIndex:
+    return AuthorizedKeysIndex(lambda: Session(engine), max_negative=2)
+
+
+def add_user(engine, username: str, status=UserStatus.APPROVED, keys=()) -> int:
+    with Session(engine) as s:
+        user = User(
+            username=username,
+            email=f"{username}@example.com",
+            full_name=username,
+            status=status,
+        )
+        s.add(user)
+        s.commit()
+        for i, key in enumerate(keys):
+            s.add(
+                SshKey(user_id=user.id, name=f"k{i}", public_key=key, fingerprint=key)
+            )
+        s.commit()
+        return user.id
+
+
+def test_index_caches_hits_and_misses(engine, index):
+    add_user(engine, "alice", keys=[KEY, KEY.replace("a@", "b@")])
+    add_user(engine, "bob", status=UserStatus.SUSPENDED, keys=[KEY])
+
+    assert index.get("alice") == f"{KEY}\n{KEY.replace('a@', 'b@')}\n".encode()
+    assert index.get("alice") == index.get("alice")
+    assert (index.hits, index.misses) == (2, 1)
+
+    # Suspended and unknown users get nothing, and are cached as such
+    assert index.get("bob") == b""
+    assert index.get("ghost") == b""
+    assert index.get("ghost") == b""
+    assert index.misses == 3
+
+    # The negative cache is bounded
+    index.get("ghost2")
+    index.get("bob")
+    assert index.misses == 5
+
+    index.invalidate("alice")
+    assert index.get("alice").startswith(b"ssh-ed25519")
+    assert index.misses == 6
+
+    assert index.warm() == 1
+    index.get("alice")
+    assert index.misses == 6
+
+
+def test_key_changes_invalidate_the_index(engine, index):
+    add_user(engine, "carol")
+
+    def _get_session_override() -> Generator[Session, None, None]:
+        with Session(engine) as s:
+            yield s
+
+    main.app.dependency_overrides[prod_get_session] = _get_session_override
+    main.app.dependency_overrides[get_authorized_keys_index] = lambda: index
+    try:
+        client = TestClient(main.app)
+        url = "/api/v1/ssh-keys/authorized-keys/carol"
+        assert client.get(url).text == ""
+
+        resp = client.post(
+            "/api/v1/ssh-keys/",
+            json={"username": "carol", "name": "laptop", "public_key": KEY},
+        )
+        assert resp.status_code == 201
+        key_id = resp.json()["id"]
+        resp = client.get(url)
+        assert resp.text == KEY + "\n"
+        assert resp.headers["content-type"].startswith("text/plain")
+
+        client.post(f"/api/v1/ssh-keys/{key_id}/deactivate")
+        assert client.get(url).text == ""
+    finally:
+        main.app.dependency_overrides.clear()
+
+
+def test_keys_cannot_inject_authorized_keys_lines(engine, index):
+    add_user(engine, "dave")
+    injected = f'{KEY}\ncommand="/bin/sh" {KEY.replace("a@", "evil@")}'
+
+    def _get_session_override() -> Generator[Session, None, None]:
+        with Session(engine) as s:
+            yield s
+
+    main.app.dependency_overrides[prod_get_session] = _get_session_override
+    main.app.dependency_overrides[get_authorized_keys_index] = lambda: index
+    try:
+        client = TestClient(main.app)
+        resp = client.post(
+            "/api/v1/ssh-keys/",
+            json={"username": "dave", "name": "laptop", "public_key": injected},
+        )
+        assert resp.status_code == 400
+        assert resp.json()["detail"] == "Public key must be a single line"
+
+        resp = client.post(
+            "/api/v1/ssh-keys/import",
+            json={"keys": [{"username": "dave", "public_key": injected}]},
+        )
+        assert resp.status_code == 200
+        assert resp.json()["imported"] == {}
+        assert client.get("/api/v1/ssh-keys/authorized-keys/dave").text == ""
+    finally:
+        main.app.dependency_overrides.clear()
+
+    # Rows written before validation are rebuilt from their parsed fields
+    add_user(engine, "erin", keys=[injected, f"{KEY}  trailing words"])
+    assert index.get("erin") == f"{KEY}\n".encode()
+
+
+def test_claim_single_process(tmp_path):
+    lock_path = str(tmp_path / "index.lock")
+    fd = claim_single_process(lock_path)
+    try:
+        # flock is per open file, so a second open stands in for a second worker
+        with pytest.raises(RuntimeError, match="single worker"):
+            claim_single_process(lock_path)
+    finally:
+        os.close(fd)
+    os.close(claim_single_process(lock_path))
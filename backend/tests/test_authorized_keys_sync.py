@@ -0,0 +1,235 @@
+import json
+import os
+import threading
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from models import SshKey, User, UserStatus
+from services.authorized_keys_sync import AuthorizedKeysSync
+
+KEY = "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIGZha2VfZWQyNTUxOV9wdWJsaWNfa2V5X2Zvcl90ZXN0 a@atl.sh"
+OTHER = KEY.replace("a@", "b@")
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def root(tmp_path):
+    # Accounts owned by the test runner so chown works without root
+    uid, gid = os.getuid(), os.getgid()
+    (tmp_path / "etc").mkdir()
+    (tmp_path / "etc" / "passwd").write_text(
+        "".join(
+            f"{name}:x:{uid}:{gid}::/home/{name}:/bin/bash\n"
+            for name in ("alice", "bob", "carol")
+        )
+    )
+    for name in ("alice", "bob"):  # carol has no home directory
+        (tmp_path / "home" / name).mkdir(parents=True)
+    return tmp_path
+
+
+@pytest.fixture
+def keys_sync(engine, root, tmp_path) -> AuthorizedKeysSync:
+    return AuthorizedKeysSync(
+        lambda: Session(engine),
+        root=str(root),
+        state_path=str(tmp_path / "state.json"),
+        max_workers=2,
+    )
+
+
+def add_user(engine, username: str, status=UserStatus.APPROVED, keys=()) -> int:
+    with Session(engine) as s:
+        user = User(
+            username=username,
+            email=f"{username}@example.com",
+            full_name=username,
+            status=status,
+        )
+        s.add(user)
+        s.commit()
+        for i, key in enumerate(keys):
+            s.add(
+                SshKey(user_id=user.id, name=f"k{i}", public_key=key, fingerprint=key)
+            )
+        s.commit()
+        return user.id
+
+
+def authorized_keys(root, username: str) -> str:
+    return (root / "home" / username / ".ssh" / "authorized_keys").read_text()
+
+
+def test_reconcile_writes_only_changed_users(engine, root, keys_sync):
+    add_user(engine, "alice", keys=[KEY, OTHER])
+    add_user(engine, "bob")
+    add_user(engine, "carol", keys=[KEY])
+
+    report = keys_sync.reconcile()
+    assert sorted(report.written) == ["alice", "bob"]
+    assert report.skipped == ["carol"]
+    assert authorized_keys(root, "alice") == f"{KEY}\n{OTHER}\n"
+    assert authorized_keys(root, "bob") == ""
+    ssh_dir = root / "home" / "alice" / ".ssh"
+    assert ssh_dir.stat().st_mode & 0o777 == 0o700
+    assert (ssh_dir / "authorized_keys").stat().st_mode & 0o777 == 0o600
+    assert os.listdir(ssh_dir) == ["authorized_keys"]
+
+    report = keys_sync.reconcile()
+    assert report.written == []
+    assert report.unchanged == 2
+
+
+def test_poll_syncs_only_changed_users(engine, root, keys_sync):
+    alice = add_user(engine, "alice", keys=[KEY])
+    add_user(engine, "bob", keys=[KEY])
+    keys_sync.reconcile()
+    assert keys_sync.poll().written == []
+
+    with Session(engine) as s:
+        s.add(SshKey(user_id=alice, name="new", public_key=OTHER, fingerprint="y"))
+        bob = s.exec(select(User).where(User.username == "bob")).one()
+        bob.status = UserStatus.SUSPENDED
+        s.add(bob)
+        s.commit()
+
+    report = keys_sync.poll()
+    assert sorted(report.written) == ["alice", "bob"]
+    assert report.unchanged == 0  # untouched users are not even stat()ed
+    assert authorized_keys(root, "alice") == f"{KEY}\n{OTHER}\n"
+    assert authorized_keys(root, "bob") == ""  # suspended users lose access
+    assert keys_sync.poll().written == []
+
+
+def test_follow_reconciles_then_polls(engine, root, keys_sync):
+    add_user(engine, "alice", keys=[KEY])
+    stop = threading.Event()
+    polls = []
+
+    def poll():
+        polls.append(1)
+        stop.set()
+        raise RuntimeError("database unavailable")  # logged, not fatal
+
+    keys_sync.poll = poll
+    keys_sync.follow(stop, interval=0)
+    assert authorized_keys(root, "alice") == f"{KEY}\n"
+    assert polls == [1]
+
+
+def test_reconcile_empties_suspended_users(engine, root, keys_sync):
+    add_user(engine, "alice", keys=[KEY])
+    keys_sync.reconcile()
+    with Session(engine) as s:
+        alice = s.exec(select(User).where(User.username == "alice")).one()
+        alice.status = UserStatus.SUSPENDED
+        s.add(alice)
+        s.commit()
+
+    assert keys_sync.reconcile().written == ["alice"]
+    assert authorized_keys(root, "alice") == ""
+
+
+def test_state_survives_restart(engine, root, keys_sync, tmp_path):
+    add_user(engine, "alice", keys=[KEY])
+    keys_sync.reconcile()
+
+    restarted = AuthorizedKeysSync(
+        lambda: Session(engine), root=str(root), state_path=str(tmp_path / "state.json")
+    )
+    assert restarted.reconcile().written == []
+
+
+def test_reconcile_repairs_files_changed_on_disk(engine, root, keys_sync):
+    add_user(engine, "alice", keys=[KEY])
+    add_user(engine, "bob", keys=[KEY])
+    keys_sync.reconcile()
+
+    alice = root / "home" / "alice" / ".ssh" / "authorized_keys"
+    alice.write_text(f"{KEY}\n{OTHER}\n")  # a key added by hand
+    (root / "home" / "bob" / ".ssh" / "authorized_keys").unlink()
+
+    report = keys_sync.reconcile()
+    assert sorted(report.written) == ["alice", "bob"]
+    assert authorized_keys(root, "alice") == f"{KEY}\n"
+    assert authorized_keys(root, "bob") == f"{KEY}\n"
+
+    alice.chmod(0o644)
+    assert keys_sync.reconcile().written == ["alice"]
+    assert alice.stat().st_mode & 0o777 == 0o600
+
+
+def test_reconcile_without_state_leaves_matching_files_alone(engine, root):
+    add_user(engine, "alice", keys=[KEY])
+    first = AuthorizedKeysSync(lambda: Session(engine), root=str(root))
+    assert first.reconcile().written == ["alice"]
+
+    fresh = AuthorizedKeysSync(lambda: Session(engine), root=str(root))
+    report = fresh.reconcile()
+    assert report.written == []
+    assert report.unchanged == 1
+
+
+def test_processes_sharing_state_keep_each_others_entries(engine, root, tmp_path):
+    add_user(engine, "alice", keys=[KEY])
+    add_user(engine, "bob", keys=[KEY])
+    state = str(tmp_path / "state.json")
+    api = AuthorizedKeysSync(lambda: Session(engine), root=str(root), state_path=state)
+    cli = AuthorizedKeysSync(lambda: Session(engine), root=str(root), state_path=state)
+
+    api.sync(["alice"])
+    cli.sync(["bob"])
+    assert sorted(json.loads((tmp_path / "state.json").read_text())) == [
+        "alice",
+        "bob",
+    ]
+
+
+def test_reconcile_surfaces_unexpected_errors(engine, root, keys_sync, monkeypatch):
+    add_user(engine, "alice", keys=[KEY])
+
+    def broken(username, content):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(keys_sync, "matches_disk", broken)
+    with pytest.raises(RuntimeError, match="boom"):
+        keys_sync.reconcile()
+
+
+def test_reconcile_tallies_outcomes_from_every_worker(engine, root, monkeypatch):
+    names = [f"user{i}" for i in range(40)]
+    for name in names:
+        add_user(engine, name, keys=[KEY])
+    keys_sync = AuthorizedKeysSync(
+        lambda: Session(engine), root=str(root), max_workers=8
+    )
+    monkeypatch.setattr(keys_sync, "matches_disk", lambda u, c: u.endswith("0"))
+    monkeypatch.setattr(keys_sync, "write_file", lambda u, c: not u.endswith("1"))
+
+    report = keys_sync.reconcile()
+    assert report.unchanged == 4
+    assert sorted(report.skipped) == sorted(n for n in names if n.endswith("1"))
+    assert len(report.written) == 32
+
+
+def test_symlinked_ssh_dir_is_refused(engine, root, keys_sync, tmp_path):
+    add_user(engine, "alice", keys=[KEY])
+    target = tmp_path / "elsewhere"
+    target.mkdir()
+    (root / "home" / "alice" / ".ssh").symlink_to(target)
+
+    report = keys_sync.sync(["alice"])
+    assert "alice" in report.errors
+    assert os.listdir(target) == []
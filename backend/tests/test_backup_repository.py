@@ -0,0 +1,125 @@
+import io
+import os
+import random
+from pathlib import Path
+
+import pytest
+
+from services import backup_repository
+from services.backup_crypto import BackupDecryptionError
+from services.backup_repository import BackupRepository, ChunkerParams, iter_chunks
+
+PARAMS = ChunkerParams(min_size=1024, avg_bits=12, max_size=16 * 1024)
+
+
+def chunk_sizes(data: bytes) -> list[int]:
+    return [len(c) for c in iter_chunks(io.BytesIO(data), PARAMS)]
+
+
+def test_vectorised_chunker_matches_scalar(monkeypatch):
+    pytest.importorskip("numpy")
+    data = random.Random(1).randbytes(300_000)
+    vectorised = chunk_sizes(data)
+    monkeypatch.setattr(backup_repository, "np", None)
+    assert chunk_sizes(data) == vectorised
+    assert sum(vectorised) == len(data)
+    assert all(s <= PARAMS.max_size for s in vectorised)
+
+
+def test_chunk_boundaries_survive_insertions():
+    data = random.Random(2).randbytes(200_000)
+    before = list(iter_chunks(io.BytesIO(data), PARAMS))
+    after = list(iter_chunks(io.BytesIO(b"inserted" + data), PARAMS))
+    assert len(set(before) & set(after)) >= len(before) - 2
+
+
+def make_tree(root: Path) -> bytes:
+    big = random.Random(3).randbytes(200_000)
+    (root / "alice" / "src").mkdir(parents=True)
+    (root / "alice" / "big.bin").write_bytes(big)
+    (root / "alice" / ".bashrc").write_text("alias ll='ls -l'\n")
+    (root / "alice" / "src" / "main.py").write_text("print('hi')\n" * 500)
+    (root / "alice" / "latest").symlink_to("src/main.py")
+    (root / "bob").mkdir()
+    (root / "bob" / "copy.bin").write_bytes(big)  # deduplicated against alice's
+    return big
+
+
+def test_repository_backup_dedup_and_restore(tmp_path: Path):
+    home = tmp_path / "home"
+    big = make_tree(home)
+    repo = BackupRepository.init(tmp_path / "repo", "pw", PARAMS, max_workers=2)
+
+    first = repo.backup("home", [home])
+    assert first.files == first.files_read == 4
+    chunks_after_first = first.new_chunks
+    assert chunks_after_first < len(chunk_sizes(big)) * 2
+
+    # Nothing changed: no file is read, no chunk written
+    second = repo.backup("home", [home])
+    assert (second.files_read, second.new_chunks) == (0, 0)
+
+    edited = big[:100_000] + b"edit" + big[100_000:]
+    (home / "alice" / "big.bin").write_bytes(edited)
+    third = repo.backup("home", [home])
+    assert third.files_read == 1
+    assert 0 < third.new_chunks <= 3
+
+    assert repo.snapshots() == [first.snapshot, second.snapshot, third.snapshot]
+    reopened = BackupRepository(tmp_path / "repo", "pw")
+    old = reopened.restore(first.snapshot, tmp_path / "old")
+    new = reopened.restore(third.snapshot, tmp_path / "new")
+    assert (old / "home" / "alice" / "big.bin").read_bytes() == big
+    assert (new / "home" / "alice" / "big.bin").read_bytes() == edited
+    assert (new / "home" / "bob" / "copy.bin").read_bytes() == big
+    assert os.readlink(new / "home" / "alice" / "latest") == "src/main.py"
+    assert (new / "home" / "alice" / "src" / "main.py").read_text().count("hi") == 500
+
+
+def test_repository_rejects_wrong_password(tmp_path: Path):
+    (tmp_path / "f.txt").write_text("secret")
+    repo = BackupRepository.init(tmp_path / "repo", "pw", PARAMS, max_workers=1)
+    snapshot = repo.backup("f", [tmp_path / "f.txt"]).snapshot
+
+    wrong = BackupRepository(tmp_path / "repo", "nope")
+    with pytest.raises(BackupDecryptionError):
+        wrong.restore(snapshot, tmp_path / "out")
+
+
+def test_previous_snapshot_is_the_latest_with_the_same_prefix(tmp_path: Path):
+    home = tmp_path / "home"
+    make_tree(home)
+    (tmp_path / "etc").mkdir()
+    (tmp_path / "etc" / "motd").write_text("hello\n")
+    repo = BackupRepository.init(tmp_path / "repo", "pw", PARAMS, max_workers=1)
+
+    first = repo.backup("home", [home])
+    # "system" sorts after "home": it must not be taken as home's previous run
+    system = repo.backup("system", [tmp_path / "etc"])
+    again = repo.backup("home", [home])
+    assert again.files_read == 0
+
+    assert repo.snapshots("home") == [first.snapshot, again.snapshot]
+    assert repo.snapshots() == [first.snapshot, system.snapshot, again.snapshot]
+
+
+def test_restore_drops_unsafe_mode_bits(tmp_path: Path):
+    src = tmp_path / "src"
+    src.mkdir()
+    modes = {"shared": 0o666, "setuid": 0o4755, "readonly": 0o400, "odd": 0o615}
+    for name, mode in modes.items():
+        (src / name).write_text(name)
+        (src / name).chmod(mode)
+    repo = BackupRepository.init(tmp_path / "repo", "pw", PARAMS, max_workers=1)
+    snapshot = repo.backup("src", [src]).snapshot
+
+    out = repo.restore(snapshot, tmp_path / "out")
+    restored = {
+        p.name: p.stat().st_mode & 0o7777 for p in out.rglob("*") if p.is_file()
+    }
+    assert restored == {
+        "shared": 0o644,
+        "setuid": 0o755,
+        "readonly": 0o600,
+        "odd": 0o604,
+    }
@@ -1,6 +1,21 @@
+import base64
+import io
+import os
 from pathlib import Path
 
-from services.backup_service import BackupService
+import pytest
+from cryptography.fernet import Fernet
+
+from services.backup_compression import Compression
+from services.backup_crypto import (
+    FRAME,
+    HEADER,
+    BackupDecryptionError,
+    EncryptingWriter,
+    derive_key,
+    open_decrypted,
+)
+from services.backup_service import BackupService, _HashingWriter, read_manifest
 
 
 def test_backup_and_restore(tmp_path: Path):
@@ -10,7 +25,9 @@ def test_backup_and_restore(tmp_path: Path):
     (src / "file1.txt").write_text("hello")
     (src / "file2.txt").write_text("world")
 
-    svc = BackupService(backup_dir=tmp_path / "backups", remote_dir=tmp_path / "remote")
+    svc = BackupService(
+        backup_dir=tmp_path / "backups", remote_dir=tmp_path / "remote", chunk_size=64
+    )
 
     # Backup
     res = svc.backup("pubnix", [src], password="testpass")
@@ -20,6 +37,7 @@ def test_backup_and_restore(tmp_path: Path):
 
     # Verify manifest
     assert svc.verify(res.encrypted_path, res.manifest_path) is True
+    assert read_manifest(res.manifest_path)["format"] == "2"
 
     # Upload (simulated)
     uploaded = svc.upload(res.encrypted_path, res.manifest_path)
@@ -30,3 +48,137 @@ def test_backup_and_restore(tmp_path: Path):
     svc.restore(res.encrypted_path, "testpass", dest)
     assert (dest / "src" / "file1.txt").read_text() == "hello"
     assert (dest / "src" / "file2.txt").read_text() == "world"
+
+
+def seal(data: bytes, password: str = "pw", writes: int = 7) -> bytes:
+    out = io.BytesIO()
+    with EncryptingWriter(out, password, chunk_size=16) as writer:
+        step = max(1, len(data) // writes)
+        for i in range(0, len(data), step):
+            writer.write(data[i : i + step])
+    return out.getvalue()
+
+
+def unseal(blob: bytes, password: str = "pw") -> bytes:
+    reader = open_decrypted(io.BytesIO(blob), password)
+    assert reader is not None
+    return reader.read()
+
+
+def test_chunked_container_roundtrip():
+    for size in (0, 1, 16, 32, 33, 1000):
+        data = os.urandom(size)
+        assert unseal(seal(data)) == data
+
+
+def test_chunked_container_rejects_tampering():
+    blob = seal(os.urandom(100))
+    flipped = bytearray(blob)
+    flipped[HEADER.size + FRAME.size + 3] ^= 1
+    last_frame = len(blob) - (FRAME.size + 100 % 16 + 16)
+
+    for bad, error in [
+        (bytes(flipped), "corrupt"),
+        (blob[:last_frame], "truncated"),
+        (blob + b"x", "after final chunk"),
+    ]:
+        with pytest.raises(BackupDecryptionError, match=error):
+            unseal(bad)
+    with pytest.raises(BackupDecryptionError, match="password"):
+        unseal(blob, password="wrong")
+
+
+def test_failed_write_leaves_unreadable_container():
+    out = io.BytesIO()
+    with pytest.raises(RuntimeError):
+        with EncryptingWriter(out, "pw", chunk_size=16) as writer:
+            writer.write(b"a" * 40)
+            raise RuntimeError("source vanished")
+    with pytest.raises(BackupDecryptionError, match="truncated"):
+        unseal(out.getvalue())
+
+
+def test_restore_legacy_fernet_backup(tmp_path: Path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "old.txt").write_text("from before")
+    svc = BackupService(backup_dir=tmp_path / "backups")
+    archive = svc.create_archive("legacy", [src])
+
+    salt = os.urandom(16)
+    key = base64.urlsafe_b64encode(derive_key("testpass", salt))
+    legacy = tmp_path / "legacy.tar.gz.enc"
+    legacy.write_bytes(salt + Fernet(key).encrypt(archive.read_bytes()))
+
+    dest = tmp_path / "restore"
+    svc.restore(legacy, "testpass", dest)
+    assert (dest / "src" / "old.txt").read_text() == "from before"
+
+
+def test_pipelined_backup(tmp_path: Path):
+    src = tmp_path / "home"
+    (src / "alice").mkdir(parents=True)
+    payload = os.urandom(300_000)
+    (src / "alice" / "data.bin").write_bytes(payload)
+    svc = BackupService(backup_dir=tmp_path / "backups", chunk_size=4096)
+
+    res = svc.backup("pubnix", [src], password="testpass", pipelined=True)
+    assert res.archive_path is None
+    written = sorted(p.name for p in (tmp_path / "backups").iterdir())
+    assert written == sorted([res.encrypted_path.name, res.manifest_path.name])
+    assert svc.verify(res.encrypted_path, res.manifest_path) is True
+
+    dest = tmp_path / "restore"
+    svc.restore(res.encrypted_path, "testpass", dest)
+    assert (dest / "home" / "alice" / "data.bin").read_bytes() == payload
+
+
+def test_pipelined_backup_cleans_up_on_failure(tmp_path: Path, monkeypatch):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "f.bin").write_bytes(os.urandom(300_000))
+    svc = BackupService(backup_dir=tmp_path / "backups", chunk_size=4096)
+    write = _HashingWriter.write
+
+    def fail_on_chunks(self, data):
+        # Header and frame headers go through; the first sealed chunk fails
+        if len(data) > 100:
+            raise OSError("disk full")
+        return write(self, data)
+
+    monkeypatch.setattr(_HashingWriter, "write", fail_on_chunks)
+    with pytest.raises(OSError, match="disk full"):
+        svc.backup("pubnix", [src], password="testpass", pipelined=True)
+    assert list((tmp_path / "backups").iterdir()) == []
+
+
+@pytest.mark.parametrize(
+    "compression",
+    [
+        Compression("zstd", level=3, threads=2),
+        Compression("lz4"),
+        Compression("none"),
+    ],
+)
+def test_backup_with_compression_codec(tmp_path: Path, compression: Compression):
+    if compression.codec == "zstd":
+        pytest.importorskip("zstandard")
+    if compression.codec == "lz4":
+        pytest.importorskip("lz4.frame")
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "notes.txt").write_text("hello " * 10_000)
+    svc = BackupService(backup_dir=tmp_path / "backups", compression=compression)
+
+    res = svc.backup("pubnix", [src], password="testpass", pipelined=True)
+    assert res.encrypted_path.name.endswith(f"{compression.suffix}.enc")
+    assert read_manifest(res.manifest_path)["compression"] == compression.codec
+
+    svc.restore(res.encrypted_path, "testpass", tmp_path / "restore")
+    assert (tmp_path / "restore" / "src" / "notes.txt").read_text() == "hello " * 10_000
+
+    # Without a manifest the codec is recognised from the archive itself
+    res.manifest_path.unlink()
+    plain = BackupService(backup_dir=tmp_path / "backups")
+    plain.restore(res.encrypted_path, "testpass", tmp_path / "again")
+    assert (tmp_path / "again" / "src" / "notes.txt").exists()
@@ -0,0 +1,79 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from models import UserMetrics
+from services.metrics_archive import MetricsArchiver, MetricsArchiveReader
+
+pytest.importorskip("pyarrow")
+
+DAY = datetime(2025, 3, 1)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        yield s
+
+
+def seed(session: Session) -> None:
+    # Two full days plus part of a third, every 30 minutes for two users
+    for half_hour in range(2 * 48 + 10):
+        ts = DAY + timedelta(minutes=30 * half_hour)
+        for name in ("alice", "bob"):
+            session.add(
+                UserMetrics(
+                    username=name,
+                    timestamp=ts,
+                    memory_usage_mb=half_hour,
+                    last_activity=ts if name == "alice" else None,
+                )
+            )
+    session.commit()
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_archive_complete_days_and_read_back(session, tmp_path, fmt):
+    seed(session)
+    remote = tmp_path / "remote"
+    archiver = MetricsArchiver(
+        session, tmp_path / "archive", remote_dir=remote, fmt=fmt, chunk_rows=7
+    )
+    now = DAY + timedelta(days=2, hours=6)
+
+    partitions = archiver.archive(now=now, sources=["user"])
+    assert [(p.day, p.rows) for p in partitions] == [
+        (date(2025, 3, 1), 96),
+        (date(2025, 3, 2), 96),
+    ]
+    assert (remote / "user_metrics" / partitions[0].path.name).exists()
+    # Already archived days are not written again; today is incomplete
+    assert archiver.archive(now=now, sources=["user"]) == []
+
+    reader = MetricsArchiveReader(tmp_path / "archive")
+    table = reader.read(
+        "user",
+        DAY + timedelta(hours=23),
+        DAY + timedelta(days=1, hours=1),
+        columns=["username", "memory_usage_mb"],
+        usernames=["bob"],
+    )
+    assert table.column_names == ["username", "memory_usage_mb"]
+    assert table["memory_usage_mb"].to_pylist() == [46, 47, 48, 49]
+
+    full = reader.read("user", DAY, DAY + timedelta(days=1))
+    assert full.num_rows == 96
+    first = full.slice(0, 1).to_pylist()[0]
+    assert first["timestamp"] == DAY.replace(tzinfo=timezone.utc)
+    assert first["last_activity"] == DAY.replace(tzinfo=timezone.utc)
+
+    empty = reader.read("user", DAY + timedelta(days=30), DAY + timedelta(days=31))
+    assert empty.num_rows == 0
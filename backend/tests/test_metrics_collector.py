@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from services.disk_usage import DiskUsageAccountant
+from services.metrics_collector import MetricsCollector
+from services.proc_scanner import ProcScanner
+
+PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+
+def _stat_line(pid: int, comm: str, utime: int, stime: int, rss_pages: int) -> str:
+    # Fields 3..24 of /proc/<pid>/stat; only utime, stime and rss matter here
+    rest = ["S", "1", "1", "1", "0", "-1", "0"] + ["0"] * 4
+    rest += [str(utime), str(stime), "0", "0", "20", "0", "1", "0", "100", "0"]
+    rest += [str(rss_pages)]
+    return f"{pid} ({comm}) " + " ".join(rest) + " 0 0 0\n"
+
+
+@pytest.fixture
+def fake_procfs(tmp_path):
+    """A /proc lookalike: alice (1001) runs two processes, bob (1002) one."""
+    procs = [
+        (100, 1001, "bash", CLK_TCK * 2, CLK_TCK, 256),
+        (101, 1001, "tmux: server (1)", CLK_TCK, 0, 512),
+        (200, 1002, "vim", 0, CLK_TCK * 4, 1024),
+        (1, 0, "init", 5, 5, 10),
+    ]
+    for pid, uid, comm, utime, stime, rss in procs:
+        d = tmp_path / str(pid)
+        d.mkdir()
+        (d / "status").write_text(
+            f"Name:\t{comm}\nState:\tS\nUid:\t{uid}\t{uid}\t{uid}\t{uid}\n"
+        )
+        (d / "stat").write_text(_stat_line(pid, comm, utime, stime, rss))
+    (tmp_path / "self").mkdir()
+    (tmp_path / "meminfo").write_text("MemTotal: 1 kB\n")
+    return tmp_path
+
+
+def test_scan_aggregates_by_uid(fake_procfs):
+    table = ProcScanner(str(fake_procfs)).scan()
+    assert table[1001].processes == 2
+    assert table[1001].rss_kb == 768 * PAGE_KB
+    assert table[1001].cpu_ticks == CLK_TCK * 4
+    assert table[1002].processes == 1
+    assert set(table) == {0, 1001, 1002}
+
+
+def test_collect_user_metrics_in_bulk(fake_procfs, tmp_path):
+    uids = {"alice": 1001, "bob": 1002, "carol": 1003}
+    collector = MetricsCollector(
+        proc_root=str(fake_procfs),
+        session_counter=lambda: {"alice": 2},
+        uid_lookup=uids.__getitem__,
+        disk_accountant=DiskUsageAccountant(quota_reader=lambda: {1002: 3 * 1024}),
+        home_root=str(tmp_path / "home"),
+    )
+    rows = {
+        m.username: m
+        for m in collector.collect_user_metrics(["alice", "bob", "carol", "ghost"])
+    }
+    assert rows["alice"].active_processes == 2
+    assert rows["alice"].cpu_time_seconds == 4
+    assert rows["alice"].login_sessions == 2
+    assert rows["bob"].memory_usage_mb == 1024 * PAGE_KB // 1024
+    assert rows["bob"].disk_usage_mb == 3
+    assert rows["carol"].active_processes == 0
+    assert rows["carol"].last_activity is None
+    assert rows["ghost"].active_processes == 0
+
+
+def test_disk_usage_rescans_only_changed_directories(tmp_path):
+    home = tmp_path / "alice"
+    for sub in ("a", "b", "b/c"):
+        (home / sub).mkdir(parents=True)
+        (home / sub / "data.bin").write_bytes(b"x" * 1024 * 1024)
+
+    accountant = DiskUsageAccountant(quota_reader=lambda: None)
+    first = accountant.usage_mb({"alice": str(home)})
+    assert first["alice"] >= 3
+    assert accountant.dirs_scanned == 4
+
+    assert accountant.usage_mb({"alice": str(home)}) == first
+    assert accountant.dirs_scanned == 4  # nothing changed, nothing re-listed
+
+    (home / "b" / "c" / "more.bin").write_bytes(b"y" * 2 * 1024 * 1024)
+    second = accountant.usage_mb({"alice": str(home)})
+    assert second["alice"] >= first["alice"] + 2
+    assert accountant.dirs_scanned == 5
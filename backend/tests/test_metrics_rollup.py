@@ -0,0 +1,184 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, func, select
+
+from models import MetricRollup, SystemMetrics, UserMetrics
+from services.metrics_rollup import MetricsRollupService
+
+START = datetime(2025, 3, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        yield s
+
+
+def seed(session: Session, minutes: int = 120) -> None:
+    # Two users sampled every 10 seconds; memory ramps with the minute
+    for second in range(0, minutes * 60, 10):
+        ts = START + timedelta(seconds=second)
+        minute = second // 60
+        for name in ("alice", "bob"):
+            session.add(
+                UserMetrics(username=name, timestamp=ts, memory_usage_mb=minute)
+            )
+        session.add(
+            SystemMetrics(
+                timestamp=ts,
+                total_users=2,
+                active_users_24h=2,
+                cpu_usage_percent=float(second % 60),
+                memory_usage_percent=50.0,
+                disk_usage_percent=10.0,
+                network_connections=3,
+            )
+        )
+    session.commit()
+
+
+def count(session: Session, resolution: str, source: str = "user") -> int:
+    return session.exec(
+        select(func.count(MetricRollup.id)).where(
+            (MetricRollup.resolution == resolution) & (MetricRollup.source == source)
+        )
+    ).one()
+
+
+def test_rollup_is_incremental(session):
+    seed(session)
+    svc = MetricsRollupService(session, lag=timedelta(0))
+    svc.rollup(now=START + timedelta(minutes=120, seconds=30))
+
+    # 120 minutes x 2 users x 6 user metrics
+    assert count(session, "1m") == 120 * 2 * 6
+    assert count(session, "1h") == 2 * 2 * 6
+    assert count(session, "1d") == 0  # day not complete yet
+
+    hour = session.exec(
+        select(MetricRollup).where(
+            (MetricRollup.resolution == "1h")
+            & (MetricRollup.subject == "alice")
+            & (MetricRollup.metric == "memory_usage_mb")
+            & (MetricRollup.bucket_start == START)
+        )
+    ).one()
+    assert (hour.min_value, hour.max_value, hour.last_value) == (0, 59, 59)
+    assert hour.sample_count == 360
+    assert hour.sum_value / hour.sample_count == pytest.approx(29.5)
+
+    # Nothing new: a second run writes nothing
+    assert sum(svc.rollup(now=START + timedelta(minutes=121)).values()) == 0
+
+
+def test_prune_respects_retention_and_cursors(session):
+    seed(session, minutes=10)
+    svc = MetricsRollupService(
+        session, retention={"raw": timedelta(minutes=5)}, lag=timedelta(0)
+    )
+    now = START + timedelta(minutes=10)
+
+    # Nothing rolled up yet: raw data is kept even though it is expired
+    assert svc.prune(now=now)["user:raw"] == 0
+
+    svc.rollup(now=now)
+    deleted = svc.prune(now=now)
+    assert deleted["user:raw"] == 5 * 6 * 2
+    assert count(session, "1m") == 10 * 2 * 6
+
+
+def test_query_picks_coarsest_fitting_resolution(session):
+    seed(session)
+    svc = MetricsRollupService(
+        session, retention={"raw": timedelta(days=3650), "1m": timedelta(days=3650)}
+    )
+    svc.rollup(now=START + timedelta(minutes=120))
+    end = START + timedelta(minutes=120)
+
+    assert svc.choose_resolution(START, 30, now=end) == "raw"
+    assert svc.choose_resolution(START, 300, now=end) == "1m"
+    assert svc.choose_resolution(START, 7200, now=end) == "1h"
+
+    resolution, points = svc.query(
+        "user", "memory_usage_mb", START, end, 600, subject="bob", now=end
+    )
+    assert resolution == "1m"
+    assert len(points) == 12
+    assert points[0].min == 0 and points[0].max == 9
+    assert points[0].avg == pytest.approx(4.5)
+
+    resolution, points = svc.query(
+        "system", "cpu_usage_percent", START, end, 3600, now=end
+    )
+    assert resolution == "1h"
+    assert [p.max for p in points] == [50.0, 50.0]
+
+
+def test_query_merges_tail_that_is_not_rolled_up_yet(session):
+    seed(session)
+    svc = MetricsRollupService(
+        session, retention={"raw": timedelta(hours=1)}, lag=timedelta(0)
+    )
+    now = START + timedelta(minutes=119)
+    svc.rollup(now=now)
+    svc.prune(now=now)
+
+    resolution, points = svc.query(
+        "user",
+        "memory_usage_mb",
+        START + timedelta(minutes=10),
+        now,
+        3600,
+        subject="alice",
+        now=now,
+    )
+    assert resolution == "1h"
+    # First hour from its 1h bucket, the second from 1m rollups and raw samples
+    assert [p.bucket_start for p in points] == [START, START + timedelta(hours=1)]
+    assert (points[0].min, points[0].max) == (0, 59)
+    assert (points[1].min, points[1].max) == (60, 118)
+    assert svc.segments("user", "1h", START, now)[-1][0] == "1m"
+
+
+def test_choose_resolution_skips_levels_not_rolled_up(session):
+    seed(session, minutes=10)
+    svc = MetricsRollupService(session)
+    now = START + timedelta(minutes=10)
+    assert svc.choose_resolution(START, 3600, now=now, source="user") == "raw"
+    svc.rollup(now=now)
+    assert svc.choose_resolution(START, 3600, now=now, source="user") == "1h"
+
+
+def test_rollup_waits_for_late_samples(session):
+    seed(session, minutes=10)
+    svc = MetricsRollupService(session)  # default one minute lag
+    svc.rollup(now=START + timedelta(minutes=10, seconds=30))
+    assert svc.processed_until("user", "1m") == START + timedelta(minutes=9)
+
+    # A sample for 12:09 written after its minute ended is still included
+    session.add(
+        UserMetrics(
+            username="alice",
+            memory_usage_mb=999,
+            timestamp=START + timedelta(minutes=9, seconds=50),
+        )
+    )
+    session.commit()
+    svc.rollup(now=START + timedelta(minutes=11))
+    late = session.exec(
+        select(MetricRollup).where(
+            (MetricRollup.resolution == "1m")
+            & (MetricRollup.subject == "alice")
+            & (MetricRollup.metric == "memory_usage_mb")
+            & (MetricRollup.bucket_start == START + timedelta(minutes=9))
+        )
+    ).one()
+    assert late.max_value == 999
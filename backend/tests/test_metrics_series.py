@@ -0,0 +1,171 @@
+from collections.abc import Generator
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+import main
+from database import get_session as prod_get_session
+from models import SystemMetrics, UserMetrics
+from routers.admin import get_current_admin_username
+from services.metrics_rollup import MetricsRollupService
+from services.metrics_series import MetricsSeriesService, bucket_epoch
+
+START = datetime(2025, 3, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def session() -> Generator[Session, None, None]:
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        yield s
+
+
+def seed(session: Session, start: datetime, minutes: int = 120) -> None:
+    for minute in range(minutes):
+        ts = start + timedelta(minutes=minute)
+        session.add(
+            SystemMetrics(
+                timestamp=ts,
+                total_users=3,
+                active_users_24h=3,
+                cpu_usage_percent=float(minute % 10),
+                memory_usage_percent=40.0,
+                disk_usage_percent=10.0,
+                network_connections=1,
+            )
+        )
+        for i, name in enumerate(("alice", "bob", "carol")):
+            session.add(
+                UserMetrics(
+                    username=name,
+                    timestamp=ts,
+                    cpu_time_seconds=minute * (i + 1),
+                    memory_usage_mb=100 * (3 - i),
+                    disk_usage_mb=10 * i,
+                )
+            )
+    session.commit()
+
+
+def test_series_buckets_in_sql(session):
+    seed(session, START)
+    end = START + timedelta(minutes=120)
+    svc = MetricsSeriesService(session)
+
+    data = svc.series("system", "cpu_usage_percent", START, end, 600, now=end)
+    assert len(data["t"]) == 12
+    assert data["t"][0] == int(START.replace(tzinfo=timezone.utc).timestamp())
+    assert data["min"][0] == 0 and data["max"][0] == 9
+    assert data["avg"][0] == pytest.approx(4.5)
+
+    user = svc.series(
+        "user", "memory_usage_mb", START, end, 3600, subject="bob", now=end
+    )
+    assert user["avg"] == [200.0, 200.0]
+
+    with pytest.raises(ValueError):
+        svc.series("system", "not_a_column", START, end, 60, now=end)
+
+
+def test_series_reads_rollups_for_old_ranges(session):
+    seed(session, START)
+    end = START + timedelta(minutes=120)
+    MetricsRollupService(session).rollup(now=end)
+    # A week later raw samples are past retention, hourly rollups are not
+    later = end + timedelta(days=8)
+    data = MetricsSeriesService(session).series(
+        "system", "cpu_usage_percent", START, end, 3600, now=later
+    )
+    assert data["resolution"] == "1h"
+    assert data["avg"] == [pytest.approx(4.5), pytest.approx(4.5)]
+
+    top = MetricsSeriesService(session).top_users("cpu", START, end, now=later)
+    assert top["resolution"] == "1m"
+    assert top["username"][0] == "carol" and top["value"][0] == 119 * 3.0
+
+
+def test_series_merges_finer_rollups_past_the_coarse_cursor(session):
+    seed(session, START)
+    now = START + timedelta(minutes=110)
+    rollups = MetricsRollupService(session, retention={"raw": timedelta(hours=1)})
+    rollups.rollup(now=now)
+    rollups.prune(now=now)  # raw samples of the first 50 minutes are gone
+
+    data = MetricsSeriesService(session, rollups=rollups).series(
+        "system", "cpu_usage_percent", START + timedelta(minutes=5), now, 3600, now=now
+    )
+    assert data["resolution"] == "1h"
+    # The 12:00 bucket is kept although the range starts at 12:05, and the
+    # 13:00 one comes from 1m rollups plus raw samples
+    assert len(data["t"]) == 2
+    assert data["max"] == [9.0, 9.0]
+
+
+def test_top_users(session):
+    seed(session, START)
+    end = START + timedelta(minutes=120)
+    svc = MetricsSeriesService(session)
+
+    cpu = svc.top_users("cpu", START, end, limit=2, now=end)
+    assert cpu["username"] == ["carol", "bob"]
+    assert cpu["value"] == [119 * 3.0, 119 * 2.0]
+
+    memory = svc.top_users("memory", START, end, now=end)
+    assert memory["username"] == ["alice", "bob", "carol"]
+
+
+def test_postgres_bucket_expressions():
+    ts = SystemMetrics.__table__.c.timestamp
+    dialect = postgresql.dialect()
+    hourly = str(select(bucket_epoch(ts, 3600, "postgresql")).compile(dialect=dialect))
+    assert "date_trunc" in hourly
+    odd = str(select(bucket_epoch(ts, 300, "postgresql")).compile(dialect=dialect))
+    assert "date_bin(INTERVAL '300 seconds'" in odd
+
+
+def _not_admin() -> str:
+    raise HTTPException(status_code=403, detail="Admin access required")
+
+
+def test_series_endpoint(session):
+    now = datetime.now(timezone.utc)
+    seed(session, now - timedelta(minutes=30), minutes=30)
+
+    def _get_session_override() -> Generator[Session, None, None]:
+        yield session
+
+    main.app.dependency_overrides[prod_get_session] = _get_session_override
+    try:
+        client = TestClient(main.app)
+        resp = client.get(
+            "/api/v1/monitoring/series",
+            params={"metric": "cpu_usage_percent", "step": 600},
+        )
+        assert resp.status_code == 200
+        body = resp.json()
+        assert len(body["t"]) == len(body["avg"]) >= 3
+
+        resp = client.get("/api/v1/monitoring/series", params={"metric": "nope"})
+        assert resp.status_code == 400
+
+        resp = client.get("/api/v1/monitoring/top-users", params={"by": "disk"})
+        assert resp.status_code == 200
+        assert resp.json()["username"][0] == "carol"
+
+        # Per-user usage is for admins only
+        main.app.dependency_overrides[get_current_admin_username] = _not_admin
+        for path in ("/api/v1/monitoring/series", "/api/v1/monitoring/top-users"):
+            resp = client.get(path, params={"metric": "cpu_usage_percent"})
+            assert resp.status_code == 403
+    finally:
+        main.app.dependency_overrides.clear()
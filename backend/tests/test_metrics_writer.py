@@ -0,0 +1,50 @@
+from datetime import datetime, timezone
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, func, select
+
+from models import UserMetrics
+from services.metrics_writer import MetricsWriter, encode_copy_rows
+
+
+def make_engine():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def test_flush_writes_buffered_samples_in_one_batch():
+    engine = make_engine()
+    writer = MetricsWriter(engine)
+    now = datetime.now(timezone.utc)
+    writer.add(
+        UserMetrics(username=f"user{i}", memory_usage_mb=i, timestamp=now)
+        for i in range(500)
+    )
+    assert writer.pending() == 500
+    assert writer.flush() == 500
+    assert writer.flush() == 0
+
+    with Session(engine) as session:
+        assert session.exec(select(func.count(UserMetrics.id))).one() == 500
+        row = session.exec(
+            select(UserMetrics).where(UserMetrics.username == "user42")
+        ).one()
+        assert row.memory_usage_mb == 42
+
+
+def test_buffer_is_bounded():
+    writer = MetricsWriter(make_engine(), max_buffer=10)
+    writer.add(UserMetrics(username=f"u{i}") for i in range(15))
+    assert writer.pending() == 10
+    assert writer.dropped == 5
+
+
+def test_copy_text_encoding_escapes_values():
+    ts = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    payload = encode_copy_rows([("a\tb", ts, None, 3)])
+    assert payload == "a\\tb\t2025-01-01T00:00:00+00:00\t\\N\t3\n"
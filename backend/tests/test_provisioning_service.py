@@ -1,5 +1,8 @@
-from models import User
-from services.provisioning_service import ProvisioningService
+import os
+import stat
+
+from models import User, UserStatus
+from services.provisioning_service import NativeRunner, ProvisioningService
 
 
 def test_build_commands_defaults():
@@ -32,3 +35,140 @@ def test_production_executes_commands(monkeypatch):
     result = svc.provision_user(user, dry_run=False)
     assert result.success is True
     assert executed  # some commands executed
+
+
+def test_native_runner_forks_once_per_user(tmp_path):
+    skel = tmp_path / "skel"
+    (skel / ".ssh").mkdir(parents=True)
+    (skel / ".profile").write_text("export EDITOR=nano\n")
+    (skel / ".ssh" / "config").write_text("# sample\n")
+    (skel / ".ssh" / "config").chmod(0o600)
+    root = tmp_path / "root"
+
+    forked = []
+
+    def fake_useradd(argv):
+        forked.append(argv)
+        return 0
+
+    runner = NativeRunner(
+        account_runner=fake_useradd,
+        id_resolver=lambda user, group: (os.getuid(), os.getgid()),
+        root=str(root),
+    )
+    svc = ProvisioningService(
+        shell_runner=runner, skeleton_dir=str(skel), root=str(root)
+    )
+    user = User(username="dave", email="d@example.com", full_name="Dave")
+    result = svc.provision_user(user, dry_run=False)
+
+    assert result.success is True, result.message
+    assert runner.forks == 1
+    assert "-M" in forked[0] and "-m" not in forked[0] and "-k" not in forked[0]
+    home = root / "home" / "dave"
+    assert (home / ".profile").read_text() == "export EDITOR=nano\n"
+    assert stat.S_IMODE((home / ".ssh" / "config").stat().st_mode) == 0o600
+    assert stat.S_IMODE(home.stat().st_mode) == 0o755
+    assert stat.S_IMODE((home / "public_html").stat().st_mode) == 0o755
+
+
+def _fake_account_root(tmp_path, username):
+    root = tmp_path / "root"
+    (root / "etc").mkdir(parents=True)
+    uid, gid = os.getuid(), os.getgid()
+    (root / "etc" / "passwd").write_text(
+        f"{username}:x:{uid}:{gid}::/home/{username}:/bin/bash\n"
+    )
+    (root / "etc" / "group").write_text(f"{username}:x:{gid}:\n")
+    home = root / "home" / username
+    (home / "public_html").mkdir(parents=True)
+    home.chmod(0o755)
+    (home / "public_html").chmod(0o755)
+    return root, home
+
+
+def test_plan_is_empty_for_provisioned_account(tmp_path):
+    root, _ = _fake_account_root(tmp_path, "erin")
+    svc = ProvisioningService(root=str(root))
+    user = User(username="erin", email="e@example.com", full_name="Erin")
+    assert svc.plan_commands(user) == []
+    result = svc.provision_user(user, dry_run=False)
+    assert result.success is True
+    assert result.message == "Already provisioned"
+
+
+def test_reconcile_only_touches_drifted_accounts(tmp_path):
+    root, home = _fake_account_root(tmp_path, "frank")
+    home.chmod(0o700)
+    (home / "public_html").rmdir()
+
+    executed = []
+
+    def fake_runner(argv):
+        executed.append(argv)
+        return 0
+
+    runner = NativeRunner(account_runner=fake_runner, root=str(root))
+    svc = ProvisioningService(shell_runner=runner, env="production", root=str(root))
+    frank = User(
+        username="frank",
+        email="f@example.com",
+        full_name="Frank",
+        status=UserStatus.APPROVED,
+    )
+    pending = User(username="gina", email="g@example.com", full_name="Gina")
+
+    plan = svc.plan_commands(frank)
+    assert not any(c.startswith("useradd") for c in plan)
+
+    results = svc.reconcile([frank, pending])
+    assert list(results) == ["frank"]
+    assert results["frank"].success is True
+    assert executed == []  # everything was handled in-process
+    assert stat.S_IMODE(home.stat().st_mode) == 0o755
+    assert (home / "public_html").is_dir()
+
+    # A second pass finds nothing to do
+    assert svc.reconcile([frank]) == {}
+
+
+def test_provision_batch_writes_account_databases_once(tmp_path, monkeypatch):
+    root = tmp_path / "root"
+    (root / "etc").mkdir(parents=True)
+    (root / "etc" / "passwd").write_text(
+        "root:x:0:0:root:/root:/bin/bash\nold:x:1000:1000::/home/old:/bin/bash\n"
+        "# local accounts above\n+@admins::::::\n+\n"
+    )
+    (root / "etc" / "group").write_text("root:x:0:\nold:x:1000:\n+:::\n")
+    (root / "etc" / "shadow").write_text("root:*:19000:0:99999:7:::\n")
+    skel = tmp_path / "skel"
+    skel.mkdir()
+    (skel / ".plan").write_text("nothing yet\n")
+
+    chowned = []
+    monkeypatch.setattr(
+        os, "chown", lambda path, uid, gid, **kw: chowned.append((uid, gid))
+    )
+
+    users = [
+        User(username=name, email=f"{name}@example.com", full_name=name.title())
+        for name in ("old", "hana", "ivan")
+    ]
+    svc = ProvisioningService(skeleton_dir=str(skel), root=str(root))
+    result = svc.provision_batch(users, dry_run=False)
+
+    assert sorted(result.created) == ["hana", "ivan"]
+    assert result.skipped == ["old"]
+    assert result.failed == {}
+
+    passwd = (root / "etc" / "passwd").read_text().splitlines()
+    assert passwd[5].startswith("hana:x:1001:1001:Hana:/home/hana:")
+    assert passwd[6].startswith("ivan:x:1002:1002:")
+    assert "ivan:x:1002:" in (root / "etc" / "group").read_text()
+    assert (root / "etc" / "shadow").read_text().count(":!:") == 2
+    assert (root / "home" / "hana" / ".plan").read_text() == "nothing yet\n"
+    assert (root / "home" / "ivan" / "public_html").is_dir()
+    assert (1002, 1002) in chowned
+
+    # The new accounts are now visible to the planner
+    assert not any(c.startswith("useradd") for c in svc.plan_commands(users[1]))
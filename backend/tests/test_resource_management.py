@@ -1,4 +1,14 @@
+import shutil
+import threading
+
+import pytest
+from prometheus_client import generate_latest
+
 from models import ResourceLimits, UserMetrics
+from services import resource_enforcer
+from services.cgroup_applier import CgroupApplier
+from services.enforcement_daemon import EnforcementLoop, EnforcementPolicy
+from services.metrics_collector import MetricsCollector
 from services.resource_enforcer import ResourceEnforcer, Violation
 
 
@@ -36,3 +46,228 @@ def test_build_enforcement_commands():
     cmds = enforcer.build_enforcement_commands("alice", violations)
     assert any("renice" in c for c in cmds)
     assert any("logger" in c for c in cmds)
+
+
+def test_cgroup_applier_writes_only_changed_limits(tmp_path):
+    for uid in (1001, 1002):
+        slice_dir = tmp_path / "user.slice" / f"user-{uid}.slice"
+        slice_dir.mkdir(parents=True)
+        for name in ("cpu.max", "memory.max", "pids.max"):
+            (slice_dir / name).write_text("max\n")
+
+    applier = CgroupApplier(cgroup_root=tmp_path)
+    limits = {
+        1001: ResourceLimits(
+            user_id=1, cpu_limit_percent=25, memory_limit_mb=256, max_processes=40
+        ),
+        1002: ResourceLimits(user_id=2),
+        1003: ResourceLimits(user_id=3),  # not logged in: no slice yet
+    }
+    report = applier.apply(limits)
+    assert report.written == 6
+    assert report.missing == [1003]
+    slice_dir = tmp_path / "user.slice" / "user-1001.slice"
+    assert (slice_dir / "cpu.max").read_text() == "25000 100000"
+    assert (slice_dir / "memory.max").read_text() == str(256 * 1024 * 1024)
+    assert (slice_dir / "pids.max").read_text() == "40"
+
+    # Second pass: nothing changed, only the new pids limit is written
+    limits[1002].max_processes = 10
+    report = applier.apply(limits)
+    assert report.written == 1
+    assert report.unchanged == 1
+    assert (
+        tmp_path / "user.slice" / "user-1002.slice" / "pids.max"
+    ).read_text() == "10"
+
+
+def make_slice(path):
+    path.mkdir(parents=True)
+    for name in ("cpu.max", "memory.max", "pids.max"):
+        (path / name).write_text("max\n")
+
+
+def test_cgroup_applier_rewrites_limits_of_recreated_slice(tmp_path):
+    users = tmp_path / "user.slice"
+    slice_dir = users / "user-1001.slice"
+    make_slice(slice_dir)
+    applier = CgroupApplier(cgroup_root=tmp_path)
+    limits = {1001: ResourceLimits(user_id=1, max_processes=40)}
+    assert applier.apply(limits).written == 3
+    assert applier.apply(limits).unchanged == 1
+
+    # Logout and login: systemd builds a fresh slice with "max" limits
+    fresh = users / "fresh"
+    make_slice(fresh)
+    shutil.rmtree(slice_dir)
+    fresh.rename(slice_dir)
+
+    assert applier.apply(limits).written == 3
+    assert (slice_dir / "pids.max").read_text() == "40"
+
+
+def test_enforcement_loop_applies_cgroup_limits(tmp_path):
+    make_slice(tmp_path / "user.slice" / "user-1001.slice")
+    collector = MetricsCollector(uid_lookup={"alice": 1001}.__getitem__)
+    loop = EnforcementLoop(
+        limits_provider=dict,
+        collector=collector,
+        cgroup_applier=CgroupApplier(cgroup_root=tmp_path),
+        env="production",
+    )
+    limits = {
+        "alice": ResourceLimits(user_id=1, max_processes=7),
+        "ghost": ResourceLimits(user_id=2),  # no account on this host
+    }
+    loop.apply_cgroup_limits(limits)
+    pids = tmp_path / "user.slice" / "user-1001.slice" / "pids.max"
+    assert pids.read_text() == "7"
+
+
+def test_batch_violations_match_scalar_checks():
+    np = pytest.importorskip("numpy")
+    enforcer = ResourceEnforcer()
+    metrics = {
+        "active_processes": np.array([10, 1, 50]),
+        "memory_usage_mb": np.array([100, 900, 10]),
+        "login_sessions": np.array([1, 1, 6]),
+        "disk_usage_mb": np.array([10, 10, 10]),
+    }
+    limits = {
+        "max_processes": np.array([5, 50, 50]),
+        "memory_limit_mb": np.array([512, 512, 512]),
+        "max_login_sessions": np.array([5, 5, 5]),
+        "disk_quota_mb": np.array([1024, 1024, 1024]),
+    }
+    masks = enforcer.check_batch_violations(metrics, limits)
+    assert masks["processes"].tolist() == [True, False, False]
+    assert masks["memory"].tolist() == [False, True, False]
+    assert masks["sessions"].tolist() == [False, False, True]
+    assert not masks["disk"].any()
+
+
+@pytest.mark.parametrize("numpy_installed", [True, False])
+def test_enforcement_loop_checks_a_round_in_one_batch(monkeypatch, numpy_installed):
+    if numpy_installed:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(resource_enforcer, "np", None)
+    enforcer = ResourceEnforcer()
+    batches = []
+    real_batch = enforcer.check_batch_violations
+
+    def counting_batch(metrics, user_limits):
+        batches.append(len(metrics["active_processes"]))
+        return real_batch(metrics, user_limits)
+
+    monkeypatch.setattr(enforcer, "check_batch_violations", counting_batch)
+    policy = EnforcementPolicy(window=1, trigger=1, clear_after=1, cooldown=60)
+    loop = EnforcementLoop(
+        limits_provider=dict,
+        enforcer=enforcer,
+        shell_runner=lambda argv: 0,
+        policy=policy,
+        env="production",
+    )
+    limits = {
+        name: ResourceLimits(user_id=i, max_processes=5, max_login_sessions=2)
+        for i, name in enumerate(["alice", "bob", "carol"])
+    }
+    samples = [
+        UserMetrics(username="alice", active_processes=20),
+        UserMetrics(username="bob", login_sessions=3),
+        UserMetrics(username="carol", active_processes=1),
+        UserMetrics(username="ghost", active_processes=99),  # no limits
+    ]
+
+    actions = loop.tick(samples, limits, now=0)
+    assert sorted(actions) == ["alice", "bob"]
+    assert actions["alice"] == ["renice +10 -u alice"]
+    assert actions["bob"] == ["logger 'Excess sessions for bob'"]
+    assert batches == ([3] if numpy_installed else [])
+
+
+def test_enforcement_loop_escalates_only_on_sustained_violations():
+    executed = []
+    policy = EnforcementPolicy(window=4, trigger=3, clear_after=2, cooldown=60)
+    loop = EnforcementLoop(
+        limits_provider=dict,
+        shell_runner=executed.append,
+        policy=policy,
+        env="production",
+    )
+    limits = {"alice": ResourceLimits(user_id=1, max_processes=5)}
+
+    def sample(processes):
+        return [UserMetrics(username="alice", active_processes=processes)]
+
+    # A single spike does not trigger anything
+    assert loop.tick(sample(20), limits, now=0) == {}
+    assert loop.tick(sample(1), limits, now=10) == {}
+    # Sustained violation escalates once...
+    assert loop.tick(sample(20), limits, now=20) == {}
+    actions = loop.tick(sample(20), limits, now=30)
+    assert any("renice" in c for c in actions["alice"])
+    # ...and further samples inside the cooldown are coalesced
+    assert loop.tick(sample(20), limits, now=40) == {}
+    assert loop.stats.actions == 1
+    assert executed == [["renice", "+10", "-u", "alice"]]
+
+    # Hysteresis: clears only after consecutive clean samples
+    loop.tick(sample(1), limits, now=50)
+    assert loop.stats.escalated_users == 1
+    loop.tick(sample(1), limits, now=60)
+    assert loop.stats.escalated_users == 0
+
+
+def test_enforcement_action_rewrites_drifted_cgroup_limits(tmp_path):
+    slice_dir = tmp_path / "user.slice" / "user-1001.slice"
+    make_slice(slice_dir)
+    policy = EnforcementPolicy(window=1, trigger=1, clear_after=1, cooldown=60)
+    loop = EnforcementLoop(
+        limits_provider=dict,
+        collector=MetricsCollector(uid_lookup={"alice": 1001}.__getitem__),
+        shell_runner=lambda argv: 0,
+        cgroup_applier=CgroupApplier(cgroup_root=tmp_path),
+        policy=policy,
+        env="production",
+    )
+    limits = {"alice": ResourceLimits(user_id=1, max_processes=5)}
+    loop.apply_cgroup_limits(limits)
+    (slice_dir / "pids.max").write_text("max\n")  # reset behind our back
+
+    loop.tick([UserMetrics(username="alice", active_processes=20)], limits, now=0)
+    assert (slice_dir / "pids.max").read_text() == "5"
+    assert loop.stats.cgroup_writes == 1
+    text = generate_latest(loop.registry).decode()
+    assert "pubnix_enforcement_cgroup_writes_total 1.0" in text
+    assert "pubnix_enforcement_actions_total 1.0" in text
+
+
+def test_enforcement_loop_survives_failing_rounds():
+    stop = threading.Event()
+    calls = []
+
+    def flaky_limits():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("database is unavailable")
+        stop.set()
+        return {}
+
+    def missing_binary(argv):
+        raise FileNotFoundError(argv[0])
+
+    loop = EnforcementLoop(
+        limits_provider=flaky_limits,
+        collector=MetricsCollector(uid_lookup=lambda name: 1000),
+        shell_runner=missing_binary,
+        interval=0,
+        env="production",
+    )
+    loop.run(stop)
+    assert len(calls) == 2
+    assert loop.stats.errors == 1
+
+    loop._execute("alice", ["renice +10 -u alice"], {"processes"}, ResourceLimits())
+    assert loop.stats.errors == 2
@@ -0,0 +1,93 @@
+from datetime import datetime
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from models import SshKey, User
+from services.log_tailer import LogTailer
+from services.ssh_key_usage import (
+    KeyUsageTracker,
+    default_auth_log,
+    update_last_used,
+)
+
+FP_A = "nThbg6kXUpJWGl7E1IGOCspRomTxdCARLviKw6E5SY8"
+FP_B = "uNiVztksCsDhcc0u9e8BujQXVUpKZIDTMczCvj3tD2s"
+
+
+def line(user: str, fingerprint: str, method: str = "publickey") -> str:
+    return (
+        f"Oct 19 12:00:00 atl sshd[4242]: Accepted {method} for {user} "
+        f"from 203.0.113.5 port 50022 ssh2: ED25519 SHA256:{fingerprint}\n"
+    )
+
+
+def setup(engine) -> dict[str, int]:
+    SQLModel.metadata.create_all(engine)
+    ids = {}
+    with Session(engine) as s:
+        for username, fingerprints in [("alice", [FP_A, FP_B]), ("bob", [FP_A])]:
+            user = User(username=username, email=f"{username}@x.org", full_name="x")
+            s.add(user)
+            s.commit()
+            for fp in fingerprints:
+                key = SshKey(
+                    user_id=user.id, name=fp[:4], public_key="k", fingerprint=fp
+                )
+                s.add(key)
+                s.commit()
+                ids[f"{username}:{fp}"] = key.id
+    return ids
+
+
+def last_used(engine) -> dict:
+    with Session(engine) as s:
+        return {k.id: k.last_used_at for k in s.exec(select(SshKey)).all()}
+
+
+def test_tracker_batches_key_usage(tmp_path):
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ids = setup(engine)
+    log = tmp_path / "auth.log"
+    log.write_text("")
+    now = [1_800_000_000.0]
+    tracker = KeyUsageTracker(
+        engine,
+        LogTailer(str(log), from_end=False),
+        flush_interval=60,
+        clock=lambda: now[0],
+    )
+
+    with log.open("a") as f:
+        f.write(line("alice", FP_A))
+        f.write(line("bob", FP_B))  # bob never registered this key
+        f.write(line("bob", FP_A, method="password"))
+        f.write("Oct 19 12:00:01 atl sshd[4243]: Connection closed by 198.51.100.7\n")
+    assert tracker.poll() == 0  # not due yet
+    assert all(v is None for v in last_used(engine).values())
+
+    now[0] += 61
+    assert tracker.poll() == 1
+    used = last_used(engine)
+    assert used[ids[f"alice:{FP_A}"]] == datetime(2027, 1, 15, 8, 0)
+    assert used[ids[f"alice:{FP_B}"]] is None
+    assert used[ids[f"bob:{FP_A}"]] is None
+
+    # Never moves backwards
+    earlier = {("alice", FP_A): datetime(2020, 1, 1)}
+    assert update_last_used(engine, earlier) == 0
+
+
+def test_accepts_sshd_session_lines_and_configured_log(tmp_path, monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    tracker = KeyUsageTracker(engine, LogTailer(str(tmp_path / "none")))
+    # OpenSSH 9.8+ logs the accept from the per-connection sshd-session
+    session_line = line("alice", FP_A).replace("sshd[", "sshd-session[")
+    assert tracker.feed([session_line.encode()], now=0) == 1
+
+    monkeypatch.setenv("PUBNIX_AUTH_LOG", str(tmp_path / "secure"))
+    assert default_auth_log() == str(tmp_path / "secure")
@@ -1,13 +1,17 @@
+import base64
 from collections.abc import Generator
 
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.pool import StaticPool
-from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel import Session, SQLModel, create_engine, select
 
 import main
 from database import get_session as prod_get_session
-from models import User
+from models import SshKey, User
+from services import ssh_key_import, ssh_key_service
+from services.ssh_key_import import ImportEntry, import_keys, parse_keys
+from services.ssh_key_service import SshKeyService
 
 
 @pytest.fixture
@@ -49,7 +53,7 @@ def test_add_list_deactivate_delete_key(session):
     client = TestClient(main.app)
     setup_user(session)
 
-    good_key = "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIGZha2VfYmFzZTY0X2RhdGFfZm9yX3Rlc3Q= test@atl.sh"
+    good_key = "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIGZha2VfZWQyNTUxOV9wdWJsaWNfa2V5X2Zvcl90ZXN0 test@atl.sh"
 
     # Add
     resp = client.post(
@@ -88,3 +92,145 @@ def test_reject_invalid_key(session):
         json={"username": "sshuser", "name": "bad", "public_key": bad_key},
     )
     assert resp.status_code == 400
+
+
+def ed25519_key(seed: int, comment: str = "") -> str:
+    blob = b"\x00\x00\x00\x0bssh-ed25519\x00\x00\x00\x20" + bytes([seed]) * 32
+    return f"ssh-ed25519 {base64.b64encode(blob).decode()} {comment}".strip()
+
+
+def test_bulk_import(session):
+    client = TestClient(main.app)
+    setup_user(session)
+    other = User(username="other", email="other@example.com", full_name="Other")
+    session.add(other)
+    session.commit()
+    client.post(
+        "/api/v1/ssh-keys/",
+        json={"username": "sshuser", "name": "existing", "public_key": ed25519_key(1)},
+    )
+
+    authorized_keys = "\n".join(
+        [
+            "# migrated from old.example.org",
+            ed25519_key(1, "dup-of-existing"),
+            ed25519_key(2, "desktop"),
+            "",
+            ed25519_key(2, "dup-in-file"),
+            f'command="/bin/false" {ed25519_key(3)}',
+            "ssh-ed25519 not_base64_here",
+        ]
+    )
+    resp = client.post(
+        "/api/v1/ssh-keys/import",
+        json={
+            "authorized_keys": {"sshuser": authorized_keys},
+            "keys": [
+                {"username": "other", "public_key": ed25519_key(1), "name": "work"},
+                {"username": "ghost", "public_key": ed25519_key(4)},
+            ],
+        },
+    )
+    assert resp.status_code == 200, resp.text
+    data = resp.json()
+    assert data["imported"] == {"other": 1, "sshuser": 1}
+    assert data["duplicates"] == 2
+    assert [(e["username"], e["line"]) for e in data["errors"]] == [
+        ("ghost", None),
+        ("sshuser", 6),
+        ("sshuser", 7),
+    ]
+    assert data["errors"][1]["detail"] == "Key options are not supported"
+
+    names = [k["name"] for k in client.get("/api/v1/ssh-keys/?username=sshuser").json()]
+    assert names == ["existing", "desktop"]
+    assert client.get("/api/v1/ssh-keys/?username=other").json()[0]["name"] == "work"
+
+
+def test_parse_keys_in_process_pool():
+    keys = [ed25519_key(i) for i in range(3)] + ["ssh-dss AAAA"]
+    serial = parse_keys(keys)
+    pooled = parse_keys(keys, max_workers=2, parallel_threshold=1)
+    assert pooled == serial
+    assert serial[-1] == "Unsupported key algorithm"
+
+
+def wire(*fields: bytes) -> str:
+    blob = b"".join(len(f).to_bytes(4, "big") + f for f in fields)
+    return base64.b64encode(blob).decode()
+
+
+def test_parse_checks_key_structure():
+    def rsa(bits: int) -> str:
+        modulus = (1 << (bits - 1)) | 1
+        n = b"\x00" + modulus.to_bytes(bits // 8, "big")  # mpint sign byte
+        exponent = b"\x01\x00\x01"
+        return f"ssh-rsa {wire(b'ssh-rsa', exponent, n)}"
+
+    assert SshKeyService.parse_public_key(rsa(4096)).bits == 4096
+    point = b"\x04" + b"\x01" * 64
+    parsed = SshKeyService.parse_public_key(
+        f"ecdsa-sha2-nistp256 {wire(b'ecdsa-sha2-nistp256', b'nistp256', point)}"
+    )
+    assert parsed.bits == 256
+
+    for line, error in [
+        (rsa(1024), "at least 2048 bits"),
+        (f"ssh-rsa {wire(b'ssh-ed25519', b'k' * 32)}", "does not match"),
+        (f"ssh-ed25519 {wire(b'ssh-ed25519', b'k' * 31)}", "ed25519 key length"),
+        (f"ssh-ed25519 {wire(b'ssh-ed25519', b'k' * 32, b'x')}", "Trailing data"),
+        (f"ssh-ed25519 {wire(b'ssh-ed25519')}", "Truncated"),
+        (
+            f"ecdsa-sha2-nistp384 {wire(b'ecdsa-sha2-nistp384', b'nistp256', point)}",
+            "curve does not match",
+        ),
+    ]:
+        with pytest.raises(ValueError, match=error):
+            SshKeyService.parse_public_key(line)
+
+
+def test_parse_memoizes_blob_checks(monkeypatch):
+    key = ed25519_key(9, "first")
+    SshKeyService.parse_public_key(key)
+
+    def fail(*args):
+        raise AssertionError("blob parsed twice")
+
+    monkeypatch.setattr(ssh_key_service, "inspect_key_blob", fail)
+    parsed = SshKeyService.parse_public_key(key.replace("first", "second"))
+    assert parsed.comment == "second"
+    assert parsed.bits == 256
+
+
+def test_import_stores_normalized_lines_and_survives_a_race(session, monkeypatch):
+    user = setup_user(session)
+    raced = SshKeyService.parse_public_key(ed25519_key(6))
+    real_key_name = ssh_key_import._key_name
+
+    def concurrent_add(entry, parsed, index):
+        # Another request adds key 6 after the duplicate check ran
+        if index == 1:
+            session.add(
+                SshKey(
+                    user_id=user.id,
+                    name="raced",
+                    public_key=raced.line,
+                    fingerprint=raced.fingerprint,
+                )
+            )
+            session.commit()
+        return real_key_name(entry, parsed, index)
+
+    monkeypatch.setattr(ssh_key_import, "_key_name", concurrent_add)
+    report = import_keys(
+        session,
+        [
+            ImportEntry("sshuser", f"  {ed25519_key(5)}   laptop  extra "),
+            ImportEntry("sshuser", ed25519_key(6)),
+        ],
+    )
+    assert report.imported == {"sshuser": 1}
+    assert report.duplicates == 1
+
+    stored = session.exec(select(SshKey.public_key).order_by(SshKey.id)).all()
+    assert stored == [raced.line, f"{ed25519_key(5)} laptop"]
@@ -0,0 +1,112 @@
+import os
+from datetime import datetime, timezone
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from models import User
+from services.metrics_collector import MetricsCollector, utmp_session_counts
+from services.utmp import (
+    RECORD_SIZE,
+    UTMP_STRUCT,
+    LoginTracker,
+    WtmpFollower,
+    read_utmp,
+    update_last_login,
+)
+
+LOGIN, USER, DEAD = 6, 7, 8
+
+
+def record(ut_type: int, user: str, sec: int, host: str = "", line: str = "pts/0"):
+    return UTMP_STRUCT.pack(
+        ut_type, 100, line.encode(), b"ts/0", user.encode(), host.encode(), 0, sec, 0
+    )
+
+
+def test_record_layout_matches_glibc():
+    assert RECORD_SIZE == 384
+
+
+def test_read_utmp_counts_user_sessions(tmp_path):
+    utmp = tmp_path / "utmp"
+    utmp.write_bytes(
+        record(2, "reboot", 1)  # BOOT_TIME
+        + record(LOGIN, "LOGIN", 2, line="tty1")
+        + record(USER, "alice", 10, host="203.0.113.9")
+        + record(USER, "alice", 11, host="203.0.113.9", line="pts/1")
+        + record(USER, "bob", 12, line="tty2")
+        + record(DEAD, "", 13)
+    )
+    records = read_utmp(str(utmp))
+    assert [(r.user, r.host) for r in records] == [
+        ("alice", "203.0.113.9"),
+        ("alice", "203.0.113.9"),
+        ("bob", ""),
+    ]
+    assert utmp_session_counts(str(utmp)) == {"alice": 2, "bob": 1}
+    assert read_utmp(str(tmp_path / "missing")) == []
+
+    collector = MetricsCollector(utmp_path=str(utmp))
+    assert collector.collect_system_metrics().ssh_sessions == 2
+
+
+def test_wtmp_follower_reads_incrementally(tmp_path):
+    wtmp = tmp_path / "wtmp"
+    wtmp.write_bytes(record(USER, "alice", 100) + record(USER, "alice", 200))
+    follower = WtmpFollower(str(wtmp))
+
+    first = follower.read_logins()
+    assert first == {"alice": datetime.fromtimestamp(200, timezone.utc)}
+    assert follower.read_logins() == {}
+
+    # A half-written record is left for the next read
+    partial = record(USER, "bob", 300)
+    with open(wtmp, "ab") as f:
+        f.write(partial[:100])
+    assert follower.read_logins() == {}
+    with open(wtmp, "ab") as f:
+        f.write(partial[100:])
+    assert follower.read_logins() == {"bob": datetime.fromtimestamp(300, timezone.utc)}
+
+    # Rotation: a new file is read from the start
+    os.rename(wtmp, tmp_path / "wtmp.1")
+    wtmp.write_bytes(record(USER, "carol", 400))
+    assert set(follower.read_logins()) == {"carol"}
+
+
+def test_last_login_batched_update(tmp_path):
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    newer = datetime(2025, 3, 2, tzinfo=timezone.utc)
+    with Session(engine) as s:
+        for name in ("alice", "bob"):
+            s.add(User(username=name, email=f"{name}@example.com", full_name=name))
+        s.add(
+            User(
+                username="carol",
+                email="carol@example.com",
+                full_name="carol",
+                last_login=datetime(2025, 3, 5),
+            )
+        )
+        s.commit()
+
+    wtmp = tmp_path / "wtmp"
+    wtmp.write_bytes(
+        record(USER, "alice", int(newer.timestamp()))
+        + record(USER, "carol", int(newer.timestamp()))
+        + record(USER, "ghost", int(newer.timestamp()))
+    )
+    assert LoginTracker(engine, WtmpFollower(str(wtmp))).poll() == 1
+
+    with Session(engine) as s:
+        last = {u.username: u.last_login for u in s.exec(select(User))}
+    assert last["alice"] == newer.replace(tzinfo=None)
+    assert last["bob"] is None
+    assert last["carol"] == datetime(2025, 3, 5)  # never moves backwards
+    assert update_last_login(engine, {}) == 0
@@ -0,0 +1,85 @@
+import os
+
+from services.log_tailer import LogTailer
+from services.metrics_collector import MetricsCollector
+from services.web_requests import WebRequestCounter
+
+
+def line(path: str, status: int = 200) -> bytes:
+    return (
+        b'203.0.113.7 - - [01/Mar/2025:12:00:00 +0000] "GET '
+        + path.encode()
+        + b' HTTP/1.1" '
+        + str(status).encode()
+        + b' 512 "-" "curl/8.5"\n'
+    )
+
+
+def test_tailer_follows_rotation_truncation_and_partial_lines(tmp_path):
+    log = tmp_path / "access.log"
+    log.write_bytes(b"old line\n")
+    tailer = LogTailer(str(log))
+    assert tailer.read_lines() == []  # starts at the end
+
+    with open(log, "ab") as f:
+        f.write(b"one\ntw")
+    assert tailer.read_lines() == [b"one"]
+    with open(log, "ab") as f:
+        f.write(b"o\n")
+    assert tailer.read_lines() == [b"two"]
+
+    # logrotate: rename, keep writing to the old file briefly, then recreate
+    os.rename(log, tmp_path / "access.log.1")
+    with open(tmp_path / "access.log.1", "ab") as f:
+        f.write(b"late\n")
+    log.write_bytes(b"fresh\n")
+    assert tailer.read_lines() == [b"late", b"fresh"]
+    assert tailer.rotations == 1
+
+    # copytruncate: the file is shorter than our position
+    log.write_bytes(b"")
+    with open(log, "ab") as f:
+        f.write(b"new\n")
+    assert tailer.read_lines() == [b"new"]
+
+
+def test_counter_extracts_users_from_request_path(tmp_path):
+    counter = WebRequestCounter(tailer=LogTailer(str(tmp_path / "missing")))
+    lines = [
+        line("/~alice/"),
+        line("/~alice/index.html"),
+        line("/~bob"),
+        line("/~bob?x=1"),
+        line("/~Dave_99/"),
+        line("/api/v1/health"),
+        line("/static/~alice/x.css"),
+        b"garbage",
+    ]
+    counter.feed([raw.rstrip(b"\n") for raw in lines], now=600.0)
+    assert counter.drain() == {"alice": 2, "bob": 2, "Dave_99": 1}
+    assert counter.drain() == {}
+
+    counter.feed([line("/~carol/").rstrip()], now=600.0 + 30 * 60)
+    assert counter.requests_last_hour(now=600.0 + 30 * 60) == 6
+    # The first minute has dropped out of the hour window
+    assert counter.requests_last_hour(now=600.0 + 61 * 60) == 1
+
+
+def test_collector_reports_web_requests(tmp_path):
+    log = tmp_path / "access.log"
+    log.write_bytes(b"")
+    (tmp_path / "proc").mkdir()
+    counter = WebRequestCounter(tailer=LogTailer(str(log)))
+    collector = MetricsCollector(
+        proc_root=str(tmp_path / "proc"),
+        session_counter=lambda: {},
+        uid_lookup=lambda name: 1000,
+        home_root=str(tmp_path / "home"),
+        web_counter=counter,
+    )
+    collector.collect_user_metrics(["alice"])  # opens the log at its end
+    with open(log, "ab") as f:
+        f.write(line("/~alice/") * 3 + line("/~bob/"))
+    (alice,) = collector.collect_user_metrics(["alice"])
+    assert alice.web_requests_count == 3
+    assert collector.collect_system_metrics().web_requests_per_hour == 4